@@ -0,0 +1,370 @@
+"""Общий для всех воркеров одного хоста кеш в файле SQLite (режим WAL).
+
+LocMemCache у каждого процесса свой, поэтому счётчики и сброс
+страниц из `posts` не доходят до соседних воркеров. Этот бэкенд
+хранит записи в одном файле, который открывают все процессы:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 10000, 'MAX_SIZE': 64 * 2 ** 20},
+        }
+    }
+
+Целые числа хранятся как INTEGER, поэтому `incr` - один атомарный
+UPDATE. При переполнении (`MAX_ENTRIES` записей или `MAX_SIZE` байт)
+сначала удаляются просроченные записи, затем давно не читанные (LRU):
+1/CULL_FREQUENCY всех записей, а при CULL_FREQUENCY = 0 - ровно
+столько, сколько нужно, чтобы уложиться в лимит.
+Число записей и их суммарный размер триггеры держат в строке
+`cache_stats`, так что проверка лимита при записи - чтение одной
+строки, а не `COUNT(*)` по всей таблице.
+Записи можно помечать тегами (`set(..., tags=[...])`) и удалять
+пачкой через `delete_tag`.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_entry ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB,'
+    ' size INTEGER NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL'
+    ')',
+    'CREATE INDEX IF NOT EXISTS cache_entry_accessed'
+    ' ON cache_entry (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_entry_expires'
+    ' ON cache_entry (expires)',
+    'CREATE TABLE IF NOT EXISTS cache_tag ('
+    ' tag TEXT NOT NULL,'
+    ' key TEXT NOT NULL,'
+    ' PRIMARY KEY (tag, key)'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_tag_key ON cache_tag (key)',
+    'CREATE TABLE IF NOT EXISTS cache_stats ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 0),'
+    ' entries INTEGER NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ')',
+    'CREATE TRIGGER IF NOT EXISTS cache_entry_inserted'
+    ' AFTER INSERT ON cache_entry BEGIN'
+    ' UPDATE cache_stats SET entries = entries + 1, size = size + NEW.size;'
+    ' END',
+    'CREATE TRIGGER IF NOT EXISTS cache_entry_deleted'
+    ' AFTER DELETE ON cache_entry BEGIN'
+    ' UPDATE cache_stats SET entries = entries - 1, size = size - OLD.size;'
+    ' END',
+    'CREATE TRIGGER IF NOT EXISTS cache_entry_resized'
+    ' AFTER UPDATE OF size ON cache_entry BEGIN'
+    ' UPDATE cache_stats SET size = size - OLD.size + NEW.size;'
+    ' END',
+)
+
+# Отметку последнего чтения обновляем не чаще раза в столько секунд,
+# чтобы чтение почти никогда не превращалось в запись.
+ACCESS_RESOLUTION = 1.0
+
+
+class SQLiteCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._location = location
+        options = params.get('OPTIONS', {})
+        self._max_size = options.get('MAX_SIZE')
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._local = threading.local()
+
+    # Соединение: своё у каждого потока и у каждого процесса после fork.
+
+    def _connection(self):
+        pid = os.getpid()
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != pid:
+            directory = os.path.dirname(self._location)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._location,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            # Без этого REPLACE удаляет старую строку мимо триггера.
+            connection.execute('PRAGMA recursive_triggers=ON')
+            with _Transaction(connection):
+                for statement in SCHEMA:
+                    connection.execute(statement)
+                # Файл кеша мог быть создан до `cache_stats`.
+                connection.execute(
+                    'INSERT OR IGNORE INTO cache_stats (id, entries, size) '
+                    'SELECT 0, COUNT(*), COALESCE(SUM(size), 0) '
+                    'FROM cache_entry '
+                    'WHERE NOT EXISTS (SELECT 1 FROM cache_stats)'
+                )
+            self._local.connection = connection
+            self._local.pid = pid
+        return connection
+
+    def _write(self):
+        """Транзакция с блокировкой записи сразу (BEGIN IMMEDIATE)."""
+        return _Transaction(self._connection())
+
+    @staticmethod
+    def _encode(value):
+        if type(value) is int:
+            return value, 8
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return data, len(data)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    # API кеша Django.
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        with self._write() as connection:
+            connection.execute(
+                'DELETE FROM cache_entry WHERE key = ? AND expires <= ?',
+                (key, now)
+            )
+            added = self._insert(
+                connection, 'INSERT OR IGNORE', key, value, timeout, now
+            )
+            if added:
+                self._cull(connection, now)
+        return added
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        found = self._get_many([key])
+        return found.get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self.make_key(key, version=version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        found = self._get_many(list(made))
+        return {made[key]: value for key, value in found.items()}
+
+    def _get_many(self, keys):
+        if not keys:
+            return {}
+        now = time.time()
+        connection = self._connection()
+        placeholders = ','.join('?' * len(keys))
+        rows = connection.execute(
+            'SELECT key, value, accessed FROM cache_entry '
+            'WHERE key IN (%s) AND (expires IS NULL OR expires > ?)'
+            % placeholders,
+            (*keys, now)
+        ).fetchall()
+        stale = [key for key, _, accessed in rows
+                 if accessed < now - ACCESS_RESOLUTION]
+        if stale:
+            connection.execute(
+                'UPDATE cache_entry SET accessed = ? WHERE key IN (%s)'
+                % ','.join('?' * len(stale)),
+                (now, *stale)
+            )
+        return {key: self._decode(value) for key, value, _ in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None,
+            tags=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        with self._write() as connection:
+            self._insert(connection, 'REPLACE', key, value, timeout, now)
+            connection.execute('DELETE FROM cache_tag WHERE key = ?', (key,))
+            if tags:
+                connection.executemany(
+                    'INSERT OR IGNORE INTO cache_tag (tag, key) VALUES (?, ?)',
+                    [(tag, key) for tag in set(tags)]
+                )
+            self._cull(connection, now)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None,
+                 tags=None):
+        for key, value in data.items():
+            self.set(key, value, timeout, version=version, tags=tags)
+        return []
+
+    def _insert(self, connection, verb, key, value, timeout, now):
+        data, size = self._encode(value)
+        cursor = connection.execute(
+            '%s INTO cache_entry (key, value, size, expires, accessed) '
+            'VALUES (?, ?, ?, ?, ?)' % verb,
+            (key, data, size, self.get_backend_timeout(timeout), now)
+        )
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        with self._write() as connection:
+            cursor = connection.execute(
+                'UPDATE cache_entry SET expires = ?, accessed = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), now, key, now)
+            )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        with self._write() as connection:
+            cursor = connection.execute(
+                'UPDATE cache_entry SET value = value + ?, accessed = ? '
+                "WHERE key = ? AND typeof(value) = 'integer' "
+                'AND (expires IS NULL OR expires > ?)',
+                (delta, now, key, now)
+            )
+            if cursor.rowcount != 1:
+                raise ValueError("Key '%s' not found" % key)
+            return connection.execute(
+                'SELECT value FROM cache_entry WHERE key = ?', (key,)
+            ).fetchone()[0]
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._delete_keys([key])
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        self._delete_keys(keys)
+
+    def _delete_keys(self, keys):
+        if not keys:
+            return
+        placeholders = ','.join('?' * len(keys))
+        with self._write() as connection:
+            connection.execute(
+                'DELETE FROM cache_entry WHERE key IN (%s)' % placeholders,
+                keys
+            )
+            connection.execute(
+                'DELETE FROM cache_tag WHERE key IN (%s)' % placeholders,
+                keys
+            )
+
+    def delete_tag(self, tag):
+        """Удаляет все записи, сохранённые с тегом `tag`."""
+        with self._write() as connection:
+            connection.execute(
+                'DELETE FROM cache_entry WHERE key IN '
+                '(SELECT key FROM cache_tag WHERE tag = ?)',
+                (tag,)
+            )
+            connection.execute('DELETE FROM cache_tag WHERE tag = ?', (tag,))
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache_entry '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        with self._write() as connection:
+            connection.execute('DELETE FROM cache_entry')
+            connection.execute('DELETE FROM cache_tag')
+
+    def close(self, **kwargs):
+        # Соединение переживает запрос: открывать файл заново на каждый
+        # запрос дороже, чем держать его открытым.
+        pass
+
+    # Вытеснение.
+
+    @staticmethod
+    def _stats(connection):
+        return connection.execute(
+            'SELECT entries, size FROM cache_stats'
+        ).fetchone()
+
+    def _cull(self, connection, now):
+        count, size = self._stats(connection)
+        if not self._over_limit(count, size):
+            return
+        connection.execute(
+            'DELETE FROM cache_entry WHERE expires <= ?', (now,)
+        )
+        count, size = self._stats(connection)
+        if not self._over_limit(count, size):
+            self._drop_orphan_tags(connection)
+            return
+        # Как и встроенные бэкенды, освобождаем сразу 1/CULL_FREQUENCY
+        # записей, чтобы не вытеснять по одной на каждую вставку.
+        target = count - self._max_entries
+        if self._cull_frequency:
+            target = max(target, count // self._cull_frequency)
+        connection.execute(
+            'DELETE FROM cache_entry WHERE key IN ('
+            'SELECT key FROM cache_entry ORDER BY accessed LIMIT ?)',
+            (max(target, 1),)
+        )
+        if self._max_size:
+            connection.execute(
+                'DELETE FROM cache_entry WHERE key IN ('
+                ' SELECT key FROM ('
+                '  SELECT key, SUM(size) OVER (ORDER BY accessed DESC) AS kept'
+                '  FROM cache_entry'
+                ' ) WHERE kept > ?'
+                ')',
+                (self._max_size,)
+            )
+        self._drop_orphan_tags(connection)
+
+    def _over_limit(self, count, size):
+        if count > self._max_entries:
+            return True
+        return bool(self._max_size) and size > self._max_size
+
+    @staticmethod
+    def _drop_orphan_tags(connection):
+        connection.execute(
+            'DELETE FROM cache_tag WHERE key NOT IN '
+            '(SELECT key FROM cache_entry)'
+        )
+
+
+class _Transaction:
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.connection.execute('COMMIT')
+        else:
+            self.connection.execute('ROLLBACK')
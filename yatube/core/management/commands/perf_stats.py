@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core import perf
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка замеров PerfMiddleware по всем воркерам: перцентили '
+        'времени, SQL, шаблонов и кеша по view.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json', action='store_true', help='Вывести сводку в JSON.'
+        )
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='После вывода удалить накопленные файлы воркеров.'
+        )
+
+    def handle(self, *args, **options):
+        summary = perf.summary(perf.collect())
+        if options['json']:
+            self.stdout.write(json.dumps(summary, ensure_ascii=False,
+                                         indent=2, sort_keys=True))
+        else:
+            self.stdout.write(
+                f'{"view":<32} {"запросов":>8} {"p50":>7} {"p95":>7} '
+                f'{"p99":>7} {"SQL":>6} {"SQL мс":>7} {"шаблоны":>8} '
+                f'{"кеш":>6}'
+            )
+            for view_name, stats in summary.items():
+                wall = stats['wall_ms']
+                ratio = stats['cache']['hit_ratio']
+                self.stdout.write(
+                    f'{view_name:<32} {stats["requests"]:>8} '
+                    f'{wall["p50"]:>7.0f} {wall["p95"]:>7.0f} '
+                    f'{wall["p99"]:>7.0f} {stats["queries"]["mean"]:>6} '
+                    f'{stats["db_ms"]["mean"]:>7} '
+                    f'{stats["render_ms"]["mean"]:>8} '
+                    f'{"-" if ratio is None else f"{ratio:.0%}":>6}'
+                )
+        if options['reset']:
+            perf.reset()
@@ -0,0 +1,55 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import profiler
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводит стеки сэмплирующего профайлера в один collapsed-файл '
+        '(вход flamegraph.pl и speedscope) или печатает самые горячие кадры.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'views', nargs='*',
+            help='Имена view (posts:post_detail); по умолчанию все.'
+        )
+        parser.add_argument(
+            '--output', help='Файл для стеков; по умолчанию stdout.'
+        )
+        parser.add_argument(
+            '--top', type=int, default=0,
+            help='Вместо стеков вывести N самых горячих кадров.'
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='После вывода удалить собранные файлы.'
+        )
+
+    def handle(self, *args, **options):
+        paths = profiler.files(options['views'])
+        if not paths:
+            raise CommandError('Стеков пока нет - проверьте PROFILE_RATE.')
+        stacks = profiler.load(paths)
+        if options['top']:
+            total = sum(stacks.values())
+            lines = [
+                f'{count / total:7.1%}  {count:>7}  {frame}'
+                for frame, count in profiler.hottest(stacks, options['top'])
+            ]
+        else:
+            lines = [
+                f'{stack} {count}'
+                for stack, count in sorted(stacks.items())
+            ]
+        text = '\n'.join(lines) + '\n'
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(text)
+        else:
+            self.stdout.write(text, ending='')
+        if options['clear']:
+            for path in paths:
+                os.remove(path)
@@ -0,0 +1,60 @@
+import threading
+
+from django.conf import settings
+
+from . import perf, profiler
+
+
+class PerfMiddleware:
+    """Записывает время, SQL, рендеринг и кеш запроса в `core.perf`.
+
+    Стоит первым в MIDDLEWARE, чтобы время учитывало остальные
+    middleware. Запросы, не дошедшие до view (404 резолвера), не пишутся.
+    С `PERF_SERVER_TIMING = True` фазы запроса уходят заголовком
+    Server-Timing (видно во вкладке Network браузера) - только при
+    DEBUG или сотрудникам: остальным незачем знать, сколько SQL
+    и кеша стоит страница.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        perf.install()
+
+    def __call__(self, request):
+        with perf.recording(perf.Recorder()) as recorder:
+            response = self.get_response(request)
+            if settings.PERF_SERVER_TIMING and self.timing_allowed(request):
+                response['Server-Timing'] = perf.server_timing(recorder)
+        match = request.resolver_match
+        if match is not None:
+            perf.record(match.view_name, recorder)
+        return response
+
+    @staticmethod
+    def timing_allowed(request):
+        if settings.DEBUG:
+            return True
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+
+class SamplingProfilerMiddleware:
+    """Профилирует долю запросов к выбранным view (см. `core.profiler`)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            sampler = request.__dict__.pop('_sampler', None)
+            if sampler is not None:
+                profiler.save(
+                    request.resolver_match.view_name, sampler.stop()
+                )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if profiler.should_sample(request.resolver_match.view_name):
+            request._sampler = profiler.Sampler(threading.get_ident())
+            request._sampler.start()
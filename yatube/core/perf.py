@@ -0,0 +1,402 @@
+"""Замеры запросов в продакшене: время, SQL, рендеринг и кеш по view.
+
+`core.middleware.PerfMiddleware` заводит на запрос `Recorder`, а хуки
+из `install()` дописывают в него время SQL (execute_wrapper), рендеринга
+шаблонов (`Template.render` бэкенда Django) и обращений к кешу (методы
+классов бэкендов из `CACHES`, попадания и промахи - по `get`/`get_many`).
+Остальной код отмечает свои фазы декоратором `timed` (превью картинок
+в `posts.thumbnails`). Вне запроса хуки ничего не делают.
+
+Итоги копятся в гистограммах процесса по имени view (`posts:index`)
+и раз в `PERF_FLUSH_INTERVAL` секунд сбрасываются в `PERF_DIR`
+файлом на процесс; `collect()` сводит файлы всех воркеров.
+Медленные запросы (`PERF_SLOW_REQUEST_MS`) пишутся в лог вместе с SQL.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Верхние границы корзин гистограмм, мс; последняя корзина - всё дольше.
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+TIMINGS = ('wall_ms', 'db_ms', 'render_ms', 'cache_ms', 'thumbnail_ms')
+# Сколько SQL-запросов запоминать для лога медленного запроса.
+MAX_SQL_SAMPLES = 50
+
+CACHE_WRITES = ('set', 'set_many', 'add', 'delete', 'delete_many', 'incr',
+                'decr', 'touch', 'has_key')
+
+_current = ContextVar('perf_recorder', default=None)
+_MISSING = object()
+
+
+class Recorder:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql = []
+        self.timings = dict.fromkeys(TIMINGS, 0.0)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.depth = {}
+
+    def add(self, timing, seconds):
+        self.timings[timing] += seconds * 1000
+
+    @contextmanager
+    def measure(self, timing):
+        # Вложенные вызовы (get_or_set -> get, include-шаблоны через
+        # render_to_string) учитываются один раз - внешним.
+        depth = self.depth.get(timing, 0)
+        self.depth[timing] = depth + 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.depth[timing] = depth
+            if not depth:
+                self.add(timing, time.perf_counter() - started)
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def finish(self):
+        self.timings['wall_ms'] = self.elapsed_ms()
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def recording(recorder):
+    """Делает `recorder` текущим и подключает его к соединениям с БД."""
+    token = _current.set(recorder)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(_execute_wrapper)
+                )
+            yield recorder
+    finally:
+        _current.reset(token)
+        recorder.finish()
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    recorder = current()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        recorder.queries += 1
+        recorder.add('db_ms', elapsed)
+        if len(recorder.sql) < MAX_SQL_SAMPLES:
+            recorder.sql.append((elapsed * 1000, sql))
+
+
+# Хуки шаблонов и кеша.
+
+_installed = set()
+_install_lock = threading.Lock()
+
+
+def install():
+    """Ставит хуки шаблонов и кеша; повторный вызов ничего не делает."""
+    with _install_lock:
+        from django.template.backends.django import Template
+        _patch(Template, 'render', timed('render_ms'))
+        for options in settings.CACHES.values():
+            backend = import_string(options['BACKEND'])
+            _patch(backend, 'get', _cache_get)
+            _patch(backend, 'get_many', _cache_get_many)
+            for name in CACHE_WRITES:
+                _patch(backend, name, timed('cache_ms'))
+
+
+def _patch(cls, name, wrapper):
+    if (cls, name) in _installed:
+        return
+    _installed.add((cls, name))
+    setattr(cls, name, wrapper(getattr(cls, name)))
+
+
+def timed(timing):
+    """Декоратор: время вызова идёт в фазу `timing` текущего запроса."""
+    def wrapper(method):
+        @wraps(method)
+        def measured(*args, **kwargs):
+            recorder = current()
+            if recorder is None:
+                return method(*args, **kwargs)
+            with recorder.measure(timing):
+                return method(*args, **kwargs)
+        return measured
+    return wrapper
+
+
+def _cache_get(method):
+    @wraps(method)
+    def get(self, key, default=None, version=None):
+        recorder = current()
+        if recorder is None:
+            return method(self, key, default, version=version)
+        with recorder.measure('cache_ms'):
+            value = method(self, key, _MISSING, version=version)
+        if not recorder.depth.get('cache_ms'):
+            if value is _MISSING:
+                recorder.cache_misses += 1
+            else:
+                recorder.cache_hits += 1
+        return default if value is _MISSING else value
+    return get
+
+
+def _cache_get_many(method):
+    @wraps(method)
+    def get_many(self, keys, version=None):
+        recorder = current()
+        if recorder is None:
+            return method(self, keys, version=version)
+        keys = list(keys)
+        with recorder.measure('cache_ms'):
+            found = method(self, keys, version=version)
+        if not recorder.depth.get('cache_ms'):
+            recorder.cache_hits += len(found)
+            recorder.cache_misses += len(keys) - len(found)
+        return found
+    return get_many
+
+
+# Server-Timing.
+
+# Имя метрики, фаза и описание; заголовки - только latin-1.
+SERVER_TIMING = (
+    ('db', 'db_ms', 'SQL'),
+    ('cache', 'cache_ms', 'Cache'),
+    ('tpl', 'render_ms', 'Templates'),
+    ('thumb', 'thumbnail_ms', 'Thumbnails'),
+)
+
+
+def server_timing(recorder):
+    """Значение заголовка Server-Timing для запроса в процессе."""
+    metrics = []
+    for name, timing, description in SERVER_TIMING:
+        if timing == 'db_ms':
+            description = f'{description} x{recorder.queries}'
+        metrics.append(
+            f'{name};dur={recorder.timings[timing]:.1f};desc="{description}"'
+        )
+    metrics.append(f'total;dur={recorder.elapsed_ms():.1f}')
+    return ', '.join(metrics)
+
+
+# Гистограммы.
+
+def _empty_view():
+    stats = {timing: _empty_histogram() for timing in TIMINGS}
+    stats.update(requests=0, slow=0, queries=0, max_queries=0,
+                 cache_hits=0, cache_misses=0)
+    return stats
+
+
+def _empty_histogram():
+    return {'buckets': [0] * (len(BUCKETS_MS) + 1), 'sum': 0.0, 'max': 0.0}
+
+
+def _add(histogram, value):
+    index = len(BUCKETS_MS)
+    for position, bound in enumerate(BUCKETS_MS):
+        if value <= bound:
+            index = position
+            break
+    histogram['buckets'][index] += 1
+    histogram['sum'] += value
+    histogram['max'] = max(histogram['max'], value)
+
+
+def percentile(histogram, percent):
+    """Верхняя граница корзины, в которую попал перцентиль."""
+    total = sum(histogram['buckets'])
+    if not total:
+        return 0.0
+    rank = percent / 100 * total
+    seen = 0
+    for index, count in enumerate(histogram['buckets']):
+        seen += count
+        if seen >= rank and count:
+            if index == len(BUCKETS_MS):
+                return histogram['max']
+            return float(min(BUCKETS_MS[index], histogram['max']))
+    return histogram['max']
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+_flushed = time.monotonic()
+
+
+def record(view_name, recorder):
+    """Добавляет запрос в гистограммы view и пишет медленный в лог."""
+    global _flushed
+    slow = recorder.timings['wall_ms'] >= settings.PERF_SLOW_REQUEST_MS
+    with _stats_lock:
+        stats = _stats.setdefault(view_name, _empty_view())
+        stats['requests'] += 1
+        stats['slow'] += slow
+        stats['queries'] += recorder.queries
+        stats['max_queries'] = max(stats['max_queries'], recorder.queries)
+        stats['cache_hits'] += recorder.cache_hits
+        stats['cache_misses'] += recorder.cache_misses
+        for timing in TIMINGS:
+            _add(stats[timing], recorder.timings[timing])
+        flush = time.monotonic() - _flushed >= settings.PERF_FLUSH_INTERVAL
+        if flush:
+            _flushed = time.monotonic()
+    if slow:
+        _log_slow(view_name, recorder)
+    if flush:
+        save()
+
+
+def _log_slow(view_name, recorder):
+    statements = '\n'.join(
+        f'  {elapsed:8.2f} мс  {sql}' for elapsed, sql in recorder.sql
+    )
+    logger.warning(
+        'Медленный запрос %s: %.1f мс, SQL %d (%.1f мс), шаблоны %.1f мс, '
+        'кеш %.1f мс\n%s',
+        view_name, recorder.timings['wall_ms'], recorder.queries,
+        recorder.timings['db_ms'], recorder.timings['render_ms'],
+        recorder.timings['cache_ms'], statements,
+    )
+
+
+def snapshot():
+    with _stats_lock:
+        return json.loads(json.dumps(_stats))
+
+
+def reset():
+    """Обнуляет гистограммы процесса и удаляет файлы всех воркеров."""
+    with _stats_lock:
+        _stats.clear()
+    for path in _files():
+        os.remove(path)
+
+
+# Файлы воркеров.
+
+def _own_file():
+    return os.path.join(
+        settings.PERF_DIR, f'stats-{socket.gethostname()}-{os.getpid()}.json'
+    )
+
+
+def _files():
+    if not os.path.isdir(settings.PERF_DIR):
+        return []
+    return [
+        os.path.join(settings.PERF_DIR, name)
+        for name in sorted(os.listdir(settings.PERF_DIR))
+        if name.startswith('stats-') and name.endswith('.json')
+    ]
+
+
+def save():
+    """Сбрасывает гистограммы процесса в его файл (атомарно)."""
+    os.makedirs(settings.PERF_DIR, exist_ok=True)
+    path = _own_file()
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump(snapshot(), file)
+    os.replace(temporary, path)
+
+
+def merge(snapshots):
+    merged = {}
+    for views in snapshots:
+        for view_name, stats in views.items():
+            total = merged.setdefault(view_name, _empty_view())
+            for key, value in stats.items():
+                if key in TIMINGS:
+                    total[key]['buckets'] = [
+                        a + b for a, b in
+                        zip(total[key]['buckets'], value['buckets'])
+                    ]
+                    total[key]['sum'] += value['sum']
+                    total[key]['max'] = max(total[key]['max'], value['max'])
+                elif key == 'max_queries':
+                    total[key] = max(total[key], value)
+                else:
+                    total[key] += value
+    return merged
+
+
+def collect():
+    """Гистограммы всех воркеров: файлы плюс живые данные процесса."""
+    own = _own_file()
+    snapshots = [snapshot()]
+    for path in _files():
+        if path == own:
+            continue
+        try:
+            with open(path, encoding='utf-8') as file:
+                snapshots.append(json.load(file))
+        except (OSError, ValueError):
+            continue
+    return merge(snapshots)
+
+
+def summary(views):
+    """Перцентили и средние по view, самые медленные (p95) - первыми."""
+    result = {}
+    for view_name, stats in views.items():
+        requests = stats['requests']
+        lookups = stats['cache_hits'] + stats['cache_misses']
+        result[view_name] = {
+            'requests': requests,
+            'slow': stats['slow'],
+            'queries': {
+                'mean': round(stats['queries'] / requests, 2),
+                'max': stats['max_queries'],
+            },
+            'cache': {
+                'hits': stats['cache_hits'],
+                'misses': stats['cache_misses'],
+                'hit_ratio': (
+                    round(stats['cache_hits'] / lookups, 3)
+                    if lookups else None
+                ),
+            },
+        }
+        for timing in TIMINGS:
+            histogram = stats[timing]
+            result[view_name][timing] = {
+                'p50': percentile(histogram, 50),
+                'p95': percentile(histogram, 95),
+                'p99': percentile(histogram, 99),
+                'mean': round(histogram['sum'] / requests, 2),
+                'max': round(histogram['max'], 2),
+            }
+    return dict(sorted(
+        result.items(), key=lambda item: -item[1]['wall_ms']['p95']
+    ))
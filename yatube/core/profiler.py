@@ -0,0 +1,113 @@
+"""Сэмплирующий профайлер для редких медленных запросов.
+
+Для доли `PROFILE_RATE` запросов к view из `PROFILE_VIEWS`
+`core.middleware.SamplingProfilerMiddleware` запускает `Sampler`:
+фоновый поток раз в `PROFILE_INTERVAL` секунд снимает стек потока
+запроса через `sys._current_frames()` - без внешних сервисов
+и без хуков на каждый вызов, как у cProfile. Стеки складываются
+в формате collapsed (`кадр;кадр;кадр число`) и дописываются в
+`PROFILE_DIR/<view>.collapsed`; команда `profile_stacks` сводит
+файлы для flamegraph.pl или speedscope.
+
+С `PROFILE_RATE = 0` (по умолчанию) на запрос остаётся одна проверка.
+"""
+import os
+import random
+import sys
+import threading
+from collections import Counter
+
+from django.conf import settings
+
+SUFFIX = '.collapsed'
+
+
+def should_sample(view_name):
+    rate = settings.PROFILE_RATE
+    return (
+        bool(rate)
+        and view_name in settings.PROFILE_VIEWS
+        and random.random() < rate
+    )
+
+
+def _label(frame):
+    module = frame.f_globals.get('__name__', '?')
+    return f'{module}:{frame.f_code.co_name}'
+
+
+class Sampler(threading.Thread):
+    """Снимает стеки потока `thread_id`, пока не вызван `stop`."""
+
+    def __init__(self, thread_id, interval=None):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval or settings.PROFILE_INTERVAL
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+        return self.stacks
+
+
+def path(view_name):
+    # ':' из имени view неудобен в именах файлов.
+    return os.path.join(
+        settings.PROFILE_DIR, view_name.replace(':', '.') + SUFFIX
+    )
+
+
+def save(view_name, stacks):
+    """Дописывает стеки запроса в файл view одной записью."""
+    if not stacks:
+        return
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    text = ''.join(f'{stack} {count}\n' for stack, count in stacks.items())
+    with open(path(view_name), 'a', encoding='utf-8') as file:
+        file.write(text)
+
+
+def load(paths):
+    """Суммирует стеки из collapsed-файлов."""
+    stacks = Counter()
+    for file_path in paths:
+        with open(file_path, encoding='utf-8') as file:
+            for line in file:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack and count.isdigit():
+                    stacks[stack] += int(count)
+    return stacks
+
+
+def files(view_names=None):
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    names = sorted(
+        name for name in os.listdir(settings.PROFILE_DIR)
+        if name.endswith(SUFFIX)
+    )
+    if view_names:
+        wanted = {os.path.basename(path(name)) for name in view_names}
+        names = [name for name in names if name in wanted]
+    return [os.path.join(settings.PROFILE_DIR, name) for name in names]
+
+
+def hottest(stacks, limit):
+    """Кадры, в которых чаще всего стоял профилируемый поток (self)."""
+    leaves = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(';', 1)[-1]] += count
+    return leaves.most_common(limit)
@@ -0,0 +1,120 @@
+"""Ограничение частоты пишущих запросов через кеш.
+
+`limit(view_name)` пропускает не больше `RATE_LIMITS[view_name]` =
+(запросов, секунд) с одного пользователя и в `RATE_LIMIT_IP_FACTOR`
+раз больше с одного IP (за NAT сидит много людей). Лишний запрос
+получает 429 с `Retry-After`.
+
+Это ведро токенов, приближённое двумя соседними окнами: в Django-кеше
+нет compare-and-set, зато `incr` атомарен. Счётчик текущего окна
+увеличивается `incr`, счётчик прошлого учитывается с весом оставшейся
+его доли - ведро «протекает» плавно, а не сбрасывается на границе
+окна. Отказ не тратит токен (`decr` обратно), в том числе уже взятый
+из ведра пользователя, если отказало ведро IP.
+
+IP клиента - `REMOTE_ADDR`, а за обратным прокси - последний адрес
+из заголовка `RATE_LIMIT_IP_HEADER` (его дописывает сам прокси,
+остальные мог подставить клиент).
+"""
+import math
+import time
+from functools import wraps
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import render
+
+KEY_PREFIX = 'ratelimit:'
+
+
+def _key(scope, identity, slot):
+    return f'{KEY_PREFIX}{scope}:{identity}:{slot}'
+
+
+def retry_after(scope, identity, capacity, period, now=None):
+    """Берёт токен; None - можно, иначе через сколько секунд повторить."""
+    if now is None:
+        now = time.time()
+    slot, offset = divmod(now, period)
+    fraction = offset / period
+    key = _key(scope, identity, int(slot))
+    previous_key = _key(scope, identity, int(slot) - 1)
+    # Окно нужно и следующему - как «прошлое».
+    cache.add(key, 0, period * 2)
+    current = cache.incr(key)
+    previous = cache.get(previous_key, 0)
+    if previous * (1 - fraction) + current <= capacity:
+        return None
+    cache.decr(key)
+    # Сколько ещё должно «вытечь» из прошлого окна до свободного токена.
+    excess = previous * (1 - fraction) + current - capacity
+    if previous and excess <= previous * (1 - fraction):
+        wait = excess / previous * period
+    else:
+        wait = (1 - fraction) * period
+    return max(1, math.ceil(wait))
+
+
+def refund(scope, identity, period, now):
+    """Возвращает токен, взятый `retry_after` в момент `now`."""
+    try:
+        cache.decr(_key(scope, identity, int(now // period)))
+    except ValueError:
+        pass
+
+
+def client_ip(request):
+    header = settings.RATE_LIMIT_IP_HEADER
+    forwarded = request.META.get(header, '') if header else ''
+    if forwarded:
+        return forwarded.split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def check(request, view_name):
+    """Через сколько секунд можно повторить запрос или None."""
+    rate = settings.RATE_LIMITS.get(view_name)
+    if rate is None:
+        return None
+    capacity, period = rate
+    buckets = []
+    if request.user.is_authenticated:
+        buckets.append(('user', request.user.pk, capacity))
+    buckets.append(
+        ('ip', client_ip(request), capacity * settings.RATE_LIMIT_IP_FACTOR)
+    )
+    now = time.time()
+    taken = []
+    for kind, identity, bucket_capacity in buckets:
+        scope = f'{view_name}:{kind}'
+        wait = retry_after(scope, identity, bucket_capacity, period, now)
+        if wait is not None:
+            for taken_scope, taken_identity in taken:
+                refund(taken_scope, taken_identity, period, now)
+            return wait
+        taken.append((scope, identity))
+    return None
+
+
+def limit(view_name, methods=None):
+    """Декоратор view: 429 с Retry-After сверх `RATE_LIMITS[view_name]`.
+
+    С `methods` ограничиваются только эти методы (форма по GET
+    ничего не пишет).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if methods is None or request.method in methods:
+                wait = check(request, view_name)
+                if wait is not None:
+                    response = render(
+                        request, 'core/429.html', {'retry_after': wait},
+                        status=HTTPStatus.TOO_MANY_REQUESTS
+                    )
+                    response['Retry-After'] = str(wait)
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
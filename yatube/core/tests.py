@@ -0,0 +1,336 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http import HTTPStatus
+from io import StringIO
+from multiprocessing import Process
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+
+from . import perf, profiler, ratelimit
+from .cache import SQLiteCache
+
+User = get_user_model()
+
+PERF_DIR = tempfile.mkdtemp()
+
+
+def _increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location, {
+            'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 0},
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'value': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'value': [1, 2]})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_ttl(self):
+        self.cache.set('expired', 'value', timeout=0)
+        self.cache.set('forever', 'value', timeout=None)
+        self.assertIsNone(self.cache.get('expired'))
+        self.assertTrue(self.cache.add('expired', 'new'))
+        self.assertFalse(self.cache.add('forever', 'new'))
+        self.assertEqual(self.cache.get('forever'), 'value')
+
+    def test_incr_is_shared_between_processes(self):
+        self.cache.set('counter', 0)
+        workers = [
+            Process(target=_increment, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for number in range(10):
+            self.cache.set(f'key{number}', number)
+        self.cache._connection().execute(
+            'UPDATE cache_entry SET accessed = accessed - 100'
+        )
+        self.cache.get('key0')
+        self.cache.set('key10', 10)
+        self.assertEqual(self.cache.get('key0'), 0)
+        self.assertIsNone(self.cache.get('key1'))
+        self.assertEqual(self.cache.get('key10'), 10)
+
+    def test_size_cap(self):
+        cache = SQLiteCache(self.location, {
+            'OPTIONS': {'MAX_SIZE': 3000, 'CULL_FREQUENCY': 0},
+        })
+        for number in range(5):
+            cache.set(f'blob{number}', b'x' * 1000)
+        self.assertIsNone(cache.get('blob0'))
+        self.assertIsNotNone(cache.get('blob4'))
+
+    def test_stats_follow_writes(self):
+        def stats():
+            connection = self.cache._connection()
+            return (
+                self.cache._stats(connection),
+                connection.execute(
+                    'SELECT COUNT(*), COALESCE(SUM(size), 0) '
+                    'FROM cache_entry'
+                ).fetchone(),
+            )
+
+        self.cache.set('blob', b'x' * 100)
+        self.cache.set('blob', b'x' * 300)
+        self.cache.add('other', 'value')
+        self.cache.set('counter', 1, tags=['tag'])
+        self.cache.incr('counter')
+        for number in range(12):
+            self.cache.set(f'key{number}', number)
+        self.cache.delete('key11')
+        self.cache.delete_tag('tag')
+        current, actual = stats()
+        self.assertEqual(current, actual)
+        self.cache.clear()
+        self.assertEqual(stats(), ((0, 0), (0, 0)))
+
+    def test_delete_tag(self):
+        self.cache.set('first', 1, tags=['group:1'])
+        self.cache.set('second', 2, tags=['group:1', 'author:1'])
+        self.cache.set('third', 3, tags=['author:1'])
+        self.cache.delete_tag('group:1')
+        self.assertEqual(
+            self.cache.get_many(['first', 'second', 'third']), {'third': 3}
+        )
+
+
+@override_settings(PERF_DIR=PERF_DIR, PERF_FLUSH_INTERVAL=0)
+class PerfMiddlewareTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(PERF_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        perf.reset()
+
+    def test_records_queries_render_and_cache_per_view(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        stats = perf.summary(perf.collect())['posts:index']
+        self.assertEqual(stats['requests'], 2)
+        self.assertGreater(stats['queries']['max'], 0)
+        self.assertGreater(stats['render_ms']['max'], 0)
+        self.assertGreater(stats['cache']['hits'], 0)
+        self.assertGreater(stats['cache']['misses'], 0)
+        self.assertEqual(len(os.listdir(PERF_DIR)), 1)
+
+    def test_slow_request_is_logged_with_sql(self):
+        with override_settings(PERF_SLOW_REQUEST_MS=0):
+            with self.assertLogs('core.perf', 'WARNING') as logs:
+                self.client.get(reverse('posts:index'))
+        self.assertIn('posts:index', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_server_timing_header_is_opt_in(self):
+        url = reverse('posts:index')
+        self.client.force_login(User.objects.create_user(
+            'timing_staff', is_staff=True
+        ))
+        self.assertFalse(self.client.get(url).has_header('Server-Timing'))
+        with override_settings(PERF_SERVER_TIMING=True):
+            header = self.client.get(url)['Server-Timing']
+        metrics = [metric.split(';')[0] for metric in header.split(', ')]
+        self.assertEqual(metrics, ['db', 'cache', 'tpl', 'thumb', 'total'])
+        self.assertRegex(header, r'db;dur=\d+\.\d;desc="SQL x\d+"')
+
+    @override_settings(PERF_SERVER_TIMING=True)
+    def test_server_timing_is_hidden_from_visitors(self):
+        url = reverse('posts:index')
+        self.assertFalse(self.client.get(url).has_header('Server-Timing'))
+        self.client.force_login(User.objects.create_user('visitor'))
+        self.assertFalse(self.client.get(url).has_header('Server-Timing'))
+        self.client.logout()
+        with override_settings(DEBUG=True):
+            self.assertTrue(
+                self.client.get(url).has_header('Server-Timing')
+            )
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.client.get(reverse('posts:index'))
+        url = reverse('perf_stats')
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.FOUND)
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['posts:index']['requests'], 1)
+
+    def test_command_merges_worker_files(self):
+        self.client.get(reverse('posts:index'))
+        [own] = os.listdir(PERF_DIR)
+        shutil.copy(
+            os.path.join(PERF_DIR, own),
+            os.path.join(PERF_DIR, 'stats-other-1.json')
+        )
+        out = StringIO()
+        call_command('perf_stats', json=True, reset=True, stdout=out)
+        summary = json.loads(out.getvalue())
+        self.assertEqual(summary['posts:index']['requests'], 2)
+        self.assertEqual(os.listdir(PERF_DIR), [])
+
+
+def _busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+@override_settings(
+    PROFILE_DIR=os.path.join(PERF_DIR, 'profiles'),
+    PROFILE_VIEWS=('posts:index',),
+    PROFILE_INTERVAL=0.001,
+)
+class SamplingProfilerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(os.path.join(PERF_DIR, 'profiles'), ignore_errors=True)
+
+    def test_sampler_collects_collapsed_stacks(self):
+        sampler = profiler.Sampler(threading.get_ident())
+        sampler.start()
+        _busy(0.05)
+        stacks = sampler.stop()
+        self.assertTrue(any(
+            stack.endswith('core.tests:_busy') for stack in stacks
+        ))
+
+    def test_only_chosen_views_are_sampled(self):
+        with override_settings(PROFILE_RATE=1), \
+                mock.patch.object(profiler, 'save') as save:
+            self.client.get(reverse('about:author'))
+            self.client.get(reverse('posts:index'))
+        save.assert_called_once()
+        self.assertEqual(save.call_args[0][0], 'posts:index')
+        with mock.patch.object(profiler, 'Sampler') as sampler:
+            self.client.get(reverse('posts:index'))
+        sampler.assert_not_called()
+
+    def test_command_merges_stacks(self):
+        profiler.save('posts:index', {'a;b': 2, 'a;c': 1})
+        profiler.save('posts:index', {'a;b': 3})
+        out = StringIO()
+        call_command('profile_stacks', 'posts:index', stdout=out)
+        self.assertEqual(out.getvalue(), 'a;b 5\na;c 1\n')
+        out = StringIO()
+        call_command('profile_stacks', top=1, clear=True, stdout=out)
+        self.assertIn('b', out.getvalue())
+        self.assertEqual(profiler.files(), [])
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bucket_refills_as_previous_window_leaks(self):
+        for _ in range(3):
+            self.assertIsNone(ratelimit.retry_after('s', 1, 3, 60, now=600))
+        self.assertEqual(ratelimit.retry_after('s', 1, 3, 60, now=601), 59)
+        # Полминуты спустя из прошлого окна «вытекла» половина.
+        self.assertIsNone(ratelimit.retry_after('s', 1, 3, 60, now=690))
+        self.assertEqual(ratelimit.retry_after('s', 1, 3, 60, now=691), 9)
+
+    @override_settings(RATE_LIMITS={'posts:add_comment': (2, 60)})
+    def test_view_returns_429_with_retry_after(self):
+        from posts.models import Post
+        user = User.objects.create_user('limited')
+        post = Post.objects.create(author=user, text='Пост')
+        self.client.force_login(user)
+        url = reverse('posts:add_comment', args=(post.pk,))
+        for _ in range(2):
+            response = self.client.post(url, {'text': 'Спам'})
+            self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        response = self.client.post(url, {'text': 'Спам'})
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(post.comments.count(), 2)
+        other = User.objects.create_user('other_limited')
+        self.client.force_login(other)
+        response = self.client.post(url, {'text': 'Другой'})
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    @override_settings(
+        RATE_LIMITS={'posts:profile_follow': (1, 60)}, RATE_LIMIT_IP_FACTOR=2
+    )
+    def test_ip_bucket_is_shared_between_users(self):
+        author = User.objects.create_user('popular')
+        url = reverse('posts:profile_follow', args=(author.username,))
+        statuses = []
+        for name in ('first', 'second', 'third'):
+            self.client.force_login(User.objects.create_user(name))
+            statuses.append(self.client.get(url).status_code)
+        self.assertEqual(statuses, [HTTPStatus.FOUND, HTTPStatus.FOUND,
+                                    HTTPStatus.TOO_MANY_REQUESTS])
+
+    @override_settings(
+        RATE_LIMITS={'posts:profile_follow': (2, 60)}, RATE_LIMIT_IP_FACTOR=1
+    )
+    def test_ip_rejection_refunds_user_token(self):
+        author = User.objects.create_user('refunded')
+        url = reverse('posts:profile_follow', args=(author.username,))
+        user = User.objects.create_user('patient')
+        self.client.force_login(User.objects.create_user('neighbour'))
+        for _ in range(2):
+            self.client.get(url)
+        self.client.force_login(user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+        # С другого IP пользователь не должен упереться в свой лимит.
+        for _ in range(2):
+            response = self.client.get(url, REMOTE_ADDR='10.0.0.2')
+            self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    @override_settings(RATE_LIMIT_IP_HEADER='HTTP_X_FORWARDED_FOR')
+    def test_client_ip_from_trusted_proxy_header(self):
+        request = RequestFactory().get(
+            '/', HTTP_X_FORWARDED_FOR='1.1.1.1, 203.0.113.7',
+            REMOTE_ADDR='10.0.0.1'
+        )
+        self.assertEqual(ratelimit.client_ip(request), '203.0.113.7')
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(ratelimit.client_ip(request), '10.0.0.1')
+
+    def test_proxy_header_is_ignored_by_default(self):
+        request = RequestFactory().get(
+            '/', HTTP_X_FORWARDED_FOR='1.1.1.1', REMOTE_ADDR='10.0.0.1'
+        )
+        self.assertEqual(ratelimit.client_ip(request), '10.0.0.1')
+
+    @override_settings(RATE_LIMITS={'posts:post_create': (1, 60)})
+    def test_only_listed_methods_are_limited(self):
+        self.client.force_login(User.objects.create_user('writer'))
+        url = reverse('posts:post_create')
+        for _ in range(3):
+            self.assertEqual(self.client.get(url).status_code, HTTPStatus.OK)
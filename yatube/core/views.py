@@ -1,6 +1,10 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 from http import HTTPStatus
 
+from . import perf
+
 
 def page_not_found(request, exception):
     return render(
@@ -24,3 +28,12 @@ def server_error(request):
         "core/500.html",
         status=HTTPStatus.INTERNAL_SERVER_ERROR
     )
+
+
+@staff_member_required
+def perf_stats(request):
+    """Сводка `core.perf` по всем воркерам, только для персонала."""
+    return JsonResponse(
+        perf.summary(perf.collect()),
+        json_dumps_params={'ensure_ascii': False, 'indent': 2}
+    )
@@ -0,0 +1,89 @@
+"""Денормализованные число комментариев и время активности поста.
+
+`Post.comments_count` и `Post.last_activity_at` сдвигаются одним
+UPDATE с `F()` при добавлении и удалении комментария (см. сигналы),
+поэтому ленты показывают «N комментариев» и сортируются по
+обсуждаемости (`?order=discussed`) и активности (`?order=active`)
+без агрегации по `posts_comment`. Комментарии,
+созданные в обход сигналов (`bulk_create` в seed_posts, импорт),
+досчитывает `repair`.
+"""
+from django.db import transaction
+from django.db.models import (Count, DateTimeField, F, Max, Min, OuterRef,
+                              Subquery, Value)
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Post
+
+
+def comment_added(comment):
+    Post.objects.filter(pk=comment.post_id).update(
+        comments_count=F('comments_count') + 1,
+        # Без output_field sqlite3 записал бы дату в своём формате,
+        # а сравнение дат в SQLite строковое.
+        last_activity_at=Greatest('last_activity_at', Value(
+            comment.created, output_field=DateTimeField()
+        )),
+    )
+
+
+def comment_deleted(comment):
+    """Уменьшает счётчик и откатывает активность к последнему
+    оставшемуся комментарию (MAX по индексу `(post, created)`)."""
+    latest = Comment.objects.filter(post=OuterRef('pk')).order_by(
+        '-created'
+    ).values('created')[:1]
+    Post.objects.filter(
+        pk=comment.post_id, comments_count__gt=0
+    ).update(
+        comments_count=F('comments_count') - 1,
+        last_activity_at=Greatest(
+            'pub_date', Coalesce(Subquery(latest), 'pub_date')
+        ),
+    )
+
+
+def repair(post_ids=None, batch_size=5000, post_model=Post,
+           comment_model=Comment):
+    """Пересчитывает счётчики всех постов или `post_ids`.
+
+    Один UPDATE с подзапросами на пачку из `batch_size` id, у каждой
+    пачки своя транзакция - таблица не блокируется надолго.
+    Возвращает число обновлённых постов.
+    """
+    comments = comment_model.objects.filter(
+        post=OuterRef('pk')
+    ).order_by().values('post')
+    values = {
+        'comments_count': Coalesce(
+            Subquery(comments.annotate(total=Count('pk')).values('total')), 0
+        ),
+        'last_activity_at': Greatest('pub_date', Coalesce(
+            Subquery(comments.annotate(latest=Max('created'))
+                     .values('latest')),
+            'pub_date'
+        )),
+    }
+    if post_ids is not None:
+        post_ids = sorted(post_ids)
+        batches = (
+            post_model.objects.filter(
+                pk__in=post_ids[start:start + batch_size]
+            )
+            for start in range(0, len(post_ids), batch_size)
+        )
+    else:
+        bounds = post_model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            return 0
+        batches = (
+            post_model.objects.filter(
+                pk__gte=start, pk__lt=start + batch_size
+            )
+            for start in range(bounds['low'], bounds['high'] + 1, batch_size)
+        )
+    updated = 0
+    for batch in batches:
+        with transaction.atomic():
+            updated += batch.update(**values)
+    return updated
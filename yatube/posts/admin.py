@@ -1,5 +1,19 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin import helpers
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from django.template.response import TemplateResponse
+
+from . import bulk, search
 from .models import Post, Group
+from .paginators import EstimatedCountPaginator
+
+
+class PostActionForm(ActionForm):
+    group = forms.ModelChoiceField(
+        Group.objects.all(), required=False, label='Группа'
+    )
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -10,11 +24,83 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group'
     )
-    list_editable = ('group',)
+    # Автор и группа приходят тем же запросом, что и посты, а вместо
+    # <select> со всеми группами в каждой строке - действие переноса.
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    action_form = PostActionForm
+    actions = ('move_to_group', 'remove_from_group', 'delete_posts')
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # Стандартное удаление выбирает каждый пост и весь его каскад.
+        actions.pop('delete_selected', None)
+        return actions
+
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по поисковому индексу, а не `LIKE '%...%'` по text."""
+        if not search.query_terms(search_term):
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return search.matching_posts(queryset, search_term), False
+
+    def move_to_group(self, request, queryset):
+        try:
+            group = self.action_form.base_fields['group'].clean(
+                request.POST.get('group')
+            )
+        except ValidationError:
+            group = None
+        if group is None:
+            self.message_user(
+                request, 'Выберите группу рядом с действием.',
+                level='warning'
+            )
+            return
+        moved = bulk.move_to_group(queryset, group)
+        self.message_user(request, f'Перенесено в «{group}»: {moved}')
+    move_to_group.short_description = 'Перенести в выбранную группу'
+    move_to_group.allowed_permissions = ('change',)
+
+    def remove_from_group(self, request, queryset):
+        moved = bulk.move_to_group(queryset, None)
+        self.message_user(request, f'Убрано из групп: {moved}')
+    remove_from_group.short_description = 'Убрать из группы'
+    remove_from_group.allowed_permissions = ('change',)
+
+    def delete_posts(self, request, queryset):
+        if request.POST.get('post') == 'yes':
+            deleted = bulk.delete_posts(queryset)
+            self.message_user(request, f'Удалено записей: {deleted}')
+            return None
+        return TemplateResponse(
+            request, 'admin/posts/post/delete_posts.html', {
+                **self.admin_site.each_context(request),
+                'title': 'Удаление записей',
+                'opts': self.model._meta,
+                'count': queryset.count(),
+                'selected': request.POST.getlist(
+                    helpers.ACTION_CHECKBOX_NAME
+                ),
+                'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+                'select_across': request.POST.get('select_across', 0),
+            }
+        )
+    delete_posts.short_description = 'Удалить выбранные записи'
+    delete_posts.allowed_permissions = ('delete',)
+
+
+class GroupAdmin(admin.ModelAdmin):
+    # Нужно для autocomplete_fields постов.
+    search_fields = ('title', 'slug')
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
@@ -0,0 +1,136 @@
+"""JSON API только для чтения: ленты, пост и комментарии к нему.
+
+Выборки те же, что у HTML-страниц (`posts.utils.feed_queryset`,
+`posts.feed.follow_feed`), ленты листаются курсором (`?cursor=`).
+Каждый ответ несёт ETag и Last-Modified (см. `posts.freshness`),
+поэтому клиент может опрашивать API условными запросами и получать
+304 без выборки и сериализации.
+"""
+from functools import wraps
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+from django.views.decorators.vary import vary_on_cookie
+
+from . import consts, feed, freshness, thumbnails, utils
+from .models import Group, Post, User
+from .paginators import CursorPaginator
+
+
+def _response(data, status=200):
+    return JsonResponse(
+        data,
+        status=status,
+        json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')},
+    )
+
+
+def api_login_required(view):
+    """Как `login_required`, но вместо редиректа отвечает 401."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _response({'detail': 'Нужна авторизация.'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+        'thumbnail': thumbnails.thumbnail_url(post, 960, 339),
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+        'author': comment.author.username,
+    }
+
+
+def _feed(request, posts, cursor_class=CursorPaginator):
+    page_obj = utils.make_paginator(
+        posts,
+        request,
+        consts.QUANTITY_OF_POST_TEN,
+        cursor=True,
+        cursor_class=cursor_class
+    )
+    return _response({
+        'results': [serialize_post(post) for post in page_obj],
+        'next': page_obj.next_cursor,
+        'previous': page_obj.previous_cursor,
+    })
+
+
+@require_GET
+@freshness.conditional(freshness.index_state)
+def index(request):
+    return _feed(request, utils.feed_queryset())
+
+
+@require_GET
+@freshness.conditional(freshness.group_state)
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return _feed(request, utils.feed_queryset(group.posts.all()))
+
+
+@require_GET
+@freshness.conditional(freshness.profile_state)
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return _feed(request, utils.feed_queryset(author.posts.all()))
+
+
+@require_GET
+@vary_on_cookie
+@api_login_required
+@freshness.conditional(freshness.follow_state)
+def follow_index(request):
+    return _feed(
+        request,
+        feed.follow_feed(request.user, utils.feed_queryset()),
+        feed.FollowFeedPaginator
+    )
+
+
+@require_GET
+@freshness.conditional(freshness.post_state)
+def post_detail(request, post_id):
+    post = get_object_or_404(
+        utils.feed_queryset(Post.objects.filter(pk=post_id))
+    )
+    data = serialize_post(post)
+    data['author_name'] = post.author.get_full_name()
+    data['group_title'] = post.group.title if post.group_id else None
+    return _response(data)
+
+
+@require_GET
+@freshness.conditional(freshness.post_state)
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    page_obj = utils.make_paginator(
+        post.comments.select_related('author')
+        .only('post', 'text', 'created', 'author__username')
+        .order_by('created', 'pk'),
+        request,
+        consts.QUANTITY_OF_COMMENTS,
+        cursor=False
+    )
+    return _response({
+        'results': [serialize_comment(comment) for comment in page_obj],
+        'page': page_obj.number,
+        'num_pages': page_obj.paginator.num_pages,
+        'count': page_obj.paginator.count,
+    })
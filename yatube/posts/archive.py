@@ -0,0 +1,124 @@
+"""Архив постов по месяцам.
+
+`PostMonth` хранит, сколько постов опубликовано за месяц в каждой
+области счётчиков (`all`, `author:<id>`, `group:<id>`). Сигналы `Post`
+сдвигают строку месяца на ±1 (`adjust`), так что список месяцев
+и число страниц месяца читаются из маленькой таблицы, а не считаются
+по `posts_post`. Посты, созданные в обход сигналов (`bulk_create`
+в seed_posts, импорт), досчитывает `rebuild`.
+"""
+import calendar
+from datetime import MAXYEAR, date, datetime, time
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DateField, F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from . import counters
+from .models import Post, PostMonth
+
+
+def month_start(value):
+    """Первое число месяца, в котором опубликован пост."""
+    return timezone.localtime(value).date().replace(day=1)
+
+
+def month_of(year, month):
+    """Первое число месяца из адреса архива или None.
+
+    Последний месяц `MAXYEAR` не годится: у него нет конца для
+    `month_range`.
+    """
+    if not (1 <= year < MAXYEAR and 1 <= month <= 12):
+        return None
+    return date(year, month, 1)
+
+
+def month_range(month):
+    """Границы месяца для фильтра по `pub_date`: [начало, конец)."""
+    days = calendar.monthrange(month.year, month.month)[1]
+    end = date.fromordinal(month.toordinal() + days)
+    return (
+        timezone.make_aware(datetime.combine(month, time.min)),
+        timezone.make_aware(datetime.combine(end, time.min)),
+    )
+
+
+def adjust(scopes, month, delta):
+    """Сдвигает счётчики месяца областей на `delta`."""
+    for scope in scopes:
+        rows = PostMonth.objects.filter(scope=scope, month=month)
+        if delta < 0:
+            rows = rows.filter(posts_count__gte=-delta)
+        if rows.update(posts_count=F('posts_count') + delta) or delta < 0:
+            continue
+        try:
+            with transaction.atomic():
+                PostMonth.objects.create(
+                    scope=scope, month=month, posts_count=delta
+                )
+        except IntegrityError:
+            # Строку месяца успел создать соседний запрос.
+            rows.update(posts_count=F('posts_count') + delta)
+
+
+def post_added(post):
+    adjust(counters.post_scopes(post), month_start(post.pub_date), 1)
+
+
+def post_deleted(post):
+    adjust(counters.post_scopes(post), month_start(post.pub_date), -1)
+
+
+def group_changed(post, previous_group_id):
+    month = month_start(post.pub_date)
+    if previous_group_id is not None:
+        adjust([counters.group_scope(previous_group_id)], month, -1)
+    if post.group_id is not None:
+        adjust([counters.group_scope(post.group_id)], month, 1)
+
+
+def rebuild(post_model=Post, month_model=PostMonth):
+    """Пересчитывает архив целиком тремя GROUP BY по месяцам.
+
+    Возвращает число строк архива.
+    """
+    month = TruncMonth('pub_date', output_field=DateField())
+    posts = post_model.objects.order_by().annotate(month=month)
+    rows = [
+        month_model(scope=counters.all_scope(), **row)
+        for row in posts.values('month').annotate(posts_count=Count('pk'))
+    ]
+    for field, scope in (('author', counters.author_scope),
+                         ('group', counters.group_scope)):
+        grouped = posts.filter(**{f'{field}__isnull': False}).values(
+            field, 'month'
+        ).annotate(posts_count=Count('pk'))
+        rows += [
+            month_model(
+                scope=scope(row[field]), month=row['month'],
+                posts_count=row['posts_count']
+            )
+            for row in grouped
+        ]
+    with transaction.atomic():
+        month_model.objects.all().delete()
+        month_model.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def months(scope):
+    """Месяцы области с постами, новые первыми: [(месяц, постов)]."""
+    return list(
+        PostMonth.objects.filter(scope=scope, posts_count__gt=0)
+        .values_list('month', 'posts_count')
+    )
+
+
+def month_count(scope, month):
+    return (
+        PostMonth.objects.filter(scope=scope, month=month)
+        .values_list('posts_count', flat=True).first()
+        or 0
+    )
@@ -0,0 +1,146 @@
+"""Массовые операции над постами для действий админки.
+
+`queryset.delete()` у модели с сигналами выбирает каждый пост и его
+связанные строки, а сохранение по одному посту - это UPDATE и пачка
+сигналов на строку. Здесь пост меняется одним UPDATE на весь queryset
+или одним DELETE на таблицу и пачку из `BATCH_SIZE` id, а то, что
+делали бы сигналы (счётчики, архив, поиск, кеш страниц, файлы превью),
+досчитывается по одной агрегации GROUP BY.
+"""
+from collections import Counter
+from types import SimpleNamespace
+
+from django.db import models, transaction
+from django.db.models import Count, DateField
+from django.db.models.functions import TruncMonth
+
+from . import archive, counters, feed, media, page_cache, search
+from .models import Group, Post, PostImageVariant, User
+
+BATCH_SIZE = 500
+
+
+def _tally(queryset):
+    """Число постов queryset по (автор, группа, месяц)."""
+    month = TruncMonth('pub_date', output_field=DateField())
+    return [
+        (row['author'], row['group'], row['month'], row['total'])
+        for row in queryset.order_by().annotate(month=month)
+        .values('author', 'group', 'month').annotate(total=Count('pk'))
+    ]
+
+
+def _adjust(changes):
+    """Сдвигает счётчики и архив: {(область, месяц): дельта}."""
+    totals = Counter()
+    for (scope, month), delta in changes.items():
+        if delta:
+            archive.adjust([scope], month, delta)
+            totals[scope] += delta
+    for scope, delta in totals.items():
+        if delta:
+            counters.adjust([scope], delta)
+
+
+def _page_scopes(post_ids, author_ids, group_ids):
+    scopes = page_cache.index_scopes()
+    for username in User.objects.filter(pk__in=author_ids).values_list(
+        'username', flat=True
+    ):
+        scopes += page_cache.profile_scopes(username)
+    for slug in Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True
+    ):
+        scopes += page_cache.group_scopes(slug)
+    for post_id in post_ids:
+        scopes += page_cache.post_scopes(post_id)
+    return scopes
+
+
+def _batches(post_ids):
+    for start in range(0, len(post_ids), BATCH_SIZE):
+        yield post_ids[start:start + BATCH_SIZE]
+
+
+def move_to_group(queryset, group):
+    """Переносит посты queryset в группу `group` (None - без группы).
+
+    Возвращает число перенесённых постов.
+    """
+    group_id = group.pk if group is not None else None
+    queryset = queryset.exclude(group=group) if group_id else (
+        queryset.filter(group__isnull=False)
+    )
+    with transaction.atomic():
+        post_ids = list(queryset.order_by().values_list('pk', flat=True))
+        if not post_ids:
+            return 0
+        moved = Post.objects.filter(pk__in=queryset.values('pk'))
+        tally = _tally(moved)
+        moved.update(group=group)
+        changes = Counter()
+        for _, previous_id, month, total in tally:
+            if previous_id is not None:
+                changes[counters.group_scope(previous_id), month] -= total
+            if group_id is not None:
+                changes[counters.group_scope(group_id), month] += total
+        _adjust(changes)
+    author_ids = {author_id for author_id, *_ in tally}
+    group_ids = {row[1] for row in tally} | {group_id}
+    page_cache.invalidate(_page_scopes(post_ids, author_ids, group_ids))
+    return len(post_ids)
+
+
+def delete_posts(queryset):
+    """Удаляет посты queryset вместе со связанными строками.
+
+    Связанные таблицы (комментарии, ленты подписок, превью, термы
+    поиска) чистятся `_raw_delete` - это тот же «быстрый» DELETE,
+    которым Django удаляет каскад без сигналов. Возвращает число
+    удалённых постов.
+    """
+    related = [
+        relation for relation in Post._meta.related_objects
+        if relation.on_delete is models.CASCADE
+    ]
+    with transaction.atomic():
+        post_ids = list(queryset.order_by().values_list('pk', flat=True))
+        if not post_ids:
+            return 0
+        tally = []
+        variants = []
+        images = []
+        for batch in _batches(post_ids):
+            posts = Post.objects.filter(pk__in=batch)
+            tally += _tally(posts)
+            variants += PostImageVariant.objects.filter(
+                post_id__in=batch
+            ).values_list('image', flat=True)
+            images += posts.values_list('image', flat=True)
+            # До комментариев: их id нужны индексу.
+            search.remove_posts(batch)
+            for relation in related:
+                relation.related_model.objects.filter(**{
+                    f'{relation.field.name}__in': batch
+                })._raw_delete(posts.db)
+            posts._raw_delete(posts.db)
+        changes = Counter()
+        for author_id, group_id, month, total in tally:
+            post = SimpleNamespace(author_id=author_id, group_id=group_id)
+            for scope in counters.post_scopes(post):
+                changes[scope, month] -= total
+        _adjust(changes)
+        transaction.on_commit(lambda: _delete_files(variants))
+        media.release(images)
+    author_ids = {row[0] for row in tally}
+    feed.forget_counts(author_ids)
+    group_ids = {row[1] for row in tally} - {None}
+    page_cache.invalidate(_page_scopes(post_ids, author_ids, group_ids))
+    return len(post_ids)
+
+
+def _delete_files(names):
+    """Удаляет файлы превью, которые не нужны другим постам."""
+    storage = PostImageVariant._meta.get_field('image').storage
+    for name in set(names) - media.referenced(names) - {''}:
+        storage.delete(name)
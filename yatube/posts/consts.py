@@ -1 +1,2 @@
 QUANTITY_OF_POST_TEN = 10
+QUANTITY_OF_COMMENTS = 50
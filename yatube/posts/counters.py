@@ -0,0 +1,86 @@
+"""Счётчики постов для пагинатора и «Всего постов».
+
+Счётчик лежит в кеше под ключом своей области (`all`, `author:<id>`,
+`group:<id>`, `follow:<id>`) и поддерживается сигналами `Post`
+(см. `posts.signals`). Если счётчика в кеше нет, он один раз
+считается через `COUNT(*)` и живёт `POSTS_COUNT_CACHE_TIMEOUT` секунд -
+это и есть допустимое окно устаревания.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+KEY_PREFIX = 'posts:count:'
+
+
+def _key(scope):
+    return KEY_PREFIX + scope
+
+
+def all_scope():
+    return 'all'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def post_scopes(post):
+    """Области, в которые попадает пост."""
+    scopes = [all_scope(), author_scope(post.author_id)]
+    if post.group_id is not None:
+        scopes.append(group_scope(post.group_id))
+    return scopes
+
+
+def get_count(scope, queryset):
+    """Количество записей области: из кеша или одним `COUNT(*)`."""
+    key = _key(scope)
+    value = cache.get(key)
+    if value is None:
+        value = queryset.count()
+        cache.set(key, value, settings.POSTS_COUNT_CACHE_TIMEOUT)
+    return value
+
+
+def adjust(scopes, delta):
+    """Сдвигает уже посчитанные счётчики на `delta`.
+
+    Отсутствующий счётчик не создаётся: его посчитает первый же
+    читатель.
+    """
+    for scope in scopes:
+        try:
+            cache.incr(_key(scope), delta)
+        except ValueError:
+            pass
+
+
+def forget(scopes):
+    """Сбрасывает счётчики, которые нельзя сдвинуть точно."""
+    cache.delete_many([_key(scope) for scope in scopes])
+
+
+def all_posts_count():
+    from .models import Post
+    return get_count(all_scope(), Post.objects.all())
+
+
+def author_posts_count(author):
+    return get_count(author_scope(author.pk), author.posts.all())
+
+
+def group_posts_count(group):
+    return get_count(group_scope(group.pk), group.posts.all())
+
+
+def follow_posts_count(user):
+    from .feed import follow_feed
+    return get_count(follow_scope(user.pk), follow_feed(user))
@@ -0,0 +1,290 @@
+"""Материализованная лента подписок.
+
+Новый пост раскладывается по лентам подписчиков автора (`FeedEntry`)
+в момент публикации, поэтому `follow_index` читает одну таблицу по
+индексу (user, -pub_date), сколько бы авторов ни было в подписках.
+
+Авторов, у которых подписчиков больше `FEED_FANOUT_MAX_FOLLOWERS`,
+по лентам не раскладываем - их посты подмешиваются при чтении.
+Когда такой автор теряет подписчиков и снова помещается в лимит,
+его посты раскладываются по лентам не в запросе отписки, а в фоновом
+потоке после коммита (`FEED_REFILL_WORKERS`); до конца раскладки
+они по-прежнему подмешиваются при чтении.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count, Q
+from django.utils.functional import cached_property
+
+from . import counters
+from .models import FeedEntry, Follow, Post
+from .paginators import CursorPaginator
+
+logger = logging.getLogger(__name__)
+
+HEAVY_AUTHORS_KEY = 'posts:feed:heavy_authors'
+REFILLING_KEY = 'posts:feed:refilling'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def heavy_author_ids():
+    """Авторы, посты которых подмешиваются в ленту при чтении."""
+    author_ids = cache.get(HEAVY_AUTHORS_KEY)
+    if author_ids is None:
+        author_ids = set(
+            Follow.objects.values('author_id')
+            .annotate(followers=Count('id'))
+            .filter(followers__gt=settings.FEED_FANOUT_MAX_FOLLOWERS)
+            .values_list('author_id', flat=True)
+        )
+        cache.set(
+            HEAVY_AUTHORS_KEY, author_ids, settings.FEED_HEAVY_AUTHORS_TIMEOUT
+        )
+    return author_ids | cache.get(REFILLING_KEY, set())
+
+
+def follower_ids(author_id):
+    """Подписчики автора или None, если их слишком много для раскладки."""
+    limit = settings.FEED_FANOUT_MAX_FOLLOWERS
+    user_ids = list(
+        Follow.objects.filter(author_id=author_id)
+        .values_list('user_id', flat=True)[:limit + 1]
+    )
+    if len(user_ids) > limit:
+        return None
+    return user_ids
+
+
+def fan_out_post(post):
+    """Кладёт новый пост в ленты подписчиков автора."""
+    user_ids = follower_ids(post.author_id)
+    if not user_ids:
+        return
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in user_ids
+        ),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    counters.forget(counters.follow_scope(user_id) for user_id in user_ids)
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту постами автора, на которого только что подписались."""
+    if follower_ids(author_id) is None:
+        cache.delete(HEAVY_AUTHORS_KEY)
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date')
+        .values_list('id', 'pub_date')[:settings.FEED_BACKFILL_LIMIT]
+    )
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        ),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты посты автора после отписки.
+
+    Если автор при этом перестал быть «популярным», его посты
+    раскладываются по лентам оставшихся подписчиков после коммита
+    (см. `refill`), а пока подмешиваются при чтении.
+    """
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+    if author_id not in heavy_author_ids():
+        return
+    if follower_ids(author_id) is None:
+        return
+    _set_refilling(author_id, True)
+    cache.delete(HEAVY_AUTHORS_KEY)
+    transaction.on_commit(partial(_submit_refill, author_id))
+
+
+def forget_counts(author_ids):
+    """Сбрасывает счётчики лент всех подписчиков авторов."""
+    user_ids = (
+        Follow.objects.filter(author_id__in=author_ids)
+        .values_list('user_id', flat=True).distinct()
+    )
+    counters.forget(counters.follow_scope(user_id) for user_id in user_ids)
+
+
+def _set_refilling(author_id, refilling):
+    author_ids = cache.get(REFILLING_KEY, set())
+    if refilling:
+        author_ids = author_ids | {author_id}
+    else:
+        author_ids = author_ids - {author_id}
+    cache.set(REFILLING_KEY, author_ids, None)
+
+
+def refill(author_id):
+    """Раскладывает посты автора по лентам всех его подписчиков."""
+    try:
+        user_ids = follower_ids(author_id)
+        if user_ids is None:
+            return
+        for user_id in user_ids:
+            with transaction.atomic():
+                backfill(user_id, author_id)
+        counters.forget(counters.follow_scope(user_id) for user_id in user_ids)
+    finally:
+        _set_refilling(author_id, False)
+
+
+def _submit_refill(author_id):
+    if not settings.FEED_REFILL_WORKERS:
+        refill(author_id)
+        return
+    _pool().submit(_refill_logged, author_id)
+
+
+def _refill_logged(author_id):
+    # Поток пула работает со своим соединением к базе - его нужно закрыть.
+    try:
+        refill(author_id)
+    except Exception:
+        logger.exception('Не удалось разложить посты автора %s', author_id)
+    finally:
+        connections.close_all()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.FEED_REFILL_WORKERS
+            )
+        return _executor
+
+
+class FollowFeed:
+    """Посты ленты подписок пользователя для пагинаторов.
+
+    Основной путь - материализованные записи `FeedEntry`; посты
+    популярных авторов, на которых подписан пользователь, добавляются
+    отдельным условием (fan-out-on-read). Срез `[start:stop]` - один
+    запрос: из `FeedEntry` по индексу (user, -pub_date, -post) и из
+    постов популярных авторов берутся первые `stop` id, а посты
+    (`queryset`, обычно `utils.feed_queryset()`) выбираются по ним,
+    поэтому страница не сканирует всю ленту.
+
+    `after`/`before` - позиции (pub_date, id) курсора, с `before`
+    посты идут от ближайшего к позиции, как в `CursorPaginator`.
+    """
+
+    def __init__(self, user, queryset=None, after=None, before=None):
+        self.user = user
+        self.queryset = Post.objects.all() if queryset is None else queryset
+        self.position_after = after
+        self.position_before = before
+
+    @cached_property
+    def heavy_author_ids(self):
+        heavy = heavy_author_ids()
+        if not heavy:
+            return []
+        return list(
+            Follow.objects.filter(user=self.user, author_id__in=heavy)
+            .values_list('author_id', flat=True)
+        )
+
+    def after(self, pub_date, pk):
+        return FollowFeed(self.user, self.queryset, after=(pub_date, pk))
+
+    def before(self, pub_date, pk):
+        return FollowFeed(self.user, self.queryset, before=(pub_date, pk))
+
+    def _sources(self):
+        entries = FeedEntry.objects.filter(user=self.user)
+        posts = Post.objects.filter(author_id__in=self.heavy_author_ids)
+        if self.position_after is not None:
+            pub_date, pk = self.position_after
+            entries = entries.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, post_id__lt=pk)
+            )
+            posts = posts.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            )
+        if self.position_before is not None:
+            pub_date, pk = self.position_before
+            entries = entries.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, post_id__gt=pk)
+            )
+            posts = posts.filter(
+                Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+            )
+        return entries, posts
+
+    def slice(self, start, stop):
+        """Queryset постов `[start:stop]` ленты."""
+        entries, posts = self._sources()
+        if self.position_before is None:
+            entry_order = ('-pub_date', '-post_id')
+            post_order = ('-pub_date', '-pk')
+        else:
+            entry_order = ('pub_date', 'post_id')
+            post_order = ('pub_date', 'pk')
+        condition = Q(
+            pk__in=entries.order_by(*entry_order).values('post_id')[:stop]
+        )
+        if self.heavy_author_ids:
+            condition |= Q(
+                pk__in=posts.order_by(*post_order).values('pk')[:stop]
+            )
+        return self.queryset.filter(condition).order_by(
+            *post_order
+        )[start:stop]
+
+    def count(self):
+        condition = Q(pk__in=FeedEntry.objects.filter(
+            user=self.user
+        ).values('post_id'))
+        if self.heavy_author_ids:
+            condition |= Q(author_id__in=self.heavy_author_ids)
+        return Post.objects.filter(condition).count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self.slice(index.start or 0, index.stop))
+        return self.slice(index, index + 1)[0]
+
+    def __iter__(self):
+        return iter(self.slice(0, None))
+
+
+class FollowFeedPaginator(CursorPaginator):
+    """Курсорная пагинация `FollowFeed`."""
+
+    def queryset_first(self):
+        return self.object_list
+
+    def queryset_after(self, pub_date, pk):
+        return self.object_list.after(pub_date, pk)
+
+    def queryset_before(self, pub_date, pk):
+        return self.object_list.before(pub_date, pk)
+
+
+def follow_feed(user, queryset=None):
+    """Посты ленты подписок пользователя, см. `FollowFeed`."""
+    return FollowFeed(user, queryset)
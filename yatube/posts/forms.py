@@ -1,4 +1,6 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from . import images
 from .models import Post, Comment
 
 
@@ -14,6 +16,16 @@ class PostForm(forms.ModelForm):
             raise forms.ValidationError('А кто форму будет заполнять?')
         return data
 
+    def clean_image(self):
+        """Новая картинка уменьшается и перекодируется без EXIF."""
+        data = self.cleaned_data['image']
+        if not isinstance(data, UploadedFile):
+            return data
+        try:
+            return images.normalize(data)
+        except images.ERRORS:
+            raise forms.ValidationError('Не удалось обработать картинку')
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
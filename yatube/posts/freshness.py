@@ -0,0 +1,70 @@
+"""Свежесть ответов API для условных GET-запросов.
+
+Каждая функция `*_state(request, **kwargs)` возвращает пару (время
+последнего изменения, токен состояния) или None. Для лент и поста
+это поколения и отметки времени областей из `posts.page_cache`,
+которые сдвигают сигналы, - одно чтение кеша без запросов к базе.
+У ленты подписок области - сами подписки и профили авторов, так что
+её ETag меняет и правка любого поста этих авторов.
+
+`conditional(state)` превращает состояние в ETag и Last-Modified для
+`django.views.decorators.http.condition`: совпадающий
+`If-None-Match`/`If-Modified-Since` получает 304 до выборки ленты
+и сериализации.
+"""
+import hashlib
+
+from django.views.decorators.http import condition
+
+from . import page_cache
+
+
+def scoped_state(scopes):
+    """Состояние по областям `scopes(**kwargs)` из `posts.page_cache`."""
+    def state(request, **kwargs):
+        numbers, changed = page_cache.versions(scopes(**kwargs))
+        return changed, '.'.join(str(number) for number in numbers)
+    return state
+
+
+index_state = scoped_state(page_cache.index_scopes)
+group_state = scoped_state(page_cache.group_scopes)
+profile_state = scoped_state(
+    page_cache.with_groups(page_cache.profile_scopes)
+)
+post_state = scoped_state(page_cache.with_groups(page_cache.post_scopes))
+
+
+_follow_state = scoped_state(page_cache.follow_scopes)
+
+
+def follow_state(request):
+    if not request.user.is_authenticated:
+        return None
+    return _follow_state(request, user=request.user)
+
+
+def conditional(state):
+    """Декоратор view: ETag и Last-Modified из `state`, 304 без рендеринга.
+
+    Токен состояния смешивается с путём и строкой запроса, поэтому
+    у разных страниц ленты (`?page=`, `?cursor=`) разные ETag.
+    """
+    def cached_state(request, **kwargs):
+        states = request.__dict__.setdefault('_freshness', {})
+        if state not in states:
+            states[state] = state(request, **kwargs)
+        return states[state]
+
+    def last_modified(request, **kwargs):
+        current = cached_state(request, **kwargs)
+        return current[0] if current else None
+
+    def etag(request, **kwargs):
+        current = cached_state(request, **kwargs)
+        if current is None:
+            return None
+        raw = f'{request.get_full_path()}|{current[1]}'
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
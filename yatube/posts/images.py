@@ -0,0 +1,153 @@
+"""Нормализация картинок постов при загрузке.
+
+Снимок с камеры (10+ МБ, 6000 px, EXIF с геометкой) уменьшается по
+большей стороне до `POSTS_IMAGE_MAX_EDGE`, поворачивается по EXIF
+и перекодируется в `POSTS_IMAGE_FORMAT` с `POSTS_IMAGE_QUALITY` уже
+без метаданных. Превью (`posts.thumbnails`) потом декодируют маленький
+файл, а размеры картинки лежат в `Post.image_width`/`image_height`,
+так что узнавать их открытием файла не нужно.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+from .models import Post
+
+# Формат Pillow: расширение файла и Content-Type.
+FORMATS = {
+    'JPEG': ('jpg', 'image/jpeg'),
+    'WEBP': ('webp', 'image/webp'),
+    'AVIF': ('avif', 'image/avif'),
+    'PNG': ('png', 'image/png'),
+}
+
+
+# Исключения Pillow на битых и неподдерживаемых файлах: кроме OSError
+# и ValueError плагины бросают KeyError/IndexError на кривых тегах.
+ERRORS = (OSError, ValueError, KeyError, IndexError,
+          Image.DecompressionBombError)
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def can_encode(image_format):
+    """Умеет ли Pillow сохранять в формат: плагины WebP и AVIF
+    регистрируют кодировщик, только если собраны с библиотекой."""
+    Image.init()
+    return image_format in Image.SAVE
+
+
+def convert(image, mode):
+    """`image.convert(mode)` для картинки любого режима.
+
+    16-битные оттенки серого (PNG `I`/`I;16`) сначала сжимаются до
+    8 бит: Pillow либо обрезает их до белого, либо не переводит в RGB.
+    """
+    if image.mode == 'I' or image.mode.startswith('I;16'):
+        image = image.convert('I').point(
+            lambda value: value * (1 / 256)
+        ).convert('L')
+    return image.convert(mode)
+
+
+def output_format(image):
+    """Формат сохранения: WebP или AVIF, только если Pillow умеет
+    в них кодировать (иначе JPEG), и PNG вместо JPEG для картинок
+    с прозрачностью."""
+    target = settings.POSTS_IMAGE_FORMAT
+    if target not in FORMATS or not can_encode(target):
+        target = 'JPEG'
+    if target == 'JPEG' and has_alpha(image):
+        target = 'PNG'
+    return target
+
+
+def normalize(upload):
+    """Уменьшенная и перекодированная копия загруженного файла.
+
+    Анимацию возвращает как есть: после перекодирования от неё
+    остался бы первый кадр.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    if getattr(image, 'is_animated', False):
+        upload.seek(0)
+        return upload
+    if image.mode == 'I' or image.mode.startswith('I;16'):
+        # Уменьшать удобнее уже в 8 битах.
+        image = convert(image, 'L')
+    edge = settings.POSTS_IMAGE_MAX_EDGE
+    # До exif_transpose: рамка квадратная, а большой JPEG thumbnail
+    # декодирует сразу в уменьшенном масштабе (draft).
+    image.thumbnail((edge, edge), Image.LANCZOS)
+    image = ImageOps.exif_transpose(image)
+    target = output_format(image)
+    if target == 'JPEG' or not has_alpha(image):
+        image = convert(image, 'RGB')
+    else:
+        image = convert(image, 'RGBA')
+    # PNG иначе записал бы EXIF из `image.info` чанком eXIf.
+    options = {'optimize': True, 'exif': b''}
+    if target != 'PNG':
+        options['quality'] = settings.POSTS_IMAGE_QUALITY
+    # Цветовой профиль нужен для правильных цветов, EXIF - нет.
+    if image.info.get('icc_profile'):
+        options['icc_profile'] = image.info['icc_profile']
+    buffer = BytesIO()
+    image.save(buffer, target, **options)
+    extension, content_type = FORMATS[target]
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return SimpleUploadedFile(
+        f'{stem}.{extension}', buffer.getvalue(), content_type
+    )
+
+
+def read_dimensions(name, storage=default_storage):
+    """(ширина, высота) файла из хранилища или None, если его нет.
+
+    Pillow читает только заголовок, картинка не декодируется.
+    """
+    try:
+        with storage.open(name) as file:
+            return Image.open(file).size
+    except ERRORS:
+        return None
+
+
+def fill_dimensions(queryset=None, batch_size=500):
+    """Дописывает размеры картинок постам, у которых их нет.
+
+    Возвращает число обновлённых постов.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    # values_list, а не модели: у исторической модели из миграции
+    # post_init сам полез бы в файл, которого может и не быть.
+    rows = queryset.filter(image_width__isnull=True).exclude(
+        image=''
+    ).order_by().values_list('pk', 'image')
+    model = queryset.model
+    batch = []
+    updated = 0
+    for pk, name in rows.iterator():
+        size = read_dimensions(name)
+        if size is None:
+            continue
+        batch.append(model(pk=pk, image_width=size[0],
+                           image_height=size[1]))
+        if len(batch) >= batch_size:
+            model.objects.bulk_update(batch, ['image_width', 'image_height'])
+            updated += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, ['image_width', 'image_height'])
+        updated += len(batch)
+    return updated
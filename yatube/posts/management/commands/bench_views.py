@@ -0,0 +1,365 @@
+import json
+import statistics
+import subprocess
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Страницы, которые пишут в базу: каждый их запрос откатывается,
+# чтобы замер не оставлял комментариев и подписок.
+WRITES = {
+    'posts:add_comment', 'posts:profile_follow', 'posts:profile_unfollow'
+}
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет все страницы posts/urls.py несколькими параллельными '
+        'клиентами и пишет p50/p95/p99 времени ответа, число запросов '
+        'к базе и размер ответа в JSON (данные - см. seed_posts).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Запросов на каждую страницу.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Сколько клиентов шлют запросы одновременно.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Запросов на страницу до начала замера.'
+        )
+        parser.add_argument(
+            '--views', nargs='*',
+            help='Замерить только эти страницы (например, posts:index).'
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Очищать кеш перед каждым запросом.'
+        )
+        parser.add_argument(
+            '--rate-limits',
+            action='store_true',
+            help='Не отключать RATE_LIMITS: пишущие страницы получат 429.'
+        )
+        parser.add_argument(
+            '--output', default='bench.json',
+            help='Куда записать результат ("-" - в stdout).'
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests и --concurrency должны быть > 0')
+        self.host = (settings.ALLOWED_HOSTS or ['localhost'])[0]
+        self.requests = options['requests']
+        self.concurrency = options['concurrency']
+        self.warmup = options['warmup']
+        self.cold = options['cold']
+        self.writer = threading.Lock()
+        scenarios = self.scenarios()
+        if options['views']:
+            unknown = set(options['views']) - {name for name, *_ in scenarios}
+            if unknown:
+                raise CommandError(
+                    'Нет таких страниц: ' + ', '.join(sorted(unknown))
+                )
+            scenarios = [
+                scenario for scenario in scenarios
+                if scenario[0] in options['views']
+            ]
+        # Замер гоняет одну страницу сотни раз от одного пользователя -
+        # ограничение частоты (core.ratelimit) отвечало бы 429.
+        limits = settings.RATE_LIMITS if options['rate_limits'] else {}
+        results = {}
+        with override_settings(RATE_LIMITS=limits):
+            for name, method, url, data, user in scenarios:
+                self.stderr.write(f'{name} {method} {url}')
+                self.rollback = name in WRITES
+                results[name] = self.measure(method, url, data, user)
+                if self.rollback:
+                    # Сигналы успели сдвинуть счётчики и поколения
+                    # в кеше - база откатилась, а кеш нет.
+                    cache.clear()
+        report = {
+            'meta': self.meta(options),
+            'views': results,
+        }
+        text = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True)
+        if options['output'] == '-':
+            self.stdout.write(text)
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(text + '\n')
+            self.print_table(results)
+
+    def scenarios(self):
+        """(имя, метод, url, данные, пользователь) для каждой страницы."""
+        post = (
+            Post.objects.annotate(comments_total=Count('comments'))
+            .order_by('-comments_total', 'pk').first()
+        )
+        group = (
+            Group.objects.annotate(posts_total=Count('posts'))
+            .order_by('-posts_total', 'pk').first()
+        )
+        reader = (
+            User.objects.annotate(follows_total=Count('follower'))
+            .order_by('-follows_total', 'pk').first()
+        )
+        if post is None or group is None or reader is None:
+            raise CommandError(
+                'Нет данных для замера - сначала запустите seed_posts.'
+            )
+        author = post.author
+        target = (
+            User.objects.exclude(pk=reader.pk)
+            .exclude(following__user=reader).order_by('pk').first()
+            or author
+        )
+        followed = (
+            Follow.objects.filter(user=reader).order_by('pk').first()
+        )
+        followed = followed.author if followed else target
+        # Месяцы архива, в которых точно есть посты.
+        month = (post.pub_date.year, post.pub_date.month)
+        group_post = group.posts.order_by('-pub_date').first()
+        group_month = (group_post.pub_date.year, group_post.pub_date.month)
+        return [
+            ('posts:index', 'get', reverse('posts:index'), None, None),
+            ('posts:index ?page=2', 'get',
+             reverse('posts:index') + '?page=2', None, None),
+            ('posts:group_list', 'get',
+             reverse('posts:group_list', args=(group.slug,)), None, None),
+            ('posts:profile', 'get',
+             reverse('posts:profile', args=(author.username,)), None, None),
+            ('posts:post_detail', 'get',
+             reverse('posts:post_detail', args=(post.pk,)), None, None),
+            ('posts:post_detail (auth)', 'get',
+             reverse('posts:post_detail', args=(post.pk,)), None, reader),
+            ('posts:post_create', 'get',
+             reverse('posts:post_create'), None, reader),
+            ('posts:edit', 'get',
+             reverse('posts:edit', args=(post.pk,)), None, author),
+            ('posts:add_comment', 'post',
+             reverse('posts:add_comment', args=(post.pk,)),
+             {'text': 'Комментарий из замера'}, reader),
+            ('posts:archive', 'get', reverse('posts:archive'), None, None),
+            ('posts:archive month', 'get',
+             reverse('posts:archive', args=month), None, None),
+            ('posts:group_archive', 'get',
+             reverse('posts:group_archive', args=(group.slug,)), None, None),
+            ('posts:group_archive month', 'get',
+             reverse('posts:group_archive', args=(group.slug, *group_month)),
+             None, None),
+            ('posts:profile_archive', 'get',
+             reverse('posts:profile_archive', args=(author.username,)),
+             None, None),
+            ('posts:profile_archive month', 'get',
+             reverse('posts:profile_archive', args=(author.username, *month)),
+             None, None),
+            ('posts:search', 'get', reverse('posts:search'),
+             {'q': ' '.join(post.text.split()[:2])}, None),
+            ('posts:follow_index', 'get',
+             reverse('posts:follow_index'), None, reader),
+            ('posts:feed_index', 'get',
+             reverse('posts:feed_index', args=('atom',)), None, None),
+            ('posts:feed_group_list', 'get',
+             reverse('posts:feed_group_list', args=(group.slug, 'rss')),
+             None, None),
+            ('posts:feed_profile', 'get',
+             reverse('posts:feed_profile', args=(author.username, 'atom')),
+             None, None),
+            ('posts:api_index', 'get', reverse('posts:api_index'),
+             None, None),
+            ('posts:api_group_list', 'get',
+             reverse('posts:api_group_list', args=(group.slug,)),
+             None, None),
+            ('posts:api_profile', 'get',
+             reverse('posts:api_profile', args=(author.username,)),
+             None, None),
+            ('posts:api_follow_index', 'get',
+             reverse('posts:api_follow_index'), None, reader),
+            ('posts:api_post_detail', 'get',
+             reverse('posts:api_post_detail', args=(post.pk,)), None, None),
+            ('posts:api_post_comments', 'get',
+             reverse('posts:api_post_comments', args=(post.pk,)),
+             None, None),
+            ('posts:profile_follow', 'get',
+             reverse('posts:profile_follow', args=(target.username,)),
+             None, reader),
+            ('posts:profile_unfollow', 'get',
+             reverse('posts:profile_unfollow', args=(followed.username,)),
+             None, reader),
+        ]
+
+    def measure(self, method, url, data, user):
+        self.run(self.warmup, method, url, data, user)
+        started = time.perf_counter()
+        samples = self.run(self.requests, method, url, data, user)
+        wall = time.perf_counter() - started
+        latencies = [sample[0] * 1000 for sample in samples]
+        queries = [sample[1] for sample in samples]
+        sizes = [sample[2] for sample in samples]
+        statuses = {}
+        for sample in samples:
+            statuses[sample[3]] = statuses.get(sample[3], 0) + 1
+        return {
+            'url': url,
+            'method': method.upper(),
+            'authenticated': user is not None,
+            'requests': self.requests,
+            'status': statuses,
+            'rps': round(self.requests / wall, 1),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 2),
+                'p95': round(percentile(latencies, 95), 2),
+                'p99': round(percentile(latencies, 99), 2),
+                'mean': round(statistics.mean(latencies), 2),
+                'max': round(max(latencies), 2),
+            },
+            'queries': {
+                'mean': round(statistics.mean(queries), 2),
+                'max': max(queries),
+            },
+            'bytes': {
+                'mean': round(statistics.mean(sizes)),
+                'max': max(sizes),
+            },
+        }
+
+    def run(self, amount, *scenario):
+        """Делит `amount` запросов между `concurrency` потоками."""
+        samples = []
+        if self.concurrency == 1:
+            self.worker(amount, samples, *scenario)
+            return samples
+        shares = [
+            amount // self.concurrency + (index < amount % self.concurrency)
+            for index in range(self.concurrency)
+        ]
+        threads = [
+            threading.Thread(
+                target=self.worker, args=(share, samples, *scenario)
+            )
+            for share in shares if share
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples
+
+    def worker(self, amount, samples, method, url, data, user):
+        # У каждого потока свой клиент и своё соединение с базой.
+        client = Client(HTTP_HOST=self.host)
+        if user is not None:
+            # Вход пишет сессию - не посреди чужой откатываемой транзакции.
+            with self.writer:
+                client.force_login(user)
+        request = getattr(client, method)
+        try:
+            for _ in range(amount):
+                if self.cold:
+                    cache.clear()
+                samples.append(self.hit(request, url, data, self.rollback))
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+
+    @contextmanager
+    def isolated(self, rollback):
+        """С `rollback=True` - транзакция, которая откатывается;
+        отложенные `on_commit` при этом не выполняются.
+
+        SQLite пускает одного писателя и не ждёт блокировку для
+        транзакции, которая уже читала, - такие запросы идут по очереди.
+        """
+        if not rollback:
+            yield
+            return
+        serial = self.writer if connection.vendor == 'sqlite' else None
+        with serial or nullcontext(), transaction.atomic():
+            yield
+            transaction.set_rollback(True)
+
+    def hit(self, request, url, data, rollback=False):
+        """(время, запросов к базе, байт, статус) одного запроса."""
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            try:
+                with self.isolated(rollback):
+                    response = request(url, data)
+            except Exception as error:
+                status, size = type(error).__name__, 0
+            else:
+                status = str(response.status_code)
+                if response.streaming:
+                    size = len(b''.join(response.streaming_content))
+                else:
+                    size = len(response.content)
+            elapsed = time.perf_counter() - started
+        return elapsed, len(queries.captured_queries), size, status
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True,
+                cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'concurrency': options['concurrency'],
+            'requests': options['requests'],
+            'warmup': options['warmup'],
+            'cold': options['cold'],
+            'cache': settings.CACHES['default']['BACKEND'],
+            'database': connection.vendor,
+            'data': {
+                'users': User.objects.count(),
+                'groups': Group.objects.count(),
+                'posts': Post.objects.count(),
+                'comments': Comment.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+        }
+
+    def print_table(self, results):
+        self.stdout.write(
+            f'{"страница":<28}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"запросы":>9}{"байт":>9}'
+        )
+        for name, result in results.items():
+            latency = result['latency_ms']
+            self.stdout.write(
+                f'{name:<28}{latency["p50"]:>9}{latency["p95"]:>9}'
+                f'{latency["p99"]:>9}{result["queries"]["mean"]:>9}'
+                f'{result["bytes"]["mean"]:>9}'
+            )
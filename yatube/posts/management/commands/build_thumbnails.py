@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef, Q
+
+from posts import thumbnails
+from posts.models import Post, PostImageVariant
+
+
+class Command(BaseCommand):
+    help = (
+        'Нарезает превью и адаптивные копии картинок постов, у которых '
+        'их ещё нет (например, загруженных до появления posts.thumbnails).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перенарезать превью всех постов с картинками.'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').select_related(
+            'author', 'group'
+        )
+        if not options['all']:
+            # Нет адаптивных копий хотя бы в одном из доступных форматов.
+            missing = Q()
+            for image_format in thumbnails.variant_formats():
+                name = f'has_{image_format.lower()}'
+                posts = posts.annotate(**{name: Exists(
+                    PostImageVariant.objects.filter(
+                        post=OuterRef('pk'), source=OuterRef('image'),
+                        size__startswith='w', format=image_format
+                    )
+                )})
+                missing |= Q(**{name: False})
+            posts = posts.filter(missing)
+        built = 0
+        for post in posts.iterator():
+            try:
+                thumbnails.build(post)
+            except OSError as error:
+                self.stderr.write(f'Пост {post.pk}: {error}')
+                continue
+            built += 1
+        self.stdout.write(f'Нарезано картинок: {built}')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts import media
+
+
+class Command(BaseCommand):
+    help = (
+        'Переименовывает картинки постов по хешу содержимого: '
+        'одинаковые файлы сливаются в один, старые удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать файлы со старыми именами.'
+        )
+
+    def handle(self, *args, **options):
+        renamed, removed = media.dedupe(options['dry_run'])
+        self.stdout.write(
+            f'Переименовано файлов: {renamed}, удалено старых: {removed}'
+        )
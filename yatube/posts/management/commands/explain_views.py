@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import consts, feed, utils
+from posts.models import Comment, Follow, Group, Post
+from posts.paginators import CursorPaginator
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Печатает план выполнения (EXPLAIN QUERY PLAN на SQLite) '
+        'основных запросов страниц posts, чтобы проверить, '
+        'что они идут по индексам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username',
+            help='Автор для profile и читатель для follow_index.'
+        )
+        parser.add_argument('--slug', help='Группа для group_list.')
+
+    def handle(self, *args, **options):
+        for name, queryset in self.view_queries(options):
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain())
+            self.stdout.write('')
+
+    def view_queries(self, options):
+        user = self.pick(User, 'username', options['username'])
+        group = self.pick(Group, 'slug', options['slug'])
+        post = Post.objects.order_by('pk').first()
+        per_page = consts.QUANTITY_OF_POST_TEN
+        feed_posts = utils.feed_queryset()
+
+        yield 'posts:index', feed_posts[:per_page]
+        if post is not None:
+            paginator = CursorPaginator(feed_posts, per_page)
+            yield (
+                'posts:index ?cursor=...',
+                paginator.queryset_after(post.pub_date, post.pk)[:per_page]
+            )
+        group_id = group.pk if group else 0
+        yield 'posts:group_list', utils.feed_queryset(
+            Post.objects.filter(group_id=group_id)
+        )[:per_page]
+        user_id = user.pk if user else 0
+        yield 'posts:profile', utils.feed_queryset(
+            Post.objects.filter(author_id=user_id)
+        )[:per_page]
+        yield 'posts:profile (following)', Follow.objects.filter(
+            user_id=user_id, author_id=user_id
+        )
+        if user is not None:
+            yield 'posts:follow_index', feed.follow_feed(
+                user, utils.feed_queryset()
+            ).slice(0, per_page)
+        post_id = post.pk if post else 0
+        yield 'posts:post_detail', Post.objects.select_related(
+            'author', 'group'
+        ).filter(pk=post_id)
+        comments = Comment.objects.filter(post_id=post_id).select_related(
+            'author'
+        ).order_by('created', 'pk')
+        yield (
+            'posts:post_detail (comments)',
+            comments[:consts.QUANTITY_OF_COMMENTS]
+        )
+
+    @staticmethod
+    def pick(model, field, value):
+        if value:
+            return model.objects.filter(**{field: value}).first()
+        return model.objects.order_by('pk').first()
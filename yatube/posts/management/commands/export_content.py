@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, группы, посты, комментарии и подписки '
+        'в JSON Lines (по записи на строку).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для выгрузки, «-» - стандартный вывод.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько строк читать из базы за раз.'
+        )
+
+    def handle(self, *args, **options):
+        records = transfer.export_records(options['chunk_size'])
+        if options['path'] == '-':
+            transfer.dump(records, sys.stdout)
+            return
+        with open(options['path'], 'w', encoding='utf-8') as file:
+            transfer.dump(records, file)
+        self.stdout.write(f'Выгружено в {options["path"]}')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from posts import media
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из media/posts файлы картинок и превью, на которые '
+        'не ссылается ни один пост.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=None,
+            help='Не трогать файлы моложе стольких секунд '
+                 '(по умолчанию POSTS_MEDIA_GRACE).'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.'
+        )
+
+    def handle(self, *args, **options):
+        checked, orphans = media.collect_garbage(
+            options['grace'], options['dry_run']
+        )
+        for name in orphans:
+            self.stdout.write(name)
+        verb = 'будет удалено' if options['dry_run'] else 'удалено'
+        self.stdout.write(
+            f'Проверено файлов: {checked}, {verb}: {len(orphans)}'
+        )
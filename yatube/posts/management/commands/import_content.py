@@ -0,0 +1,53 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает JSON Lines, выгруженный export_content. Существующие '
+        'пользователи и группы не перезаписываются; файлы картинок '
+        'нужно скопировать в MEDIA_ROOT заранее.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл выгрузки, «-» - стандартный ввод.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Записей в одной транзакции.'
+        )
+
+    def handle(self, *args, **options):
+        importer = transfer.Importer(
+            options['chunk_size'], progress=self.progress
+        )
+        try:
+            if options['path'] == '-':
+                importer.load(sys.stdin)
+            else:
+                with open(options['path'], encoding='utf-8') as file:
+                    importer.load(file)
+        except (ValueError, KeyError) as error:
+            raise CommandError(f'Некорректная запись: {error}')
+        finally:
+            missing = importer.finish()
+        created = ', '.join(
+            f'{record_type} {count}'
+            for record_type, count in importer.created.items()
+        )
+        self.stdout.write(self.style.SUCCESS(f'Создано: {created}'))
+        skipped = sum(importer.skipped.values())
+        if skipped:
+            self.stdout.write(
+                f'Пропущено записей (уже есть или без ссылок): {skipped}'
+            )
+        if missing:
+            self.stderr.write(f'Постов без файла картинки: {missing}')
+
+    def progress(self, record_type, total):
+        self.stdout.write(f'{record_type}: {total}')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает архив постов по месяцам (PostMonth) '
+        'по таблице постов (например, после bulk_create).'
+    )
+
+    def handle(self, *args, **options):
+        total = archive.rebuild()
+        self.stdout.write(f'Строк архива: {total}')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Заново строит поисковый индекс постов и комментариев '
+        '(например, после смены POSTS_SEARCH_BACKEND).'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = search.rebuild()
+        backend = 'FTS5' if search.use_fts() else 'таблица термов'
+        self.stdout.write(f'Проиндексировано постов: {total} ({backend})')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import activity
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает Post.comments_count и Post.last_activity_at '
+        'по таблице комментариев (например, после bulk_create).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Постов в одном UPDATE.'
+        )
+
+    def handle(self, *args, **options):
+        total = activity.repair(batch_size=options['batch_size'])
+        self.stdout.write(f'Пересчитано постов: {total}')
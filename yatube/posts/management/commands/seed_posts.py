@@ -0,0 +1,193 @@
+import random
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from posts import activity, archive, feed, search, thumbnails
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+SEED_PREFIX = 'seed_'
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет базу данными для замеров (bench_views): '
+        'пользователи, группы, посты с картинками, комментарии, подписки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Подписок на одного пользователя.'
+        )
+        parser.add_argument(
+            '--images', type=int, default=100,
+            help='Сколько постов получат картинку.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней раскидать даты публикации.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Сначала удалить данные, созданные прошлым запуском.'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        if options['clear']:
+            self.clear()
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            groups = self.create_groups(options['groups'])
+            posts = self.create_posts(
+                options['posts'], users, groups, options['days']
+            )
+            self.create_comments(options['comments'], users, posts)
+            follows = self.create_follows(options['follows'], users)
+            # Посты и комментарии созданы через bulk_create, минуя
+            # сигналы, которые обновляют поисковый индекс, счётчики
+            # и архив.
+            search.rebuild()
+            activity.repair()
+            archive.rebuild()
+        images = self.add_images(options['images'], posts)
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {len(users)}, групп {len(groups)}, '
+            f'постов {len(posts)}, комментариев {options["comments"]}, '
+            f'подписок {follows}, картинок {images}'
+        ))
+
+    def clear(self):
+        User.objects.filter(username__startswith=SEED_PREFIX).delete()
+        Group.objects.filter(slug__startswith=SEED_PREFIX).delete()
+
+    def create_users(self, amount):
+        start = User.objects.filter(
+            username__startswith=SEED_PREFIX
+        ).count()
+        users = [
+            User(
+                username=f'{SEED_PREFIX}{start + i}',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+            )
+            for i in range(amount)
+        ]
+        User.objects.bulk_create(users, batch_size=500)
+        return list(User.objects.filter(
+            username__in=[user.username for user in users]
+        ))
+
+    def create_groups(self, amount):
+        start = Group.objects.filter(slug__startswith=SEED_PREFIX).count()
+        groups = [
+            Group(
+                title=self.fake.catch_phrase()[:200],
+                slug=f'{SEED_PREFIX}{start + i}',
+                description=self.fake.paragraph(),
+            )
+            for i in range(amount)
+        ]
+        Group.objects.bulk_create(groups)
+        return list(Group.objects.filter(
+            slug__in=[group.slug for group in groups]
+        ))
+
+    def create_posts(self, amount, users, groups, days):
+        if not users:
+            return []
+        # Небольшая часть авторов пишет большую часть постов,
+        # как и на живом сайте.
+        weights = [1 / (rank + 1) for rank in range(len(users))]
+        authors = self.random.choices(users, weights, k=amount)
+        posts = [
+            Post(
+                text=self.fake.text(self.random.randint(80, 1200)),
+                author=author,
+                group=(
+                    self.random.choice(groups)
+                    if groups and self.random.random() < 0.7 else None
+                ),
+            )
+            for author in authors
+        ]
+        created = Post.objects.bulk_create(posts, batch_size=500)
+        # auto_now_add ставит всем постам текущее время - раскидываем
+        # даты публикации по периоду.
+        if not created or created[0].pk is None:
+            created = list(Post.objects.order_by('-pk')[:amount])
+        now = timezone.now()
+        for post in created:
+            post.pub_date = now - timedelta(
+                seconds=self.random.randint(0, days * 24 * 60 * 60)
+            )
+        Post.objects.bulk_update(created, ['pub_date'], batch_size=500)
+        return created
+
+    def create_comments(self, amount, users, posts):
+        if not users or not posts:
+            return
+        comments = (
+            Comment(
+                post=self.random.choice(posts),
+                author=self.random.choice(users),
+                text=self.fake.sentence(),
+            )
+            for _ in range(amount)
+        )
+        Comment.objects.bulk_create(comments, batch_size=500)
+
+    def create_follows(self, per_user, users):
+        pairs = set()
+        for user in users:
+            others = [other for other in users if other != user]
+            for author in self.random.sample(
+                others, min(per_user, len(others))
+            ):
+                pairs.add((user.pk, author.pk))
+        Follow.objects.bulk_create(
+            (Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in pairs),
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+        # bulk_create не шлёт сигналов: раскладываем ленты сами.
+        for user_id, author_id in pairs:
+            feed.backfill(user_id, author_id)
+        return len(pairs)
+
+    def add_images(self, amount, posts):
+        amount = min(amount, len(posts))
+        for post in self.random.sample(posts, amount):
+            buffer = BytesIO()
+            Image.new(
+                'RGB',
+                (self.random.randint(800, 2400),
+                 self.random.randint(600, 1600)),
+                color=tuple(self.random.randint(0, 255) for _ in range(3)),
+            ).save(buffer, 'JPEG', quality=90)
+            post.image.save(
+                f'seed_{post.pk}.jpg', ContentFile(buffer.getvalue())
+            )
+            thumbnails.build(post)
+        return amount
@@ -0,0 +1,216 @@
+"""Учёт ссылок на файлы картинок постов и сборка мусора.
+
+С `posts.storage.ContentAddressedStorage` один файл может быть
+картинкой многих постов (и источником их общих превью). Число ссылок
+на файл - число постов с таким `Post.image` (индекс `post_image_idx`),
+а не отдельный счётчик: его не сбивают `bulk_create`, импорт и
+массовые действия админки. `release` после коммита удаляет файлы,
+на которые больше никто не ссылается; `collect_garbage` (команда
+`gc_media`) подбирает остальных сирот, а `dedupe` (команда
+`dedupe_media`) переводит файлы со старыми именами на имена по
+содержимому.
+
+Файл моложе `POSTS_MEDIA_GRACE` секунд не удаляется: его могли только
+что выдать посту, который ещё не сохранён. Перед удалением файл
+отодвигается в сторону, и ссылки с возрастом проверяются ещё раз
+(см. `_delete`).
+"""
+import logging
+import os
+import posixpath
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.utils import timezone
+
+from . import thumbnails
+from .models import Post, PostImageVariant
+from .storage import is_hashed
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+THUMBS_DIR = 'posts/thumbs'
+QUARANTINE_SUFFIX = '.deleting'
+
+
+def storage():
+    return Post._meta.get_field('image').storage
+
+
+def referenced(names):
+    """Какие из `names` - картинки постов или файлы их превью."""
+    names = list(names)
+    found = set()
+    for start in range(0, len(names), CHUNK_SIZE):
+        chunk = names[start:start + CHUNK_SIZE]
+        found.update(Post.objects.filter(image__in=chunk).values_list(
+            'image', flat=True
+        ))
+        found.update(PostImageVariant.objects.filter(
+            image__in=chunk
+        ).values_list('image', flat=True))
+    return found
+
+
+def _old_enough(files, name, grace):
+    try:
+        modified = files.get_modified_time(name)
+    except (OSError, SuspiciousFileOperation):
+        return False
+    return timezone.now() - modified >= timedelta(seconds=grace)
+
+
+def _still_orphan(files, name, grace, path=None):
+    if name in referenced([name]):
+        return False
+    if path is None:
+        return _old_enough(files, name, grace)
+    try:
+        modified = os.path.getmtime(path)
+    except OSError:
+        return False
+    return timezone.now().timestamp() - modified >= grace
+
+
+def _delete(files, name, grace):
+    """Удаляет сироту `name`, если её так и не выдали посту.
+
+    `ContentAddressedStorage.save` отдаёт существующий файл, только
+    продлив ему жизнь (`os.utime`). Поэтому файл сначала переносится
+    в сторону: пришедший после этого `save` его не найдёт и запишет
+    заново. Затем ссылки и время изменения проверяются ещё раз, и
+    файл, который успели выдать, возвращается на место.
+    """
+    try:
+        path = files.path(name)
+    except NotImplementedError:
+        if not _still_orphan(files, name, grace):
+            return False
+        files.delete(name)
+        return True
+    quarantine = path + QUARANTINE_SUFFIX
+    try:
+        os.replace(path, quarantine)
+    except FileNotFoundError:
+        return False
+    if _still_orphan(files, name, grace, quarantine):
+        os.remove(quarantine)
+        return True
+    os.replace(quarantine, path)
+    return False
+
+
+def delete_orphans(names, grace=None):
+    """Удаляет файлы из `names`, на которые никто не ссылается.
+
+    Возвращает удалённые имена.
+    """
+    if grace is None:
+        grace = settings.POSTS_MEDIA_GRACE
+    names = set(names) - {''}
+    files = storage()
+    deleted = []
+    for name in sorted(names - referenced(names)):
+        if _old_enough(files, name, grace) and _delete(files, name, grace):
+            deleted.append(name)
+    return deleted
+
+
+def release(names):
+    """После коммита удаляет ставшие ничьими файлы `names`."""
+    names = set(names) - {''}
+    if names:
+        transaction.on_commit(partial(delete_orphans, names))
+
+
+def walk(directory):
+    """Все файлы хранилища в каталоге и его подкаталогах."""
+    files = storage()
+    if not files.exists(directory):
+        return
+    directories, names = files.listdir(directory)
+    for name in names:
+        yield posixpath.join(directory, name)
+    for subdirectory in directories:
+        yield from walk(posixpath.join(directory, subdirectory))
+
+
+def collect_garbage(grace=None, dry_run=False):
+    """Ищет в `posts/` файлы без ссылок и удаляет их.
+
+    Возвращает (проверено файлов, имена сирот).
+    """
+    if grace is None:
+        grace = settings.POSTS_MEDIA_GRACE
+    files = storage()
+    upload_to = Post._meta.get_field('image').upload_to.rstrip('/')
+    checked = 0
+    orphans = []
+    chunk = []
+
+    def flush():
+        for name in sorted(set(chunk) - referenced(chunk)):
+            if not _old_enough(files, name, grace):
+                continue
+            if dry_run or _delete(files, name, grace):
+                orphans.append(name)
+        chunk.clear()
+
+    for name in walk(upload_to):
+        checked += 1
+        chunk.append(name)
+        if len(chunk) >= CHUNK_SIZE:
+            flush()
+    flush()
+    return checked, orphans
+
+
+def dedupe(dry_run=False):
+    """Переименовывает картинки постов по содержимому.
+
+    Посты с одинаковыми файлами начинают ссылаться на один файл,
+    превью переезжают вместе с картинкой, а если у поста с тем же
+    файлом уже есть полный набор превью, берутся его копии
+    (`thumbnails.reuse`) - свои лишние удаляются. Возвращает
+    (переименовано файлов, удалено старых файлов).
+    """
+    files = storage()
+    renamed = 0
+    removed = 0
+    last = ''
+    while True:
+        names = list(
+            Post.objects.filter(image__gt=last).order_by('image')
+            .values_list('image', flat=True).distinct()[:CHUNK_SIZE]
+        )
+        if not names:
+            break
+        last = names[-1]
+        for name in names:
+            if is_hashed(name):
+                continue
+            try:
+                with files.open(name) as file:
+                    new_name = name if dry_run else files.save(name, file)
+            except (OSError, SuspiciousFileOperation):
+                logger.warning('Нет файла картинки %s', name)
+                continue
+            renamed += 1
+            if dry_run:
+                continue
+            with transaction.atomic():
+                moved = list(Post.objects.filter(image=name).values_list(
+                    'pk', flat=True
+                ))
+                Post.objects.filter(image=name).update(image=new_name)
+                PostImageVariant.objects.filter(source=name).update(
+                    source=new_name
+                )
+            for post in Post.objects.filter(pk__in=moved):
+                thumbnails.reuse(post)
+            removed += len(delete_orphans([name], grace=0))
+    return renamed, removed
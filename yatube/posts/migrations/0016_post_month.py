@@ -0,0 +1,56 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:05
+
+from django.db import migrations, models
+from django.db.models import Count, DateField
+from django.db.models.functions import TruncMonth
+
+
+def fill_archive(apps, schema_editor):
+    """Раскладывает уже существующие посты по месяцам."""
+    Post = apps.get_model('posts', 'Post')
+    PostMonth = apps.get_model('posts', 'PostMonth')
+    month = TruncMonth('pub_date', output_field=DateField())
+    posts = Post.objects.order_by().annotate(month=month)
+    rows = [
+        PostMonth(scope='all', **row)
+        for row in posts.values('month').annotate(posts_count=Count('pk'))
+    ]
+    for field in ('author', 'group'):
+        grouped = posts.filter(**{f'{field}__isnull': False}).values(
+            field, 'month'
+        ).annotate(posts_count=Count('pk'))
+        rows += [
+            PostMonth(
+                scope=f'{field}:{row[field]}', month=row['month'],
+                posts_count=row['posts_count']
+            )
+            for row in grouped
+        ]
+    PostMonth.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostMonth',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=32, verbose_name='Область')),
+                ('month', models.DateField(verbose_name='Месяц')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+            ],
+            options={
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='postmonth',
+            constraint=models.UniqueConstraint(fields=('scope', 'month'), name='unique_post_month'),
+        ),
+        migrations.RunPython(fill_archive, migrations.RunPython.noop),
+    ]
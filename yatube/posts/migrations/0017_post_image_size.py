@@ -0,0 +1,52 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:12
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+from PIL import Image
+
+
+def fill_sizes(apps, schema_editor):
+    """Читает размеры уже загруженных картинок из их заголовков."""
+    Post = apps.get_model('posts', 'Post')
+    # values_list, а не модели: post_init ImageField полез бы в файл,
+    # которого может и не быть.
+    rows = Post.objects.exclude(image='').order_by().values_list(
+        'pk', 'image'
+    )
+    batch = []
+    for pk, name in rows.iterator():
+        try:
+            with default_storage.open(name) as file:
+                width, height = Image.open(file).size
+        except (OSError, ValueError):
+            continue
+        batch.append(Post(pk=pk, image_width=width, image_height=height))
+    Post.objects.bulk_update(
+        batch, ['image_width', 'image_height'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_month'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, height_field='image_height', upload_to='posts/', verbose_name='Картинка', width_field='image_width'),
+        ),
+        migrations.RunPython(fill_sizes, migrations.RunPython.noop),
+    ]
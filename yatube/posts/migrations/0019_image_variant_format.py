@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='postimagevariant',
+            name='unique_post_image_variant',
+        ),
+        migrations.AddField(
+            model_name='postimagevariant',
+            name='format',
+            field=models.CharField(default='JPEG', max_length=10, verbose_name='Формат'),
+        ),
+        migrations.AddConstraint(
+            model_name='postimagevariant',
+            constraint=models.UniqueConstraint(fields=('post', 'size', 'format'), name='unique_post_image_variant'),
+        ),
+    ]
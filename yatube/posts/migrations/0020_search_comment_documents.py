@@ -0,0 +1,193 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:29
+
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.utils import OperationalError
+import django.db.models.deletion
+
+FTS_TABLE = 'posts_search_fts'
+COMMENTS_FTS_TABLE = 'posts_search_comments_fts'
+TEXT_WEIGHT = 4
+
+# Копия posts.stemmer на момент миграции: индекс должен разбирать текст
+# так же, как поиск, а живой модуль может измениться.
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|'
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+# Окончание -ость снимается, только если оно целиком в R2.
+DERIVATIONAL = re.compile(
+    r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$'
+)
+RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+WORD = re.compile(r'\w+')
+
+STOP_WORDS = frozenset((
+    'а', 'без', 'бы', 'в', 'во', 'вот', 'вы', 'да', 'для', 'до', 'его',
+    'ее', 'же', 'за', 'и', 'из', 'или', 'им', 'их', 'к', 'как', 'ко',
+    'ли', 'мы', 'на', 'над', 'не', 'ни', 'но', 'о', 'об', 'от', 'по',
+    'под', 'при', 'про', 'с', 'со', 'так', 'то', 'ты', 'у', 'уже', 'что',
+    'это', 'я',
+))
+
+MAX_TERM_LENGTH = 64
+
+
+@lru_cache(maxsize=65536)
+def stem(word):
+    """Основа русского слова по алгоритму Snowball."""
+    word = word.lower().replace('ё', 'е')
+    match = RV.match(word)
+    if match is None:
+        return word
+    start, rv = match.groups()
+
+    # Шаг 1: деепричастие, иначе возвратность и прилагательное,
+    # глагол или существительное.
+    stripped = PERFECTIVE_GERUND.sub('', rv, 1)
+    if stripped == rv:
+        rv = REFLEXIVE.sub('', rv, 1)
+        stripped = ADJECTIVE.sub('', rv, 1)
+        if stripped != rv:
+            rv = PARTICIPLE.sub('', stripped, 1)
+        else:
+            stripped = VERB.sub('', rv, 1)
+            rv = NOUN.sub('', rv, 1) if stripped == rv else stripped
+    else:
+        rv = stripped
+
+    # Шаг 2.
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    # Шаг 3.
+    if DERIVATIONAL.match(rv):
+        rv = re.sub('ость?$', '', rv)
+
+    # Шаг 4: мягкий знак, превосходная степень, двойное «н».
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = re.sub('ейше?$', '', rv)
+        rv = re.sub('нн$', 'н', rv)
+    return start + rv
+
+
+def terms(text):
+    """Основы слов текста без стоп-слов, в порядке появления."""
+    result = []
+    for word in WORD.findall(text.lower().replace('ё', 'е')):
+        if word in STOP_WORDS:
+            continue
+        if re.search('[а-я]', word):
+            word = stem(word)
+        result.append(word[:MAX_TERM_LENGTH])
+    return result
+
+
+def _create_tables(schema_editor, statements):
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    try:
+        for statement in statements:
+            schema_editor.execute(statement)
+    except OperationalError:
+        return False
+    return True
+
+
+def split_documents(apps, schema_editor):
+    """Индексирует текст поста и каждый комментарий отдельно."""
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    SearchTerm = apps.get_model('posts', 'SearchTerm')
+    created = _create_tables(schema_editor, [
+        f'DROP TABLE IF EXISTS {FTS_TABLE}',
+        f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(text)',
+        f'CREATE VIRTUAL TABLE {COMMENTS_FTS_TABLE} '
+        f'USING fts5(text, post_id UNINDEXED)',
+    ])
+    SearchTerm.objects.all().delete()
+    posts = Post.objects.values_list('pk', 'text')
+    comments = Comment.objects.values_list('pk', 'post_id', 'text')
+    if created and settings.POSTS_SEARCH_BACKEND != 'table':
+        with schema_editor.connection.cursor() as cursor:
+            for post_id, text in posts.iterator():
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                    [post_id, ' '.join(terms(text))]
+                )
+            for comment_id, post_id, text in comments.iterator():
+                cursor.execute(
+                    f'INSERT INTO {COMMENTS_FTS_TABLE} (rowid, text, post_id) '
+                    f'VALUES (%s, %s, %s)',
+                    [comment_id, ' '.join(terms(text)), post_id]
+                )
+        return
+
+    def rows(post_id, comment_id, text, weight):
+        for term, count in Counter(terms(text)).items():
+            yield SearchTerm(term=term, post_id=post_id,
+                             comment_id=comment_id, weight=count * weight)
+
+    for post_id, text in posts.iterator():
+        SearchTerm.objects.bulk_create(
+            rows(post_id, None, text, TEXT_WEIGHT), batch_size=500
+        )
+    for comment_id, post_id, text in comments.iterator():
+        SearchTerm.objects.bulk_create(
+            rows(post_id, comment_id, text, 1), batch_size=500
+        )
+
+
+def merge_documents(apps, schema_editor):
+    """Возвращает таблицу FTS5 прежнего вида; индекс заполнит
+    `rebuild_search_index`."""
+    _create_tables(schema_editor, [
+        f'DROP TABLE IF EXISTS {COMMENTS_FTS_TABLE}',
+        f'DROP TABLE IF EXISTS {FTS_TABLE}',
+        f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(text, comments)',
+    ])
+    apps.get_model('posts', 'SearchTerm').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_image_variant_format'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='searchterm',
+            name='unique_search_term',
+        ),
+        migrations.AddField(
+            model_name='searchterm',
+            name='comment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Comment'),
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['term', 'post'], name='search_term_idx'),
+        ),
+        migrations.RunPython(split_documents, merge_documents),
+    ]
@@ -1,5 +1,9 @@
 from django.db import models
+from django.db.models.signals import post_init
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .storage import ContentAddressedStorage
 
 
 User = get_user_model()
@@ -39,16 +43,75 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=ContentAddressedStorage(),
+        blank=True,
+        width_field='image_width',
+        height_field='image_height'
+    )
+    # Размеры нормализованной картинки (см. posts.images).
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        blank=True,
+        null=True,
+        editable=False
+    )
+    # Поддерживаются сигналами комментариев, см. posts.activity.
+    comments_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False
+    )
+    last_activity_at = models.DateTimeField(
+        'Последняя активность',
+        default=timezone.now,
+        editable=False
     )
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['-comments_count', '-id'],
+                name='post_comments_count_idx'
+            ),
+            models.Index(
+                fields=['-last_activity_at', '-id'],
+                name='post_last_activity_idx'
+            ),
+            # Ссылки на файл картинки, см. posts.media.
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
 
+# ImageField с width_field в post_init дозаполняет пустые размеры, то есть
+# открывает картинку каждого прочитанного из БД поста. Размеры пишутся,
+# когда посту присваивают файл, а старым - posts.images.fill_dimensions.
+post_init.disconnect(
+    Post._meta.get_field('image').update_dimension_fields, sender=Post
+)
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
@@ -66,6 +129,13 @@ class Comment(models.Model):
         verbose_name='Дата публикации'
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='comment_post_created_idx'
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -78,3 +148,121 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_feed_entry'
+            ),
+        ]
+        indexes = [
+            # Страница ленты - срез по этому индексу без сортировки.
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx'
+            ),
+        ]
+
+
+class PostImageVariant(models.Model):
+    """Заранее нарезанная копия картинки поста (см. posts.thumbnails)."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='image_variants'
+    )
+    # `960x339` - превью с обрезкой, `w640` - копия для srcset.
+    size = models.CharField('Размер', max_length=20)
+    format = models.CharField('Формат', max_length=10, default='JPEG')
+    source = models.CharField('Исходный файл', max_length=255)
+    image = models.ImageField('Картинка', upload_to='posts/thumbs/')
+    width = models.PositiveIntegerField('Ширина')
+    height = models.PositiveIntegerField('Высота')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'size', 'format'],
+                name='unique_post_image_variant'
+            ),
+        ]
+        # Превью одной картинки общие у постов с одинаковым файлом.
+        indexes = [
+            models.Index(fields=['source'], name='variant_source_idx'),
+            models.Index(fields=['image'], name='variant_image_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} {self.size} {self.format}'
+
+
+class SearchTerm(models.Model):
+    """Терм поискового индекса постов, если в SQLite нет FTS5.
+
+    Строка относится к тексту поста (`comment` пуст) или к одному
+    его комментарию. Вес - сколько раз основа встречается в документе,
+    в тексте поста - с множителем (см. posts.search).
+    """
+    term = models.CharField('Терм', max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms'
+    )
+    comment = models.ForeignKey(
+        Comment,
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='search_terms'
+    )
+    weight = models.PositiveIntegerField('Вес')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'post'], name='search_term_idx'),
+        ]
+
+
+class PostMonth(models.Model):
+    """Число постов области за месяц для архива (см. posts.archive).
+
+    Области - как у счётчиков: `all`, `author:<id>`, `group:<id>`.
+    """
+    scope = models.CharField('Область', max_length=32)
+    month = models.DateField('Месяц')
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+
+    class Meta:
+        ordering = ['-month']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'month'], name='unique_post_month'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.scope} {self.month:%Y-%m}'
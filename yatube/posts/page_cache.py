@@ -0,0 +1,277 @@
+"""Кеш готовых страниц index, group_list, profile и post_detail.
+
+Ключ страницы складывается из имени view, её аргументов, параметров
+запроса, которые view читает (`?page=`, `?cursor=`), пользователя
+(или `anon`) и «поколений» областей, от которых страница зависит:
+`posts`, `group:<slug>`, `author:<username>`, `post:<id>`, `follow:<id>`
+и `groups` (названия групп у постов). Сигналы `Post`,
+`Comment`, `Group` и `Follow` сдвигают поколение области (`invalidate`),
+и все старые ключи перестают совпадать - поэтому TTL можно держать
+длинным.
+
+Рядом с поколением хранится время последнего изменения области.
+Из них же строятся ETag (ключ страницы) и Last-Modified, так что
+повторный визит с `If-None-Match`/`If-Modified-Since` получает 304
+после одного чтения кеша - без выборки, пагинации и рендеринга.
+"""
+import hashlib
+import math
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag, urlencode
+
+from .models import Follow, Group, Post
+
+KEY_PREFIX = 'posts:page:'
+GENERATION_PREFIX = 'posts:generation:'
+CHANGED_PREFIX = 'posts:changed:'
+AUTHOR_PREFIX = 'posts:author:'
+# Параметры запроса, которые читают пагинаторы (см. `posts.utils`).
+PAGE_PARAMS = ('page', 'cursor')
+
+
+def _scope_hash(scope):
+    # slug и username могут быть не ASCII - в ключ идёт их хеш.
+    return hashlib.md5(scope.encode()).hexdigest()
+
+
+def _generation_key(scope):
+    return GENERATION_PREFIX + _scope_hash(scope)
+
+
+def _changed_key(scope):
+    return CHANGED_PREFIX + _scope_hash(scope)
+
+
+def _now():
+    # HTTP-даты точны до секунды: округляем вверх, чтобы изменение
+    # в ту же секунду, что и прошлый ответ, не давало 304.
+    return math.ceil(time.time())
+
+
+def _new_generation():
+    # Начинаем с текущего времени, а не с 1: если ключ поколения
+    # вытеснят из кеша, новое поколение не совпадёт со старым.
+    return int(time.time() * 1000)
+
+
+def versions(scopes):
+    """Поколения областей и время последнего изменения любой из них.
+
+    Одно чтение кеша; недостающие поколения и отметки заводятся
+    заново (время изменения тогда - «сейчас»).
+    """
+    generation_keys = [_generation_key(scope) for scope in scopes]
+    changed_keys = [_changed_key(scope) for scope in scopes]
+    found = cache.get_many(generation_keys + changed_keys)
+    missing = {key: _new_generation()
+               for key in generation_keys if key not in found}
+    missing.update(
+        (key, _now()) for key in changed_keys if key not in found
+    )
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    changed = max((found[key] for key in changed_keys), default=None)
+    if changed is not None:
+        changed = datetime.fromtimestamp(changed, timezone.utc)
+    return [found[key] for key in generation_keys], changed
+
+
+def generations(scopes):
+    """Текущие поколения областей, недостающие заводятся заново."""
+    return versions(scopes)[0]
+
+
+def invalidate(scopes):
+    """Сдвигает поколения областей: их страницы перестают читаться."""
+    now = _now()
+    for scope in set(scopes):
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_generation(), None)
+    cache.set_many(
+        {_changed_key(scope): now for scope in set(scopes)}, None
+    )
+
+
+def page_key(request, view_name, kwargs, scopes, generations=None,
+             shared=False, params=PAGE_PARAMS):
+    """Ключ страницы; из строки запроса берутся только `params` -
+    прочие параметры (`utm_*` и т.п.) не плодят копии в кеше."""
+    user = request.user
+    if user.is_authenticated and not shared:
+        audience = f'user:{user.pk}'
+    else:
+        audience = 'anon'
+    arguments = '&'.join(f'{k}={v}' for k, v in sorted(kwargs.items()))
+    # Ленты Atom/RSS содержат абсолютные ссылки.
+    origin = f'{request.scheme}://{request.get_host()}'
+    query = urlencode([
+        (name, request.GET.getlist(name))
+        for name in sorted(params) if name in request.GET
+    ], doseq=True)
+    if generations is None:
+        generations = versions(scopes)[0]
+    numbers = '.'.join(str(number) for number in generations)
+    digest = hashlib.md5(
+        f'{origin}|{arguments}?{query}|{audience}|{numbers}'.encode()
+    ).hexdigest()
+    return f'{KEY_PREFIX}{view_name}:{digest}'
+
+
+def _stored_stream(key, chunks, content_type):
+    """Отдаёт куски потокового ответа и кеширует их, когда поток дочитан."""
+    content = []
+    for chunk in chunks:
+        content.append(chunk)
+        yield chunk
+    cache.set(
+        key,
+        (b''.join(content), content_type),
+        settings.POSTS_PAGE_CACHE_TIMEOUT
+    )
+
+
+def cached_page(view_name, scopes, anonymous_only=False, shared=False,
+                params=PAGE_PARAMS):
+    """Кеширует ответ view до изменения одной из её областей.
+
+    `scopes(**kwargs)` возвращает области страницы по аргументам view.
+    Ответ получает ETag и Last-Modified, совпадающий условный запрос -
+    304 без вызова view.
+    С `anonymous_only=True` страницы авторизованных не кешируются
+    (например, если в них есть форма с CSRF-токеном), но условные
+    запросы для них работают.
+    С `shared=True` страница одна для всех пользователей (ленты Atom/RSS).
+    `params` - параметры запроса, от которых зависит ответ view.
+    Потоковый ответ попадает в кеш, когда клиент дочитает его до конца.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, **kwargs)
+            page_scopes = scopes(**kwargs)
+            numbers, last_modified = versions(page_scopes)
+            key = page_key(
+                request, view_name, kwargs, page_scopes, numbers, shared,
+                params
+            )
+            etag = quote_etag(key.rsplit(':', 1)[1])
+            not_modified = get_conditional_response(
+                request, etag=etag,
+                last_modified=int(last_modified.timestamp()),
+            )
+            if not_modified is not None:
+                not_modified['ETag'] = etag
+                return not_modified
+            store = not (anonymous_only and request.user.is_authenticated)
+            cached = cache.get(key) if store else None
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                response = view(request, **kwargs)
+                if response.status_code != 200:
+                    return response
+                if response.streaming:
+                    if store:
+                        response.streaming_content = _stored_stream(
+                            key,
+                            response.streaming_content,
+                            response['Content-Type']
+                        )
+                elif store:
+                    cache.set(
+                        key,
+                        (response.content, response['Content-Type']),
+                        settings.POSTS_PAGE_CACHE_TIMEOUT
+                    )
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+            return response
+        return wrapper
+    return decorator
+
+
+def index_scopes():
+    return ['posts']
+
+
+def group_scopes(slug):
+    return [f'group:{slug}']
+
+
+def profile_scopes(username):
+    return [f'author:{username}']
+
+
+def post_scopes(post_id):
+    return [f'post:{post_id}']
+
+
+def groups_scopes():
+    return ['groups']
+
+
+def with_groups(scopes):
+    """Добавляет к `scopes(**kwargs)` названия групп: страница показывает
+    группы постов, а правка группы не знает, на каких страницах они."""
+    return lambda **kwargs: scopes(**kwargs) + groups_scopes()
+
+
+def post_detail_scopes(post_id):
+    """Области страницы поста: сам пост, автор (в карточке число его
+    постов) и названия групп. Автор поста не меняется, поэтому его имя
+    тоже берётся из кеша, и повторный визит обходится без базы."""
+    scopes = post_scopes(post_id) + groups_scopes()
+    key = f'{AUTHOR_PREFIX}{post_id}'
+    username = cache.get(key)
+    if username is None:
+        username = Post.objects.filter(pk=post_id).values_list(
+            'author__username', flat=True
+        ).first()
+        if username is None:
+            return scopes
+        cache.set(key, username, settings.POSTS_PAGE_CACHE_TIMEOUT)
+    return scopes + profile_scopes(username)
+
+
+def subscription_scopes(user_id):
+    return [f'follow:{user_id}']
+
+
+def follow_scopes(user):
+    """Области ленты подписок: подписки пользователя, профили авторов
+    и названия групп."""
+    scopes = subscription_scopes(user.pk) + groups_scopes()
+    for username in Follow.objects.filter(user=user).order_by(
+        'author__username'
+    ).values_list('author__username', flat=True):
+        scopes += profile_scopes(username)
+    return scopes
+
+
+def post_page_scopes(post, previous_group_id=None):
+    """Области, страницы которых показывают пост."""
+    scopes = index_scopes() + post_scopes(post.pk)
+    scopes += profile_scopes(post.author.username)
+    group_ids = {post.group_id, previous_group_id} - {None}
+    if post.group_id is not None and Post.group.is_cached(post):
+        scopes += group_scopes(post.group.slug)
+        group_ids.discard(post.group_id)
+    if group_ids:
+        for slug in Group.objects.filter(pk__in=group_ids).values_list(
+            'slug', flat=True
+        ):
+            scopes += group_scopes(slug)
+    return scopes
@@ -0,0 +1,227 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from . import counters
+
+
+# Наибольший id, который помещается в INTEGER SQLite и в bigint.
+MAX_ID = 2 ** 63 - 1
+
+
+class InvalidCursor(ValueError):
+    """Курсор не удалось разобрать."""
+
+
+def encode_token(payload):
+    """Упаковывает словарь в непрозрачный токен для строки запроса."""
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_token(token):
+    """Распаковывает токен `encode_token` обратно в словарь."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor(token)
+    if not isinstance(payload, dict):
+        raise InvalidCursor(token)
+    return payload
+
+
+def decode_id(value):
+    """id записи из токена; вне диапазона ключей - `InvalidCursor`."""
+    try:
+        pk = int(value)
+    except (OverflowError, TypeError, ValueError):
+        raise InvalidCursor(value)
+    if not 0 < pk <= MAX_ID:
+        raise InvalidCursor(value)
+    return pk
+
+
+def encode_cursor(pub_date, pk, backward=False):
+    """Упаковывает позицию ленты в непрозрачный токен для `?cursor=`."""
+    payload = {'d': pub_date.isoformat(), 'i': pk}
+    if backward:
+        payload['b'] = 1
+    return encode_token(payload)
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора в (pub_date, id, backward)."""
+    payload = decode_token(token)
+    try:
+        pub_date = parse_datetime(payload['d'])
+        pk = decode_id(payload['i'])
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor(token)
+    if pub_date is None:
+        raise InvalidCursor(token)
+    return pub_date, pk, bool(payload.get('b'))
+
+
+class CursorPage:
+    """Страница ленты без номера и без общего количества записей.
+
+    Повторяет ту часть интерфейса `django.core.paginator.Page`,
+    которой пользуются шаблоны: итерацию, `object_list`,
+    `has_next`/`has_previous` и `has_other_pages`.
+    """
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<Cursor page of %s objects>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        last = self.object_list[-1]
+        return encode_cursor(last.pub_date, last.pk)
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        first = self.object_list[0]
+        return encode_cursor(first.pub_date, first.pk, backward=True)
+
+
+class CursorPaginator:
+    """Keyset-пагинация ленты по паре (pub_date, id).
+
+    Вместо `COUNT(*)` и `OFFSET` каждая страница выбирается одним
+    запросом `WHERE (pub_date, id) < курсор ... LIMIT per_page + 1`,
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, per_page):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+
+    def get_page(self, cursor):
+        """Возвращает страницу после/до курсора.
+
+        Пустой или испорченный курсор означает первую страницу -
+        так же снисходительно ведёт себя `Paginator.get_page`.
+        """
+        if cursor:
+            try:
+                pub_date, pk, backward = decode_cursor(cursor)
+            except InvalidCursor:
+                return self._first_page()
+            if backward:
+                return self._page_before(pub_date, pk)
+            return self._page_after(pub_date, pk)
+        return self._first_page()
+
+    def _first_page(self):
+        rows = self._fetch(self.queryset_first())
+        has_next = len(rows) > self.per_page
+        return CursorPage(rows[:self.per_page], self, has_next, False)
+
+    def queryset_first(self):
+        return self.object_list.order_by('-pub_date', '-pk')
+
+    def queryset_after(self, pub_date, pk):
+        """Записи, идущие в ленте после позиции (pub_date, pk)."""
+        return self.object_list.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+        ).order_by('-pub_date', '-pk')
+
+    def queryset_before(self, pub_date, pk):
+        """Записи перед позицией, от ближайшей к ней."""
+        return self.object_list.filter(
+            Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+        ).order_by('pub_date', 'pk')
+
+    def _page_after(self, pub_date, pk):
+        rows = self._fetch(self.queryset_after(pub_date, pk))
+        has_next = len(rows) > self.per_page
+        return CursorPage(rows[:self.per_page], self, has_next, True)
+
+    def _page_before(self, pub_date, pk):
+        rows = self._fetch(self.queryset_before(pub_date, pk))
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return CursorPage(rows, self, True, has_previous)
+
+    def _fetch(self, queryset):
+        return list(queryset[:self.per_page + 1])
+
+
+class CountedPaginator(Paginator):
+    """`Paginator`, которому общее количество записей подсказывают.
+
+    `count` - число или функция без аргументов (см. `posts.counters`),
+    поэтому `COUNT(*)` по всей таблице не выполняется. Счётчик может
+    немного отставать, так что срез страницы по нему не обрезается.
+    """
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._count = count
+
+    @cached_property
+    def count(self):
+        if callable(self._count):
+            return self._count()
+        return self._count
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        return self._get_page(self.object_list[bottom:top], number, self)
+
+
+class EstimatedCountPaginator(Paginator):
+    """`Paginator` списка постов в админке без `COUNT(*)` по таблице.
+
+    Без фильтров количество - счётчик всех постов (`posts.counters`),
+    с фильтром или поиском считается не больше
+    `POSTS_ADMIN_COUNT_LIMIT` строк: дальние страницы большой выборки
+    проще сузить фильтром по дате, чем листать.
+    """
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            return counters.all_posts_count()
+        limit = settings.POSTS_ADMIN_COUNT_LIMIT
+        return self.object_list.order_by()[:limit].count()
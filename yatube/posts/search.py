@@ -0,0 +1,351 @@
+"""Полнотекстовый поиск по постам и комментариям к ним.
+
+Текст поста и каждый комментарий индексируются отдельными документами
+из основ слов (`posts.stemmer`): сохранение или удаление комментария
+переписывает только его строки, а не весь пост. Индекс обновляют
+сигналы `Post` и `Comment`, поэтому поиск не сканирует таблицу постов
+через `LIKE '%...%'`. Пост находится, если каждое слово запроса есть
+в его тексте или хоть в одном комментарии.
+
+Если SQLite собран с FTS5, документы лежат в виртуальных таблицах
+`posts_search_fts` (rowid - id поста) и `posts_search_comments_fts`
+(rowid - id комментария) и ранжируются по bm25 (текст поста весит
+больше комментариев). Иначе - в таблице термов `SearchTerm`
+(терм -> пост или комментарий), а рангом служит сумма весов
+найденных термов.
+
+Выдача листается курсором по паре (ранг, id), как и ленты.
+"""
+import math
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Q, Sum
+
+from . import stemmer
+from .models import Comment, Post, SearchTerm
+from .paginators import (CursorPage, InvalidCursor, decode_id, decode_token,
+                         encode_token)
+
+FTS_TABLE = 'posts_search_fts'
+COMMENTS_FTS_TABLE = 'posts_search_comments_fts'
+# Во сколько раз совпадение в тексте поста важнее, чем в комментарии.
+TEXT_WEIGHT = 4
+MAX_QUERY_TERMS = 10
+
+_fts_available = {}
+
+
+def use_fts():
+    """Ищем через FTS5, если таблицы есть и это не запрещено настройкой."""
+    if settings.POSTS_SEARCH_BACKEND == 'table':
+        return False
+    key = connection.settings_dict['NAME']
+    if key not in _fts_available:
+        _fts_available[key] = (
+            connection.vendor == 'sqlite'
+            and COMMENTS_FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available[key]
+
+
+def query_terms(query):
+    """Уникальные основы слов запроса."""
+    return list(dict.fromkeys(stemmer.terms(query)))[:MAX_QUERY_TERMS]
+
+
+def _match_expression(terms):
+    # Все термы обязательны; кавычки - чтобы терм не читался
+    # как оператор FTS5.
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def _execute(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+# Запись в индекс.
+
+def _term_rows(text, weight, post_id, comment_id=None):
+    weights = Counter()
+    for term in stemmer.terms(text):
+        weights[term] += weight
+    return [
+        SearchTerm(term=term, post_id=post_id, comment_id=comment_id,
+                   weight=total)
+        for term, total in weights.items()
+    ]
+
+
+def write_post(post_id, text):
+    """Заменяет документ текста поста в индексе."""
+    if use_fts():
+        _execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+        _execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+            [post_id, ' '.join(stemmer.terms(text))]
+        )
+        return
+    SearchTerm.objects.filter(post_id=post_id, comment=None).delete()
+    SearchTerm.objects.bulk_create(
+        _term_rows(text, TEXT_WEIGHT, post_id), batch_size=500
+    )
+
+
+def write_comment(comment_id, post_id, text):
+    """Заменяет документ комментария в индексе."""
+    if use_fts():
+        _execute(
+            f'DELETE FROM {COMMENTS_FTS_TABLE} WHERE rowid = %s',
+            [comment_id]
+        )
+        _execute(
+            f'INSERT INTO {COMMENTS_FTS_TABLE} (rowid, text, post_id) '
+            f'VALUES (%s, %s, %s)',
+            [comment_id, ' '.join(stemmer.terms(text)), post_id]
+        )
+        return
+    SearchTerm.objects.filter(comment_id=comment_id).delete()
+    SearchTerm.objects.bulk_create(
+        _term_rows(text, 1, post_id, comment_id), batch_size=500
+    )
+
+
+def index_post(post):
+    write_post(post.pk, post.text)
+
+
+def index_comment(comment):
+    write_comment(comment.pk, comment.post_id, comment.text)
+
+
+def index_posts(post_ids):
+    """Переиндексирует пачку постов с комментариями: два чтения на пачку."""
+    for post_id, text in Post.objects.filter(
+        pk__in=post_ids
+    ).values_list('pk', 'text'):
+        write_post(post_id, text)
+    for comment_id, post_id, text in Comment.objects.filter(
+        post_id__in=post_ids
+    ).values_list('pk', 'post_id', 'text'):
+        write_comment(comment_id, post_id, text)
+
+
+def remove_comment(comment_id):
+    # Строки SearchTerm удаляются каскадом вместе с комментарием.
+    if use_fts():
+        _execute(
+            f'DELETE FROM {COMMENTS_FTS_TABLE} WHERE rowid = %s',
+            [comment_id]
+        )
+
+
+def remove_posts(post_ids):
+    """Убирает из индекса пачку постов вместе с их комментариями.
+
+    Вызывается до удаления комментариев: их id берутся из таблицы
+    комментариев. Строки SearchTerm удаляются каскадом.
+    """
+    if not use_fts() or not post_ids:
+        return
+    post_ids = list(post_ids)
+    placeholders = _placeholders(post_ids)
+    _execute(
+        f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', post_ids
+    )
+    table = Comment._meta.db_table
+    _execute(
+        f'DELETE FROM {COMMENTS_FTS_TABLE} WHERE rowid IN '
+        f'(SELECT id FROM {table} WHERE post_id IN ({placeholders}))',
+        post_ids
+    )
+
+
+def rebuild():
+    """Заново строит индекс всех постов; возвращает их число."""
+    if use_fts():
+        _execute(f'DELETE FROM {FTS_TABLE}', [])
+        _execute(f'DELETE FROM {COMMENTS_FTS_TABLE}', [])
+    else:
+        SearchTerm.objects.all().delete()
+    total = 0
+    for post_id, text in Post.objects.values_list('pk', 'text').iterator():
+        write_post(post_id, text)
+        total += 1
+    for comment_id, post_id, text in Comment.objects.values_list(
+        'pk', 'post_id', 'text'
+    ).iterator():
+        write_comment(comment_id, post_id, text)
+    return total
+
+
+# Поиск.
+
+def matching_posts(queryset, query):
+    """Посты `queryset`, в документе которых есть все слова запроса."""
+    terms = query_terms(query)
+    if not terms:
+        return queryset.none()
+    if use_fts():
+        # RawSQL в `pk__in` оборачивается во вторые скобки и становится
+        # скалярным подзапросом, поэтому условие добавляется через extra.
+        table = queryset.model._meta.db_table
+        sql, params = _fts_matches(terms)
+        return queryset.extra(
+            where=[f'"{table}"."id" IN (SELECT post_id FROM ({sql}))'],
+            params=params,
+        )
+    return queryset.filter(pk__in=_term_matches(terms).values('post_id'))
+
+
+def _term_matches(terms):
+    return (
+        SearchTerm.objects.filter(term__in=terms)
+        .values('post_id')
+        .annotate(matched=Count('term', distinct=True), score=Sum('weight'))
+        .filter(matched=len(terms))
+    )
+
+
+def _fts_matches(terms):
+    """SQL (post_id, score) постов, где нашёлся каждый терм.
+
+    Терм ищется отдельно в текстах постов и в комментариях, очки
+    документов поста складываются.
+    """
+    parts = []
+    params = []
+    for number, term in enumerate(terms):
+        expression = _match_expression([term])
+        parts.append(
+            f'SELECT rowid AS post_id, {number} AS term, '
+            f'-bm25({FTS_TABLE}) * {TEXT_WEIGHT} AS score '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        )
+        parts.append(
+            f'SELECT post_id, {number}, -bm25({COMMENTS_FTS_TABLE}) '
+            f'FROM {COMMENTS_FTS_TABLE} WHERE {COMMENTS_FTS_TABLE} MATCH %s'
+        )
+        params += [expression, expression]
+    sql = (
+        'SELECT post_id, SUM(score) AS score FROM ('
+        + ' UNION ALL '.join(parts)
+        + f') GROUP BY post_id HAVING COUNT(DISTINCT term) = {len(terms)}'
+    )
+    return sql, params
+
+
+def ranked(terms, limit, after=None, before=None):
+    """(post_id, ранг) лучших совпадений после/до позиции (ранг, id).
+
+    Без позиции и с `after` - по убыванию ранга, с `before` - по
+    возрастанию, от ближайшей к позиции записи.
+    """
+    if use_fts():
+        return _ranked_fts(terms, limit, after, before)
+    matches = _term_matches(terms)
+    if before is not None:
+        score, pk = before
+        matches = matches.filter(
+            Q(score__gt=score) | Q(score=score, post_id__gt=pk)
+        ).order_by('score', 'post_id')
+    else:
+        if after is not None:
+            score, pk = after
+            matches = matches.filter(
+                Q(score__lt=score) | Q(score=score, post_id__lt=pk)
+            )
+        matches = matches.order_by('-score', '-post_id')
+    return list(matches.values_list('post_id', 'score')[:limit])
+
+
+def _ranked_fts(terms, limit, after, before):
+    matches, params = _fts_matches(terms)
+    sql = f'SELECT post_id, score FROM ({matches})'
+    if before is not None:
+        sql += (
+            ' WHERE score > %s OR (score = %s AND post_id > %s)'
+            ' ORDER BY score, post_id'
+        )
+        params += [before[0], before[0], before[1]]
+    else:
+        if after is not None:
+            sql += ' WHERE score < %s OR (score = %s AND post_id < %s)'
+            params += [after[0], after[0], after[1]]
+        sql += ' ORDER BY score DESC, post_id DESC'
+    sql += ' LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+class SearchPage(CursorPage):
+    """Страница выдачи: посты в порядке ранга и курсоры по (ранг, id)."""
+
+    def __init__(self, object_list, scores, paginator, has_next,
+                 has_previous):
+        super().__init__(object_list, paginator, has_next, has_previous)
+        self.scores = scores
+
+    @property
+    def next_cursor(self):
+        if not self._has_next:
+            return None
+        return encode_token({'s': self.scores[-1], 'i': self[-1].pk})
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous:
+            return None
+        return encode_token({'s': self.scores[0], 'i': self[0].pk, 'b': 1})
+
+
+class SearchPaginator:
+    """Курсорная пагинация ранжированной выдачи поиска."""
+
+    is_cursor = True
+
+    def __init__(self, query, per_page, queryset):
+        self.terms = query_terms(query)
+        self.per_page = int(per_page)
+        self.queryset = queryset
+
+    def get_page(self, cursor):
+        after = before = None
+        if cursor:
+            try:
+                payload = decode_token(cursor)
+                position = (float(payload['s']), decode_id(payload['i']))
+                if not math.isfinite(position[0]):
+                    raise InvalidCursor(cursor)
+            except (InvalidCursor, KeyError, TypeError, ValueError):
+                position = None
+            if position is not None and payload.get('b') == 1:
+                before = position
+            else:
+                after = position
+        if not self.terms:
+            return SearchPage([], [], self, False, False)
+        rows = ranked(self.terms, self.per_page + 1, after, before)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if before is not None:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, after is not None
+        posts = self.queryset.in_bulk([post_id for post_id, _ in rows])
+        rows = [(post_id, score) for post_id, score in rows
+                if post_id in posts]
+        return SearchPage(
+            [posts[post_id] for post_id, _ in rows],
+            [score for _, score in rows],
+            self, has_next, has_previous
+        )
@@ -0,0 +1,198 @@
+import threading
+
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import (activity, archive, counters, feed, media, page_cache,
+               search)
+from .models import Comment, Follow, Group, Post, PostImageVariant
+
+# id постов, которые сейчас удаляются в этом потоке: комментарии,
+# удаляемые каскадом, не трогают их счётчики, индекс и кеш страниц.
+_deleting = threading.local()
+
+
+def _deleting_posts():
+    if not hasattr(_deleting, 'posts'):
+        _deleting.posts = set()
+    return _deleting.posts
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleted_post(sender, instance, **kwargs):
+    _deleting_posts().add(instance.pk)
+    # Пока комментарии поста ещё в базе - их id нужны индексу.
+    search.remove_posts([instance.pk])
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, raw, **kwargs):
+    """Запоминает группу и картинку поста до редактирования."""
+    instance._previous_group_id = None
+    instance._previous_image = None
+    if raw or instance.pk is None:
+        return
+    previous = (
+        Post.objects.filter(pk=instance.pk)
+        .values_list('group_id', 'image')
+        .first()
+    )
+    if previous is not None:
+        instance._previous_group_id, instance._previous_image = previous
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.adjust(counters.post_scopes(instance), 1)
+        archive.post_added(instance)
+        feed.fan_out_post(instance)
+        return
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        archive.group_changed(instance, previous_group_id)
+        if previous_group_id is not None:
+            counters.adjust([counters.group_scope(previous_group_id)], -1)
+        if instance.group_id is not None:
+            counters.adjust([counters.group_scope(instance.group_id)], 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    _deleting_posts().discard(instance.pk)
+    counters.adjust(counters.post_scopes(instance), -1)
+    feed.forget_counts([instance.author_id])
+    archive.post_deleted(instance)
+
+
+@receiver(post_save, sender=Follow)
+def add_followed_posts(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        feed.backfill(instance.user_id, instance.author_id)
+    counters.forget([counters.follow_scope(instance.user_id)])
+
+
+@receiver(post_delete, sender=Follow)
+def remove_unfollowed_posts(sender, instance, **kwargs):
+    feed.prune(instance.user_id, instance.author_id)
+    counters.forget([counters.follow_scope(instance.user_id)])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    page_cache.invalidate(page_cache.post_page_scopes(
+        instance, getattr(instance, '_previous_group_id', None)
+    ))
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        activity.comment_added(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id not in _deleting_posts():
+        activity.comment_deleted(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, raw=False, **kwargs):
+    """Сбрасывает страницу поста и ленты, где видно число комментариев."""
+    if raw or instance.post_id in _deleting_posts():
+        return
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=instance.post_id
+    ).first()
+    if post is None:
+        page_cache.invalidate(page_cache.post_scopes(instance.post_id))
+        return
+    page_cache.invalidate(page_cache.post_page_scopes(post))
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, raw, **kwargs):
+    """Запоминает slug группы до переименования."""
+    instance._previous_slug = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_slug = (
+        Group.objects.filter(pk=instance.pk)
+        .values_list('slug', flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    scopes = (
+        page_cache.index_scopes() + page_cache.groups_scopes()
+        + page_cache.group_scopes(instance.slug)
+    )
+    previous_slug = getattr(instance, '_previous_slug', None)
+    if previous_slug and previous_slug != instance.slug:
+        scopes += page_cache.group_scopes(previous_slug)
+    page_cache.invalidate(scopes)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    page_cache.invalidate(
+        page_cache.profile_scopes(instance.author.username)
+        + page_cache.subscription_scopes(instance.user_id)
+    )
+
+
+@receiver(post_delete, sender=PostImageVariant)
+def delete_variant_file(sender, instance, **kwargs):
+    """Удаляет файл превью вместе с последней записью о нём."""
+    if instance.image and not PostImageVariant.objects.filter(
+        image=instance.image.name
+    ).exists():
+        instance.image.storage.delete(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, raw, **kwargs):
+    previous = getattr(instance, '_previous_image', None)
+    if not raw and previous and previous != instance.image.name:
+        media.release([previous])
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    media.release([instance.image.name])
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, raw, **kwargs):
+    if not raw:
+        search.index_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def index_saved_comment(sender, instance, raw, **kwargs):
+    if not raw:
+        search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_deleted_comment(sender, instance, **kwargs):
+    if instance.post_id not in _deleting_posts():
+        search.remove_comment(instance.pk)
@@ -0,0 +1,98 @@
+"""Стеммер Snowball для русского языка и разбиение текста на термы.
+
+Поиск (`posts.search`) хранит и ищет не слова, а их основы:
+«котики», «котиков» и «котик» дают один терм «котик».
+"""
+import re
+from functools import lru_cache
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|'
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+# Окончание -ость снимается, только если оно целиком в R2.
+DERIVATIONAL = re.compile(
+    r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$'
+)
+RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+WORD = re.compile(r'\w+')
+
+STOP_WORDS = frozenset((
+    'а', 'без', 'бы', 'в', 'во', 'вот', 'вы', 'да', 'для', 'до', 'его',
+    'ее', 'же', 'за', 'и', 'из', 'или', 'им', 'их', 'к', 'как', 'ко',
+    'ли', 'мы', 'на', 'над', 'не', 'ни', 'но', 'о', 'об', 'от', 'по',
+    'под', 'при', 'про', 'с', 'со', 'так', 'то', 'ты', 'у', 'уже', 'что',
+    'это', 'я',
+))
+
+MAX_TERM_LENGTH = 64
+
+
+# Слова в постах повторяются, а регулярные выражения Snowball дороги:
+# при переиндексации кеш экономит большую часть времени.
+@lru_cache(maxsize=65536)
+def stem(word):
+    """Основа русского слова по алгоритму Snowball."""
+    word = word.lower().replace('ё', 'е')
+    match = RV.match(word)
+    if match is None:
+        return word
+    start, rv = match.groups()
+
+    # Шаг 1: деепричастие, иначе возвратность и прилагательное,
+    # глагол или существительное.
+    stripped = PERFECTIVE_GERUND.sub('', rv, 1)
+    if stripped == rv:
+        rv = REFLEXIVE.sub('', rv, 1)
+        stripped = ADJECTIVE.sub('', rv, 1)
+        if stripped != rv:
+            rv = PARTICIPLE.sub('', stripped, 1)
+        else:
+            stripped = VERB.sub('', rv, 1)
+            rv = NOUN.sub('', rv, 1) if stripped == rv else stripped
+    else:
+        rv = stripped
+
+    # Шаг 2.
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    # Шаг 3.
+    if DERIVATIONAL.match(rv):
+        rv = re.sub('ость?$', '', rv)
+
+    # Шаг 4: мягкий знак, превосходная степень, двойное «н».
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = re.sub('ейше?$', '', rv)
+        rv = re.sub('нн$', 'н', rv)
+    return start + rv
+
+
+def terms(text):
+    """Основы слов текста без стоп-слов, в порядке появления."""
+    result = []
+    for word in WORD.findall(text.lower().replace('ё', 'е')):
+        if word in STOP_WORDS:
+            continue
+        if re.search('[а-я]', word):
+            word = stem(word)
+        result.append(word[:MAX_TERM_LENGTH])
+    return result
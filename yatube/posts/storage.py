@@ -0,0 +1,58 @@
+"""Хранилище картинок постов с именами по содержимому.
+
+`ContentAddressedStorage.save` называет файл SHA-256 его содержимого:
+`posts/ab/ab12….jpg`. Одна и та же картинка, загруженная многими
+пользователями, хранится одним файлом, а повторная загрузка ничего
+не пишет на диск. Удаление файлов, на которые больше не ссылается
+ни один пост, - в `posts.media`.
+"""
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASHED_NAME = re.compile(r'(^|/)([0-9a-f]{2})/\2[0-9a-f]{62}(\.\w+)?$')
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def is_hashed(name):
+    return bool(HASHED_NAME.search(name))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, digest):
+        """`<каталог upload_to>/<2 знака хеша>/<хеш><расширение>`."""
+        directory = posixpath.dirname(name.replace('\\', '/'))
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content_hash(content))
+        if self.exists(name):
+            # Файл уже есть. Обновляем время изменения, чтобы его,
+            # ещё ничей, не удалил сборщик мусора (см. POSTS_MEDIA_GRACE).
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                # Сборщик мусора удалил его между проверками -
+                # записываем заново.
+                pass
+        return super().save(name, content, max_length)
@@ -0,0 +1,193 @@
+"""Ленты Atom и RSS: главная, группа и автор.
+
+Выборка та же, что у HTML-лент (`posts.utils.feed_queryset`). XML
+отдаётся потоком: посты выбираются, когда клиент начал читать ответ,
+и записи собираются по одной. Дочитанная лента кешируется целиком через
+`posts.page_cache.cached_page` с теми же областями, что и страницы:
+новый пост в группе или у автора сдвигает поколение и ленту
+собирают заново. Опрос ленты с `If-None-Match`/`If-Modified-Since`
+получает 304 после одного чтения кеша.
+"""
+from abc import ABC, abstractmethod
+from io import StringIO
+
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import (Atom1Feed, Rss201rev2Feed,
+                                        SimplerXMLGenerator)
+from django.utils.text import Truncator
+from django.views.decorators.http import require_GET
+
+from . import page_cache, utils
+from .models import Group, Post, User
+
+
+class StreamingFeed(ABC):
+    """Пишет ленту кусками: корень, затем по одной записи."""
+
+    item_element = None
+
+    @abstractmethod
+    def root_elements(self):
+        """Корневые элементы: [(имя, атрибуты)], от внешнего."""
+
+    def stream(self, entries, encoding='utf-8'):
+        """Куски XML ленты.
+
+        `entries` - аргументы `add_item` по записи, новые первыми;
+        запись собирается, только когда до неё дошёл поток. Первая
+        добавляется до корня: по ней `latest_post_date` пишет дату
+        обновления ленты.
+        """
+        entries = iter(entries)
+        first = next(entries, None)
+        if first is not None:
+            self.add_item(**first)
+        buffer = StringIO()
+        handler = SimplerXMLGenerator(
+            buffer, encoding, short_empty_elements=True
+        )
+        handler.startDocument()
+        roots = self.root_elements()
+        for name, attributes in roots:
+            handler.startElement(name, attributes)
+        self.add_root_elements(handler)
+        yield self._drain(buffer)
+        for item in self._items(entries):
+            handler.startElement(self.item_element, self.item_attributes(item))
+            self.add_item_elements(handler, item)
+            handler.endElement(self.item_element)
+            yield self._drain(buffer)
+        for name, _ in reversed(roots):
+            handler.endElement(name)
+        yield self._drain(buffer)
+
+    def _items(self, entries):
+        added, self.items = self.items, []
+        yield from added
+        for entry in entries:
+            self.add_item(**entry)
+            yield self.items.pop()
+
+    @staticmethod
+    def _drain(buffer):
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+
+class AtomFeed(StreamingFeed, Atom1Feed):
+    item_element = 'entry'
+
+    def root_elements(self):
+        return [('feed', self.root_attributes())]
+
+
+class RssFeed(StreamingFeed, Rss201rev2Feed):
+    item_element = 'item'
+
+    def root_elements(self):
+        return [('rss', self.rss_attributes()),
+                ('channel', self.root_attributes())]
+
+
+FORMATS = {
+    'atom': AtomFeed,
+    'rss': RssFeed,
+}
+
+
+def _response(request, kind, title, link, description, queryset):
+    feed_class = FORMATS.get(kind)
+    if feed_class is None:
+        raise Http404
+    feed = feed_class(
+        title=title,
+        link=request.build_absolute_uri(link),
+        description=description,
+        language='ru',
+        feed_url=request.build_absolute_uri(),
+    )
+    # Превью картинок в ленте не нужны.
+    posts = utils.feed_queryset(queryset).prefetch_related(None)[
+        :settings.POSTS_FEED_ITEMS
+    ]
+    return StreamingHttpResponse(
+        feed.stream(_entries(request, posts)), content_type=feed.content_type
+    )
+
+
+def _entries(request, posts):
+    # Генератор: запрос к базе выполняется на первой записи потока.
+    for post in posts:
+        url = request.build_absolute_uri(
+            reverse('posts:post_detail', args=(post.pk,))
+        )
+        yield {
+            'title': Truncator(post.text).words(8),
+            'link': url,
+            'unique_id': url,
+            'description': post.text,
+            'author_name': (
+                post.author.get_full_name() or post.author.username
+            ),
+            'pubdate': post.pub_date,
+            'categories': [post.group.title] if post.group_id else None,
+        }
+
+
+def _scopes(scopes):
+    # Формат ленты не влияет на её области.
+    return lambda kind, **kwargs: scopes(**kwargs)
+
+
+@require_GET
+@page_cache.cached_page(
+    'posts:feed_index', _scopes(page_cache.index_scopes), shared=True,
+    params=()
+)
+def index(request, kind):
+    return _response(
+        request, kind,
+        title='Yatube: последние записи',
+        link=reverse('posts:index'),
+        description='Последние записи всех авторов.',
+        queryset=Post.objects.all(),
+    )
+
+
+@require_GET
+@page_cache.cached_page(
+    'posts:feed_group', _scopes(page_cache.group_scopes), shared=True,
+    params=()
+)
+def group_posts(request, kind, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return _response(
+        request, kind,
+        title=f'Yatube: {group.title}',
+        link=reverse('posts:group_list', args=(slug,)),
+        description=group.description,
+        queryset=Post.objects.filter(group=group),
+    )
+
+
+@require_GET
+@page_cache.cached_page(
+    'posts:feed_profile',
+    _scopes(page_cache.with_groups(page_cache.profile_scopes)),
+    shared=True, params=()
+)
+def profile(request, kind, username):
+    author = get_object_or_404(User, username=username)
+    name = author.get_full_name() or author.username
+    return _response(
+        request, kind,
+        title=f'Yatube: записи {name}',
+        link=reverse('posts:profile', args=(username,)),
+        description=f'Последние записи автора {name}.',
+        queryset=Post.objects.filter(author=author),
+    )
@@ -0,0 +1,67 @@
+from django import template
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.contrib.admin.templatetags.base import InclusionAdminNode
+from django.utils import formats
+from django.utils.text import capfirst
+from django.utils.translation import gettext as _
+
+from posts import archive, counters
+
+register = template.Library()
+
+
+def post_date_hierarchy(cl):
+    """`date_hierarchy` списка постов, годы и месяцы - из архива.
+
+    Django строит их через `SELECT DISTINCT` по всей таблице. Без
+    фильтров и поиска те же списки читаются из `PostMonth`, а дни
+    выбранного месяца, как и любые отфильтрованные списки, - как
+    в Django (по индексу `pub_date` в границах месяца).
+    """
+    year_field = f'{cl.date_hierarchy}__year'
+    month_field = f'{cl.date_hierarchy}__month'
+    filters = set(cl.get_filters_params()) - {year_field}
+    months = sorted(
+        month for month, count in archive.months(counters.all_scope())
+    )
+    if cl.query or filters or len(months) < 2:
+        return date_hierarchy(cl)
+
+    def link(filters):
+        return cl.get_query_string(filters, [f'{cl.date_hierarchy}__'])
+
+    year = cl.params.get(year_field)
+    years = sorted({month.year for month in months})
+    if year is None and len(years) > 1:
+        return {
+            'show': True,
+            'back': None,
+            'choices': [
+                {'link': link({year_field: str(value)}), 'title': str(value)}
+                for value in years
+            ],
+        }
+    year = year or str(years[0])
+    return {
+        'show': True,
+        'back': {'link': link({}), 'title': _('All dates')},
+        'choices': [
+            {
+                'link': link({year_field: year, month_field: month.month}),
+                'title': capfirst(
+                    formats.date_format(month, 'YEAR_MONTH_FORMAT')
+                ),
+            }
+            for month in months if str(month.year) == year
+        ],
+    }
+
+
+@register.tag(name='post_date_hierarchy')
+def post_date_hierarchy_tag(parser, token):
+    return InclusionAdminNode(
+        parser, token,
+        func=post_date_hierarchy,
+        template_name='date_hierarchy.html',
+        takes_context=False,
+    )
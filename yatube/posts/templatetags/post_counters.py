@@ -0,0 +1,20 @@
+from django import template
+from django.contrib.auth import get_user_model
+
+from posts import counters
+from posts.models import Group
+
+
+register = template.Library()
+
+
+@register.filter
+def posts_count(obj):
+    """Количество постов автора или группы без `COUNT(*)` на каждый рендер."""
+    if isinstance(obj, get_user_model()):
+        return counters.author_posts_count(obj)
+    if isinstance(obj, Group):
+        return counters.group_posts_count(obj)
+    raise template.TemplateSyntaxError(
+        'posts_count ожидает автора или группу, получено %r' % obj
+    )
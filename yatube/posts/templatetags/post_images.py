@@ -0,0 +1,30 @@
+from django import template
+from django.templatetags.static import static
+
+from posts import thumbnails
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail_url(post, width=960, height=339):
+    """Готовое превью картинки поста или заглушка, пока его нарезают."""
+    url = thumbnails.thumbnail_url(post, int(width), int(height))
+    if url is None:
+        return static(thumbnails.PLACEHOLDER)
+    return url
+
+
+@register.inclusion_tag('includes/post_picture.html')
+def post_picture(post, sizes='(max-width: 960px) 100vw, 960px'):
+    """<picture> с srcset адаптивных копий картинки поста.
+
+    Пока копий нет (или пост старше них) - готовое превью 960x339
+    или заглушка, как у `post_thumbnail_url`.
+    """
+    return {
+        'picture': thumbnails.picture(post),
+        'post': post,
+        'sizes': sizes,
+    }
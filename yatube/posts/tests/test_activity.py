@@ -0,0 +1,97 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class PostActivityTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='talker')
+        cls.quiet = Post.objects.create(author=cls.author, text='Тихий пост')
+        cls.post = Post.objects.create(author=cls.author, text='Спорный пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def comment(self, post):
+        self.client.post(
+            reverse('posts:add_comment', args=(post.pk,)), {'text': 'Да'}
+        )
+
+    def test_comments_update_count_and_activity(self):
+        self.comment(self.post)
+        self.comment(self.post)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        self.assertEqual(
+            self.post.last_activity_at,
+            self.post.comments.latest('created').created
+        )
+        first = self.post.comments.earliest('created')
+        self.post.comments.latest('created').delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(self.post.last_activity_at, first.created)
+        first.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.last_activity_at, self.post.pub_date)
+
+    def test_repair_recounts_bulk_created_comments(self):
+        Comment.objects.bulk_create(
+            Comment(post=self.quiet, author=self.author, text=f'{i}')
+            for i in range(3)
+        )
+        Post.objects.filter(pk=self.post.pk).update(comments_count=7)
+        call_command('repair_post_activity', batch_size=1, stdout=StringIO())
+        counts = dict(Post.objects.values_list('pk', 'comments_count'))
+        self.assertEqual(counts, {self.quiet.pk: 3, self.post.pk: 0})
+        self.quiet.refresh_from_db()
+        self.assertEqual(
+            self.quiet.last_activity_at,
+            self.quiet.comments.latest('created').created
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.last_activity_at, self.post.pub_date)
+
+    def test_feed_shows_counts_and_orders_by_discussion(self):
+        url = reverse('posts:index')
+        self.client.get(url)
+        self.comment(self.quiet)
+        response = self.client.get(url)
+        self.assertContains(response, 'Комментариев: 1')
+        discussed = self.client.get(url, {'order': 'discussed'})
+        self.assertEqual(
+            [post.pk for post in discussed.context['page_obj']],
+            [self.quiet.pk, self.post.pk]
+        )
+
+    def test_feed_orders_by_last_activity(self):
+        url = reverse('posts:index')
+        self.comment(self.quiet)
+        active = self.client.get(url, {'order': 'active'})
+        self.assertEqual(active.context['order'], 'active')
+        self.assertEqual(
+            [post.pk for post in active.context['page_obj']],
+            [self.quiet.pk, self.post.pk]
+        )
+
+    def test_activity_is_stored_in_django_format(self):
+        self.comment(self.post)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT last_activity_at FROM posts_post WHERE id = %s',
+                [self.post.pk]
+            )
+            activity = cursor.fetchone()[0]
+        # Как пишет сам Django: UTC без смещения часового пояса.
+        self.assertNotIn('+', str(activity))
@@ -0,0 +1,114 @@
+from datetime import datetime
+
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from posts import archive, counters, search
+from posts.models import Comment, Group, Post, PostMonth
+
+User = get_user_model()
+
+CHANGELIST = reverse('admin:posts_post_changelist')
+
+
+class PostAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'boss', 'boss@example.com', 'password'
+        )
+        cls.author = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Старая', slug='old', description='Старая группа'
+        )
+        cls.target = Group.objects.create(
+            title='Новая', slug='new', description='Новая группа'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def create_posts(self, count):
+        return [
+            Post.objects.create(
+                author=self.author, group=self.group, text=f'Пост {i}'
+            )
+            for i in range(count)
+        ]
+
+    def rollup(self):
+        rows = set(PostMonth.objects.filter(posts_count__gt=0).values_list(
+            'scope', 'month', 'posts_count'
+        ))
+        archive.rebuild()
+        self.assertEqual(rows, set(
+            PostMonth.objects.values_list('scope', 'month', 'posts_count')
+        ))
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(CHANGELIST)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.create_posts(3)
+        # Первый запрос заводит счётчик постов в кеше.
+        self.changelist_queries()
+        few = self.changelist_queries()
+        self.create_posts(30)
+        self.assertEqual(self.changelist_queries(), few)
+
+    def test_date_hierarchy_lists_years_from_archive(self):
+        old, new = self.create_posts(2)
+        Post.objects.filter(pk=old.pk).update(
+            pub_date=timezone.make_aware(datetime(2019, 5, 1))
+        )
+        archive.rebuild()
+        response = self.client.get(CHANGELIST)
+        self.assertContains(response, '?pub_date__year=2019')
+        self.assertContains(
+            response, f'?pub_date__year={new.pub_date.year}'
+        )
+
+    def test_move_to_group_updates_counters_and_archive(self):
+        posts = self.create_posts(3)
+        counters.group_posts_count(self.target)
+        self.client.post(CHANGELIST, {
+            'action': 'move_to_group',
+            'group': self.target.pk,
+            ACTION_CHECKBOX_NAME: [post.pk for post in posts[:2]],
+            'index': 0,
+        })
+        self.assertEqual(self.target.posts.count(), 2)
+        self.assertEqual(counters.group_posts_count(self.target), 2)
+        self.assertEqual(counters.group_posts_count(self.group), 1)
+        self.rollup()
+
+    def test_delete_posts_asks_and_removes_related_rows(self):
+        posts = self.create_posts(3)
+        Comment.objects.create(post=posts[0], author=self.author, text='Да')
+        data = {
+            'action': 'delete_posts',
+            ACTION_CHECKBOX_NAME: [posts[0].pk, posts[1].pk],
+            'index': 0,
+        }
+        response = self.client.post(CHANGELIST, data)
+        self.assertContains(response, 'Удалить записей: 2?')
+        self.assertEqual(Post.objects.count(), 3)
+        del data['index']
+        self.client.post(CHANGELIST, {**data, 'post': 'yes'})
+        self.assertEqual(list(Post.objects.all()), [posts[2]])
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(counters.all_posts_count(), 1)
+        self.assertEqual(
+            list(search.matching_posts(Post.objects.all(), 'Пост')),
+            [posts[2]]
+        )
+        self.rollup()
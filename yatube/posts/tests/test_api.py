@@ -0,0 +1,119 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='api_author')
+        cls.reader = User.objects.create_user(username='api_reader')
+        cls.group = Group.objects.create(
+            title='Группа API', slug='api_group', description='Описание'
+        )
+        for i in range(12):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост API {i}'
+            )
+        cls.post = Post.objects.order_by('pk').first()
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий API'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_return_compact_posts_with_cursor(self):
+        for url in (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_list', args=('api_group',)),
+            reverse('posts:api_profile', args=('api_author',)),
+        ):
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(len(data['results']), 10)
+                self.assertEqual(
+                    set(data['results'][0]),
+                    {'id', 'text', 'pub_date', 'author', 'group', 'image',
+                     'thumbnail'}
+                )
+                rest = self.client.get(url, {'cursor': data['next']}).json()
+                self.assertEqual(len(rest['results']), 2)
+                self.assertIsNone(rest['next'])
+
+    def test_post_detail_and_comments(self):
+        data = self.client.get(
+            reverse('posts:api_post_detail', args=(self.post.pk,))
+        ).json()
+        self.assertEqual(data['text'], self.post.text)
+        self.assertEqual(data['group'], 'api_group')
+        comments = self.client.get(
+            reverse('posts:api_post_comments', args=(self.post.pk,))
+        ).json()
+        self.assertEqual(comments['count'], 1)
+        self.assertEqual(comments['results'][0]['author'], 'api_reader')
+
+    def test_matching_etag_returns_304_without_feed_queries(self):
+        url = reverse('posts:api_index')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_if_modified_since_returns_304(self):
+        url = reverse('posts:api_profile', args=('api_author',))
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_etag_changes_with_content(self):
+        index = reverse('posts:api_index')
+        detail = reverse('posts:api_post_detail', args=(self.post.pk,))
+        before = [self.client.get(url)['ETag'] for url in (index, detail)]
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Ещё комментарий'
+        )
+        Post.objects.order_by('pk').last().delete()
+        after = [self.client.get(url)['ETag'] for url in (index, detail)]
+        self.assertNotEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+
+    def test_follow_feed_requires_login(self):
+        url = reverse('posts:api_follow_index')
+        self.assertEqual(
+            self.client.get(url).status_code, HTTPStatus.UNAUTHORIZED
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        data = self.client.get(url).json()
+        self.assertEqual(len(data['results']), 10)
+        self.assertEqual(data['results'][0]['author'], 'api_author')
+
+    def test_follow_feed_etag_follows_edits_and_follows(self):
+        url = reverse('posts:api_follow_index')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        first = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=first).status_code,
+            HTTPStatus.NOT_MODIFIED
+        )
+        post = Post.objects.order_by('-pk').first()
+        post.text = 'Исправленный текст'
+        post.save()
+        edited = self.client.get(url)['ETag']
+        self.assertNotEqual(first, edited)
+        Comment.objects.create(post=post, author=self.reader, text='Ого')
+        commented = self.client.get(url)['ETag']
+        self.assertNotEqual(edited, commented)
+        other = User.objects.create_user(username='api_other')
+        Follow.objects.create(user=self.reader, author=other)
+        self.assertNotEqual(commented, self.client.get(url)['ETag'])
@@ -0,0 +1,132 @@
+from datetime import datetime
+from http import HTTPStatus
+from io import StringIO
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from posts import archive, counters
+from posts.models import Group, Post, PostMonth
+from posts.templatetags.pagination import page_window
+
+User = get_user_model()
+
+
+def page(number, num_pages):
+    return SimpleNamespace(
+        number=number, paginator=SimpleNamespace(num_pages=num_pages)
+    )
+
+
+class PageWindowTests(TestCase):
+    def test_window_around_current_page(self):
+        self.assertEqual(
+            page_window(page(50, 20000)),
+            [1, None, 48, 49, 50, 51, 52, None, 20000]
+        )
+        self.assertEqual(page_window(page(2, 4)), [1, 2, 3, 4])
+        self.assertEqual(
+            page_window(page(1, 10)), [1, 2, 3, None, 10]
+        )
+
+    def test_paginator_keeps_query_and_skips_far_pages(self):
+        author = User.objects.create_user(username='many')
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост {i}') for i in range(120)
+        )
+        cache.clear()
+        response = self.client.get(
+            reverse('posts:index'), {'order': 'discussed', 'page': 6}
+        )
+        self.assertContains(response, '?order=discussed&amp;page=12')
+        self.assertContains(response, '?order=discussed&amp;page=8')
+        self.assertNotContains(response, 'page=9"')
+
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='archivist')
+        cls.group = Group.objects.create(
+            title='Летопись', slug='chronicle', description='Старое'
+        )
+        cls.old = Post.objects.create(
+            author=cls.author, group=cls.group, text='Январский пост'
+        )
+        cls.older = Post.objects.create(
+            author=cls.author, text='Декабрьский пост'
+        )
+        cls.new = Post.objects.create(author=cls.author, text='Свежий пост')
+        dates = {
+            cls.old: datetime(2020, 1, 15),
+            cls.older: datetime(2019, 12, 31, 23),
+        }
+        for post, pub_date in dates.items():
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=timezone.make_aware(pub_date)
+            )
+        archive.rebuild()
+
+    def setUp(self):
+        cache.clear()
+
+    def rows(self):
+        return set(PostMonth.objects.filter(posts_count__gt=0).values_list(
+            'scope', 'month', 'posts_count'
+        ))
+
+    def test_signals_keep_rollup_in_sync_with_rebuild(self):
+        post = Post.objects.create(author=self.author, text='Ещё пост')
+        post.group = self.group
+        post.save()
+        self.new.delete()
+        expected = self.rows()
+        call_command('rebuild_archive', stdout=StringIO())
+        self.assertEqual(self.rows(), expected)
+        month = archive.month_start(post.pub_date)
+        self.assertIn(
+            (counters.group_scope(self.group.pk), month, 1), expected
+        )
+
+    def test_month_page_shows_only_its_posts(self):
+        response = self.client.get(reverse('posts:archive', args=(2020, 1)))
+        self.assertEqual(list(response.context['page_obj']), [self.old])
+        self.assertEqual(response.context['older']['url'], reverse(
+            'posts:archive', args=(2019, 12)
+        ))
+        self.assertEqual(
+            [link['posts_count'] for link in response.context['months']],
+            [1, 1, 1]
+        )
+
+    def test_archive_defaults_to_latest_month(self):
+        response = self.client.get(reverse('posts:archive'))
+        self.assertEqual(list(response.context['page_obj']), [self.new])
+        self.assertIsNone(response.context['newer'])
+
+    def test_group_and_profile_archives(self):
+        group = self.client.get(
+            reverse('posts:group_archive', args=('chronicle', 2020, 1))
+        )
+        self.assertEqual(list(group.context['page_obj']), [self.old])
+        self.assertEqual(len(group.context['months']), 1)
+        profile = self.client.get(
+            reverse('posts:profile_archive', args=('archivist', 2019, 12))
+        )
+        self.assertEqual(list(profile.context['page_obj']), [self.older])
+
+    def test_unknown_month_is_404(self):
+        for year, month in ((2020, 13), (2020, 0), (0, 1), (9999, 12),
+                            (99999999999, 1), (2020, 99999999999)):
+            with self.subTest(year=year, month=month):
+                response = self.client.get(
+                    reverse('posts:archive', args=(year, month))
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_FOUND
+                )
@@ -0,0 +1,77 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from posts import urls
+from posts.models import Comment, FeedEntry, Follow, Post, PostImageVariant
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkCommandsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self):
+        call_command(
+            'seed_posts', users=5, groups=2, posts=30, comments=40,
+            follows=2, images=1, stdout=StringIO()
+        )
+
+    def test_seed_creates_data_through_models(self):
+        self.seed()
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(
+            PostImageVariant.objects.values('post').distinct().count(), 1
+        )
+        self.assertTrue(FeedEntry.objects.exists())
+        self.assertGreater(
+            len(set(Post.objects.values_list('pub_date', flat=True))), 1
+        )
+
+    def test_bench_writes_report_for_every_url(self):
+        self.seed()
+        before = (Comment.objects.count(), Follow.objects.count())
+        output = os.path.join(TEMP_MEDIA_ROOT, 'bench.json')
+        call_command(
+            'bench_views', requests=3, concurrency=1, warmup=0,
+            output=output, stdout=StringIO(), stderr=StringIO()
+        )
+        with open(output, encoding='utf-8') as file:
+            report = json.load(file)
+        self.assertEqual(report['meta']['data']['posts'], 30)
+        for name in ('posts:index', 'posts:group_list', 'posts:profile',
+                     'posts:post_detail', 'posts:post_create', 'posts:edit',
+                     'posts:add_comment', 'posts:follow_index',
+                     'posts:profile_follow', 'posts:profile_unfollow',
+                     'posts:archive', 'posts:archive month',
+                     'posts:group_archive', 'posts:group_archive month',
+                     'posts:profile_archive', 'posts:profile_archive month',
+                     'posts:feed_profile'):
+            with self.subTest(name=name):
+                result = report['views'][name]
+                self.assertEqual(result['requests'], 3)
+                self.assertEqual(
+                    set(result['latency_ms']),
+                    {'p50', 'p95', 'p99', 'mean', 'max'}
+                )
+                self.assertNotIn('500', result['status'])
+                if 'archive' in name or 'feed' in name:
+                    self.assertEqual(result['status'], {'200': 3})
+        # Замер покрывает все маршруты posts/urls.py.
+        self.assertEqual(
+            {name.split()[0] for name in report['views']},
+            {f'posts:{pattern.name}' for pattern in urls.urlpatterns}
+        )
+        self.assertEqual(
+            (Comment.objects.count(), Follow.objects.count()), before
+        )
+        self.assertEqual(report['views']['posts:index']['status'], {'200': 3})
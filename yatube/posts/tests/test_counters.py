@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts import counters
+from posts.bulk import delete_posts
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class PostCountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='count_author')
+        cls.group = Group.objects.create(
+            title='Группа для счётчиков',
+            slug='count_slug',
+            description='Тестовое описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other_count_slug',
+            description='Тестовое описание'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.author, text='Первый пост', group=self.group
+        )
+
+    def test_counters_follow_create_and_delete(self):
+        self.assertEqual(counters.all_posts_count(), 1)
+        self.assertEqual(counters.author_posts_count(self.author), 1)
+        self.assertEqual(counters.group_posts_count(self.group), 1)
+        second = Post.objects.create(
+            author=self.author, text='Второй пост', group=self.group
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(counters.all_posts_count(), 2)
+            self.assertEqual(counters.author_posts_count(self.author), 2)
+            self.assertEqual(counters.group_posts_count(self.group), 2)
+        second.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(counters.all_posts_count(), 1)
+            self.assertEqual(counters.group_posts_count(self.group), 1)
+
+    def test_deleted_posts_drop_follow_count(self):
+        follower = User.objects.create_user(username='count_follower')
+        Follow.objects.create(user=follower, author=self.author)
+        Post.objects.create(author=self.author, text='Второй пост')
+        self.assertEqual(counters.follow_posts_count(follower), 2)
+        self.post.delete()
+        self.assertEqual(counters.follow_posts_count(follower), 1)
+        delete_posts(Post.objects.filter(author=self.author))
+        self.assertEqual(counters.follow_posts_count(follower), 0)
+
+    def test_group_change_moves_count(self):
+        counters.group_posts_count(self.group)
+        counters.group_posts_count(self.other_group)
+        self.post.group = self.other_group
+        self.post.save()
+        self.assertEqual(counters.group_posts_count(self.group), 0)
+        self.assertEqual(counters.group_posts_count(self.other_group), 1)
+
+    def test_pages_take_total_from_counter(self):
+        """Профиль и пост берут «Всего постов» из счётчика."""
+        urls = (
+            reverse('posts:profile', kwargs={'username': 'count_author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+        counters.author_posts_count(self.author)
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as context:
+                    response = Client().get(url)
+                self.assertContains(response, 'Всего постов')
+                self.assertFalse(any(
+                    query['sql'].startswith('SELECT COUNT(*)')
+                    and 'FROM "posts_post"' in query['sql']
+                    for query in context.captured_queries
+                ))
@@ -0,0 +1,121 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from posts import feed
+from posts.models import FeedEntry, Follow, Post
+
+User = get_user_model()
+
+
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.other_author = User.objects.create_user(username='other_writer')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def feed_texts(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self.feed_texts(), ['Новый пост'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        Post.objects.create(author=self.author, text='Старый пост')
+        Post.objects.create(author=self.other_author, text='Чужой пост')
+        self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'writer'})
+        )
+        self.assertEqual(self.feed_texts(), ['Старый пост'])
+        self.client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'writer'})
+        )
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed_texts(), [])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_heavy_author_is_merged_on_read(self):
+        second_reader = User.objects.create_user(username='second_reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=second_reader, author=self.author)
+        cache.clear()
+        Post.objects.create(author=self.author, text='Пост популярного')
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertIn(self.author.pk, feed.heavy_author_ids())
+        self.assertEqual(self.feed_texts(), ['Пост популярного'])
+
+    def test_feed_query_count_does_not_depend_on_follows(self):
+        authors = [
+            User.objects.create_user(username=f'followed_{i}')
+            for i in range(5)
+        ]
+        Follow.objects.create(user=self.reader, author=authors[0])
+        Post.objects.create(author=authors[0], text='Пост')
+        feed.heavy_author_ids()
+        with self.assertNumQueries(1):
+            list(feed.follow_feed(self.reader))
+        for author in authors[1:]:
+            Follow.objects.create(user=self.reader, author=author)
+        with self.assertNumQueries(1):
+            list(feed.follow_feed(self.reader))
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_pages_merge_entries_and_heavy_authors_in_order(self):
+        second_reader = User.objects.create_user(username='second_reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=second_reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.other_author)
+        cache.clear()
+        for i in range(13):
+            author = self.author if i % 2 else self.other_author
+            Post.objects.create(author=author, text=f'Пост {i}')
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'text', flat=True
+            )
+        )
+        posts = feed.follow_feed(self.reader)
+        self.assertEqual(posts.count(), 13)
+        self.assertEqual([post.text for post in posts[10:13]], expected[10:])
+        url = reverse('posts:api_follow_index')
+        data = self.client.get(url).json()
+        texts = [post['text'] for post in data['results']]
+        data = self.client.get(url, {'cursor': data['next']}).json()
+        texts += [post['text'] for post in data['results']]
+        self.assertIsNone(data['next'])
+        self.assertEqual(texts, expected)
+        back = self.client.get(url, {'cursor': data['previous']}).json()
+        self.assertEqual(
+            [post['text'] for post in back['results']], expected[:10]
+        )
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_unfollow_defers_refill_of_former_heavy_author(self):
+        second_reader = User.objects.create_user(username='second_reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=second_reader, author=self.author)
+        cache.clear()
+        Post.objects.create(author=self.author, text='Пост популярного')
+        feed.heavy_author_ids()
+        Follow.objects.filter(user=second_reader).delete()
+        # Раскладка ждёт коммита, а пока посты подмешиваются при чтении.
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertIn(self.author.pk, feed.heavy_author_ids())
+        self.assertEqual(self.feed_texts(), ['Пост популярного'])
+        feed.refill(self.author.pk)
+        self.assertTrue(FeedEntry.objects.filter(user=self.reader).exists())
+        cache.delete(feed.HEAVY_AUTHORS_KEY)
+        self.assertNotIn(self.author.pk, feed.heavy_author_ids())
+        self.assertEqual(self.feed_texts(), ['Пост популярного'])
@@ -0,0 +1,126 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from posts import images
+from posts.models import Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+ORIENTATION = 0x0112
+MAKE = 0x010F
+
+
+def upload(name, size, image_format, mode='RGB', rotate=False):
+    image = Image.new(mode, size, 'red')
+    options = {}
+    if rotate:
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        options['exif'] = exif.tobytes()
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_IMAGE_MAX_EDGE=500)
+class ImageNormalizationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def create(self, image):
+        self.client.post(
+            reverse('posts:post_create'), {'text': 'Снимок', 'image': image}
+        )
+        return Post.objects.get()
+
+    def test_upload_is_downscaled_rotated_and_stripped(self):
+        post = self.create(
+            upload('camera.jpeg', (3000, 1000), 'JPEG', rotate=True)
+        )
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.assertEqual((post.image_width, post.image_height), (167, 500))
+        with post.image.open() as file:
+            stored = Image.open(file)
+            self.assertEqual(stored.size, (167, 500))
+            self.assertNotIn('exif', stored.info)
+
+    def test_transparent_image_stays_png(self):
+        post = self.create(
+            upload('logo.png', (40, 20), 'PNG', mode='RGBA')
+        )
+        self.assertTrue(post.image.name.endswith('.png'))
+        self.assertEqual((post.image_width, post.image_height), (40, 20))
+
+    def test_transparent_png_loses_exif(self):
+        exif = Image.Exif()
+        exif[MAKE] = 'CanonSecret'
+        buffer = BytesIO()
+        Image.new('RGBA', (40, 20), 'red').save(
+            buffer, 'PNG', exif=exif.tobytes()
+        )
+        post = self.create(SimpleUploadedFile('logo.png', buffer.getvalue()))
+        self.assertTrue(post.image.name.endswith('.png'))
+        with post.image.open() as file:
+            self.assertEqual(dict(Image.open(file).getexif()), {})
+
+    @skipUnless(images.can_encode('WEBP'), 'Pillow собран без libwebp')
+    @override_settings(POSTS_IMAGE_FORMAT='WEBP')
+    def test_webp_output(self):
+        post = self.create(upload('photo.jpg', (100, 80), 'JPEG'))
+        self.assertTrue(post.image.name.endswith('.webp'))
+
+    @override_settings(POSTS_IMAGE_FORMAT='AVIF')
+    def test_format_without_encoder_falls_back_to_jpeg(self):
+        with mock.patch.object(images, 'can_encode', return_value=False):
+            post = self.create(upload('photo.jpg', (100, 80), 'JPEG'))
+        self.assertTrue(post.image.name.endswith('.jpg'))
+
+    def test_16_bit_png_keeps_its_shade(self):
+        buffer = BytesIO()
+        Image.new('I', (40, 20), 30000).save(buffer, 'PNG')
+        post = self.create(SimpleUploadedFile('scan.png', buffer.getvalue()))
+        with post.image.open() as file:
+            red, green, blue = Image.open(file).getpixel((20, 10))
+        # 30000 из 65535 - примерно 117 из 255, а не белый.
+        self.assertLess(abs(red - 117), 3)
+        self.assertEqual(red, green)
+
+    def test_loading_post_does_not_open_image(self):
+        post = Post.objects.create(
+            author=self.user, text='Старый пост', image='posts/missing.jpg'
+        )
+        post = Post.objects.get(pk=post.pk)
+        self.assertIsNone(post.image_width)
+        self.assertEqual(images.fill_dimensions(), 0)
+
+    def test_fill_dimensions_reads_existing_files(self):
+        post = Post.objects.create(author=self.user, text='Импорт')
+        name = default_storage.save(
+            'posts/imported.png', upload('imported.png', (30, 10), 'PNG')
+        )
+        Post.objects.filter(pk=post.pk).update(image=name)
+        self.assertEqual(images.fill_dimensions(), 1)
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (30, 10))
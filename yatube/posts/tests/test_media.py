@@ -0,0 +1,176 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from posts import media, thumbnails
+from posts.models import Post, PostImageVariant
+from posts.storage import is_hashed
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+
+def image_bytes(color='red'):
+    buffer = BytesIO()
+    Image.new('RGB', (64, 32), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_MEDIA_GRACE=0)
+class ContentAddressedMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reposter')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def upload(self, name):
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Вирусная картинка',
+            'image': SimpleUploadedFile(name, image_bytes()),
+        })
+        return Post.objects.latest('pk')
+
+    def test_same_image_is_stored_once_and_shares_thumbnails(self):
+        first = self.upload('cat.png')
+        thumbnails.build(first)
+        second = self.upload('same_cat.png')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(is_hashed(first.image.name))
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(len(os.listdir(directory)), 1)
+        self.assertEqual(
+            PostImageVariant.objects.get(post=second, size='960x339').image,
+            PostImageVariant.objects.get(post=first, size='960x339').image
+        )
+
+    def test_file_is_deleted_with_last_reference(self):
+        first = self.upload('cat.png')
+        thumbnails.build(first)
+        second = self.upload('cat.png')
+        name = first.image.name
+        thumb = PostImageVariant.objects.get(
+            post=first, size='960x339'
+        ).image.name
+        first.delete()
+        self.assertEqual(media.delete_orphans([name]), [])
+        self.assertTrue(default_storage.exists(thumb))
+        second.delete()
+        self.assertEqual(media.delete_orphans([name]), [name])
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(thumb))
+
+    def test_gc_media_removes_only_orphans(self):
+        post = self.upload('cat.png')
+        orphan = default_storage.save('posts/lost.png', ContentFile(b'x'))
+        out = StringIO()
+        call_command('gc_media', dry_run=True, stdout=out)
+        self.assertIn(orphan, out.getvalue())
+        self.assertTrue(default_storage.exists(orphan))
+        call_command('gc_media', stdout=StringIO())
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(post.image.name))
+
+    def test_dedupe_media_merges_legacy_files(self):
+        names = [
+            default_storage.save(f'posts/{name}.png',
+                                 ContentFile(image_bytes()))
+            for name in ('a', 'b')
+        ]
+        posts = [
+            Post.objects.create(author=self.user, text=name, image=name)
+            for name in names
+        ]
+        PostImageVariant.objects.create(
+            post=posts[0], size='960x339', source=names[0],
+            image='posts/thumbs/a_960x339.jpg', width=960, height=339
+        )
+        call_command('dedupe_media', stdout=StringIO())
+        images = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(images), 1)
+        new_name = images.pop()
+        self.assertTrue(is_hashed(new_name))
+        self.assertEqual(
+            PostImageVariant.objects.get().source, new_name
+        )
+        for name in names:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_dedupe_media_shares_thumbnails(self):
+        posts = []
+        for name in ('a', 'b'):
+            image = default_storage.save(
+                f'posts/{name}.png', ContentFile(image_bytes())
+            )
+            post = Post.objects.create(
+                author=self.user, text=name, image=image, image_width=64
+            )
+            thumbnails.build(post)
+            posts.append(post)
+        call_command('dedupe_media', stdout=StringIO())
+        first, second = (
+            set(PostImageVariant.objects.filter(post=post).values_list(
+                'size', 'format', 'image'
+            ))
+            for post in posts
+        )
+        self.assertEqual(first, second)
+        for _, _, name in first:
+            self.assertTrue(default_storage.exists(name))
+
+    def test_saving_file_removed_by_gc_writes_it_again(self):
+        files = media.storage()
+        name = files.save('posts/cat.png', ContentFile(b'cat'))
+        exists = files.exists
+
+        def removed_after_check(checked):
+            # Файл был на месте при проверке и пропал до os.utime.
+            if checked == name and os.path.exists(files.path(name)):
+                os.remove(files.path(name))
+                return True
+            return exists(checked)
+
+        with mock.patch.object(files, 'exists', removed_after_check):
+            saved = files.save('posts/cat.png', ContentFile(b'cat'))
+        self.assertEqual(saved, name)
+        self.assertTrue(os.path.exists(files.path(name)))
+
+    def test_file_taken_during_gc_is_kept(self):
+        name = default_storage.save('posts/cat.png', ContentFile(b'cat'))
+        real = media.referenced
+        calls = []
+
+        def referenced(names):
+            # Пост сослался на файл после первой проверки.
+            calls.append(names)
+            if len(calls) == 1:
+                return set()
+            Post.objects.create(author=self.user, text='Успел', image=name)
+            return real(names)
+
+        with mock.patch.object(media, 'referenced', referenced):
+            self.assertEqual(media.delete_orphans([name]), [])
+        self.assertTrue(default_storage.exists(name))
+        self.assertFalse(os.path.exists(
+            default_storage.path(name) + media.QUARANTINE_SUFFIX
+        ))
@@ -1,5 +1,9 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import IntegrityError
 from django.test import TestCase
-from ..models import Group, Post
+from ..models import Follow, Group, Post
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -31,3 +35,25 @@ class PostModelTests(TestCase):
         group = PostModelTests.group
         expected_object_name = group.title
         self.assertEqual(expected_object_name, str(group))
+
+
+class FollowModelTests(TestCase):
+    def test_follow_is_unique(self):
+        user = User.objects.create_user(username='follower_name')
+        author = User.objects.create_user(username='author_name')
+        Follow.objects.create(user=user, author=author)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=user, author=author)
+
+
+class ExplainViewsCommandTests(TestCase):
+    def test_command_prints_plan_for_every_view(self):
+        author = User.objects.create_user(username='explained')
+        Post.objects.create(author=author, text='Пост для плана')
+        out = StringIO()
+        call_command('explain_views', stdout=out)
+        for name in ('posts:index', 'posts:group_list', 'posts:profile',
+                     'posts:follow_index', 'posts:post_detail'):
+            with self.subTest(name=name):
+                self.assertIn(name, out.getvalue())
+        self.assertIn('post_author_pub_date_idx', out.getvalue())
@@ -0,0 +1,198 @@
+import base64
+from importlib import import_module
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts import paginators, search
+from posts.models import Comment, Post
+from posts.stemmer import stem, terms
+
+User = get_user_model()
+
+
+class StemmerTests(TestCase):
+    def test_word_forms_share_stem(self):
+        for forms in (
+            ('котик', 'котики', 'котиков', 'котиками'),
+            ('книга', 'книги', 'книгу', 'книгой'),
+            ('программист', 'программисты', 'программиста'),
+        ):
+            with self.subTest(forms=forms):
+                self.assertEqual(len({stem(word) for word in forms}), 1)
+
+    def test_terms_skip_stop_words_and_normalize_yo(self):
+        self.assertEqual(terms('Ёжик и Python'), ['ежик', 'python'])
+
+    def test_migration_copy_matches_stemmer(self):
+        """Миграция индекса разбирает текст так же, как поиск."""
+        migration = import_module(
+            'posts.migrations.0020_search_comment_documents'
+        )
+        text = 'Котиками и программистами; читающие книгой, Ёжики!'
+        self.assertEqual(migration.terms(text), terms(text))
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='searcher')
+
+    def create_post(self, text):
+        return Post.objects.create(author=self.author, text=text)
+
+    def found(self, query, cursor=None):
+        params = {'q': query}
+        if cursor:
+            params['cursor'] = cursor
+        response = self.client.get(reverse('posts:search'), params)
+        return response.context['page_obj']
+
+    def test_finds_other_word_forms(self):
+        post = self.create_post('Мои котики спят на диване')
+        self.create_post('Про собак')
+        self.assertEqual([p.pk for p in self.found('котиками')], [post.pk])
+
+    def test_all_words_are_required(self):
+        post = self.create_post('Рыжий кот и серый кот')
+        self.create_post('Рыжая лиса')
+        self.assertEqual([p.pk for p in self.found('рыжий кот')], [post.pk])
+
+    def test_post_text_ranks_above_comments(self):
+        commented = self.create_post('Обычный пост без слова')
+        Comment.objects.create(
+            post=commented, author=self.author, text='Тут есть жираф'
+        )
+        titled = self.create_post('Жираф гуляет по саванне')
+        self.assertEqual(
+            [p.pk for p in self.found('жирафы')], [titled.pk, commented.pk]
+        )
+
+    def test_index_follows_edits_and_deletes(self):
+        post = self.create_post('Старое слово')
+        post.text = 'Новое содержание'
+        post.save()
+        self.assertEqual(len(self.found('старое')), 0)
+        self.assertEqual(len(self.found('содержание')), 1)
+        post.delete()
+        self.assertEqual(len(self.found('содержание')), 0)
+
+    def test_words_may_come_from_text_and_comments(self):
+        post = self.create_post('Рыжий кот')
+        Comment.objects.create(post=post, author=self.author, text='Лиса')
+        self.create_post('Рыжая лиса')
+        self.assertEqual(len(self.found('кот лиса')), 1)
+
+    def test_comment_write_does_not_depend_on_thread_size(self):
+        post = self.create_post('Обсуждение')
+
+        def comment_queries():
+            comment = Comment(post=post, author=self.author, text='Мнение')
+            with CaptureQueriesContext(connection) as context:
+                comment.save()
+                comment.text = 'Другое мнение'
+                comment.save()
+                comment.delete()
+            return len(context)
+
+        few = comment_queries()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.author, text=f'Мнение {i}')
+            for i in range(20)
+        )
+        self.assertEqual(comment_queries(), few)
+
+    def test_comment_edits_and_deletes_update_index(self):
+        post = self.create_post('Обсуждение')
+        comment = Comment.objects.create(
+            post=post, author=self.author, text='Бегемот'
+        )
+        comment.text = 'Носорог'
+        comment.save()
+        self.assertEqual(len(self.found('бегемот')), 0)
+        self.assertEqual(len(self.found('носорог')), 1)
+        comment.delete()
+        self.assertEqual(len(self.found('носорог')), 0)
+
+    def test_deleting_post_removes_its_comments(self):
+        post = self.create_post('Пост')
+        for _ in range(3):
+            Comment.objects.create(
+                post=post, author=self.author, text='Крокодил'
+            )
+        other = self.create_post('Другой крокодил')
+        small = self.create_post('Пост')
+        Comment.objects.create(post=small, author=self.author, text='Ёж')
+        with CaptureQueriesContext(connection) as few:
+            small.delete()
+        with CaptureQueriesContext(connection) as many:
+            post.delete()
+        # Каскадные комментарии не переиндексируются по одному.
+        self.assertEqual(len(many), len(few))
+        self.assertEqual([p.pk for p in self.found('крокодил')], [other.pk])
+
+    def test_cursor_walks_all_results_once(self):
+        for i in range(23):
+            self.create_post('Облако ' * (i % 4 + 1) + f'номер {i}')
+        seen = []
+        page = self.found('облако')
+        while True:
+            seen += [post.pk for post in page]
+            if not page.has_next():
+                break
+            page = self.found('облако', page.next_cursor)
+        self.assertEqual(len(seen), 23)
+        self.assertEqual(len(set(seen)), 23)
+        back = self.found('облако', page.previous_cursor)
+        self.assertEqual(len(back), 10)
+        self.assertTrue(back.has_next())
+
+    def test_broken_cursor_returns_first_page(self):
+        post = self.create_post('Облако')
+        cursors = (
+            paginators.encode_token({'s': 1.0, 'i': 10 ** 30}),
+            paginators.encode_token({'s': 1.0, 'i': 0}),
+            base64.urlsafe_b64encode(b'{"s":1e999,"i":1}').decode(),
+            base64.urlsafe_b64encode(b'{"s":1.0,"i":1e999}').decode(),
+        )
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                page = self.found('облако', cursor)
+                self.assertEqual([p.pk for p in page], [post.pk])
+                self.assertFalse(page.has_previous())
+
+    def test_empty_query_returns_nothing(self):
+        self.create_post('Что-нибудь')
+        with self.assertNumQueries(0):
+            paginator = search.SearchPaginator('  и ', 10, Post.objects.all())
+            page = paginator.get_page(None)
+        self.assertEqual(len(page), 0)
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        post = self.create_post('Редкое слово абракадабра')
+        self.create_post('Совсем другое')
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'абракадабры'}
+        )
+        self.assertEqual(
+            [p.pk for p in response.context['cl'].result_list], [post.pk]
+        )
+
+
+@override_settings(POSTS_SEARCH_BACKEND='table')
+class TermTableSearchTests(SearchTests):
+    """Те же проверки для индекса без FTS5."""
+
+    def test_terms_are_stored_in_table(self):
+        post = self.create_post('Котики котики собака')
+        self.assertEqual(
+            dict(post.search_terms.values_list('term', 'weight')),
+            {'котик': 2 * search.TEXT_WEIGHT, 'собак': search.TEXT_WEIGHT}
+        )
@@ -0,0 +1,117 @@
+from http import HTTPStatus
+from xml.etree import ElementTree
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from posts.models import Group, Post
+
+User = get_user_model()
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+
+@override_settings(POSTS_FEED_ITEMS=5)
+class SyndicationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='feeder', first_name='Анна', last_name='Ахматова'
+        )
+        cls.other = User.objects.create_user(username='other_feeder')
+        cls.group = Group.objects.create(
+            title='Стихи', slug='poems', description='Только стихи'
+        )
+        for i in range(7):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Стих номер {i}'
+            )
+        Post.objects.create(author=cls.other, text='Пост без группы')
+
+    def setUp(self):
+        cache.clear()
+
+    def atom_titles(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.streaming)
+        root = ElementTree.fromstring(b''.join(response.streaming_content))
+        return [entry.find(f'{ATOM}title').text
+                for entry in root.iter(f'{ATOM}entry')]
+
+    def test_atom_feeds_for_index_group_and_author(self):
+        self.assertEqual(
+            self.atom_titles(reverse('posts:feed_index', args=('atom',))),
+            ['Пост без группы'] + [f'Стих номер {i}' for i in (6, 5, 4, 3)]
+        )
+        group_url = reverse('posts:feed_group_list', args=('poems', 'atom'))
+        self.assertEqual(len(self.atom_titles(group_url)), 5)
+        profile_url = reverse(
+            'posts:feed_profile', args=('other_feeder', 'atom')
+        )
+        self.assertEqual(self.atom_titles(profile_url), ['Пост без группы'])
+
+    def test_rss_feed(self):
+        response = self.client.get(reverse('posts:feed_index', args=('rss',)))
+        self.assertEqual(
+            response['Content-Type'], 'application/rss+xml; charset=utf-8'
+        )
+        root = ElementTree.fromstring(b''.join(response.streaming_content))
+        self.assertEqual(len(root.findall('channel/item')), 5)
+        self.assertEqual(
+            root.find('channel/item/link').text,
+            'http://testserver' + reverse(
+                'posts:post_detail', args=(Post.objects.latest('pk').pk,)
+            )
+        )
+
+    def test_posts_are_read_while_streaming(self):
+        url = reverse('posts:feed_index', args=('atom',))
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        with self.assertNumQueries(1):
+            content = b''.join(response.streaming_content)
+        self.assertIn('Пост без группы'.encode(), content)
+
+    def test_cached_feed_keeps_requested_host(self):
+        url = reverse('posts:feed_index', args=('rss',))
+        for host in ('localhost', '127.0.0.1'):
+            response = self.client.get(url, HTTP_HOST=host)
+            root = ElementTree.fromstring(b''.join(response.streaming_content))
+            with self.subTest(host=host):
+                self.assertTrue(
+                    root.find('channel/item/link').text.startswith(
+                        f'http://{host}/'
+                    )
+                )
+
+    def test_unknown_format_returns_404(self):
+        response = self.client.get(reverse('posts:feed_index', args=('xml',)))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_rendered_feed_is_cached_until_new_post(self):
+        url = reverse('posts:feed_group_list', args=('poems', 'atom'))
+        first = self.atom_titles(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertFalse(response.streaming)
+        Post.objects.create(
+            author=self.author, group=self.group, text='Новый стих'
+        )
+        self.assertEqual(self.atom_titles(url), ['Новый стих'] + first[:4])
+
+    def test_conditional_get_returns_304(self):
+        url = reverse('posts:feed_profile', args=('feeder', 'rss'))
+        response = self.client.get(url)
+        b''.join(response.streaming_content)
+        with self.assertNumQueries(0):
+            repeated = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(repeated.status_code, HTTPStatus.NOT_MODIFIED)
+        repeated = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(repeated.status_code, HTTPStatus.NOT_MODIFIED)
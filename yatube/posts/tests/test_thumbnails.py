@@ -0,0 +1,172 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.templatetags.static import static
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from posts import thumbnails
+from posts.models import Post, PostImageVariant
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+
+def make_image(name='photo.png', size=(1200, 600)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color=(200, 30, 30)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POSTS_THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.author, text='Пост с фото', image=make_image()
+        )
+
+    def render_url(self, post):
+        return Template(
+            '{% load post_images %}{% post_thumbnail_url post 960 339 %}'
+        ).render(Context({'post': post}))
+
+    def test_build_stores_cropped_variant(self):
+        thumbnails.build(self.post)
+        variant = PostImageVariant.objects.get(post=self.post, size='960x339')
+        self.assertEqual(variant.size, '960x339')
+        self.assertEqual(variant.source, self.post.image.name)
+        with default_storage.open(variant.image.name) as file:
+            self.assertEqual(Image.open(file).size, (960, 339))
+        self.assertEqual(self.render_url(self.post), variant.image.url)
+
+    def test_page_shows_placeholder_until_variant_is_ready(self):
+        with mock.patch.object(thumbnails, 'render') as render:
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, static(thumbnails.PLACEHOLDER))
+        render.assert_not_called()
+        self.assertFalse(PostImageVariant.objects.exists())
+
+    def test_variant_of_replaced_image_is_not_used(self):
+        thumbnails.build(self.post)
+        old = set(PostImageVariant.objects.values_list('pk', flat=True))
+        source = self.post.image.name
+        self.post.image = make_image('other.png', size=(800, 400))
+        self.post.save()
+        post = Post.objects.prefetch_related('image_variants').get(
+            pk=self.post.pk
+        )
+        self.assertEqual(self.render_url(post), static(thumbnails.PLACEHOLDER))
+        thumbnails.store(post.pk, source, thumbnails.render_all(
+            post.image.name
+        ))
+        self.assertEqual(
+            set(PostImageVariant.objects.values_list('pk', flat=True)), old
+        )
+
+    def test_worker_process_renders_variant(self):
+        with override_settings(POSTS_THUMBNAIL_WORKERS=1):
+            try:
+                rendered = thumbnails._pool().submit(
+                    thumbnails.render_all, self.post.image.name
+                ).result(timeout=60)
+            finally:
+                thumbnails._reset_pool()
+        thumbnails.store(self.post.pk, self.post.image.name, rendered)
+        self.assertIn('960x339', PostImageVariant.objects.filter(
+            post=self.post
+        ).values_list('size', flat=True))
+
+    def test_build_stores_responsive_widths(self):
+        thumbnails.build(self.post)
+        widths = PostImageVariant.objects.filter(
+            post=self.post, format='JPEG', size__startswith='w'
+        ).values_list('width', 'height')
+        self.assertEqual(
+            sorted(widths), [(320, 160), (640, 320), (960, 480)]
+        )
+
+    def test_modern_formats_only_with_codec(self):
+        with mock.patch.object(
+            thumbnails, 'variant_formats', return_value=['JPEG']
+        ):
+            thumbnails.build(self.post)
+        self.assertEqual(
+            set(PostImageVariant.objects.values_list('format', flat=True)),
+            {'JPEG'}
+        )
+
+    def test_picture_has_srcset_and_lazy_loading(self):
+        thumbnails.build(self.post)
+        post = Post.objects.prefetch_related('image_variants').get(
+            pk=self.post.pk
+        )
+        html = Template(
+            '{% load post_images %}{% post_picture post %}'
+        ).render(Context({'post': post}))
+        for variant in PostImageVariant.objects.filter(
+            post=post, format='JPEG', size__startswith='w'
+        ):
+            self.assertIn(f'{variant.image.url} {variant.width}w', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('width="960" height="480"', html)
+
+    def test_deleting_variant_removes_file(self):
+        thumbnails.build(self.post)
+        name = PostImageVariant.objects.get(
+            post=self.post, size='960x339'
+        ).image.name
+        self.post.delete()
+        self.assertFalse(default_storage.exists(name))
+
+    def test_upload_schedules_thumbnails(self):
+        self.client.force_login(self.author)
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            self.client.post(
+                reverse('posts:post_create'),
+                {'text': 'Новый пост', 'image': make_image('new.png')}
+            )
+        post = Post.objects.get(text='Новый пост')
+        schedule.assert_called_once_with(post)
+        self.assertTrue(post.image)
+
+    def test_same_file_reuses_only_complete_set(self):
+        thumbnails.build(self.post)
+        other = Post.objects.create(
+            author=self.author, text='Та же картинка',
+            image=self.post.image.name, image_width=self.post.image_width
+        )
+        self.assertTrue(thumbnails.reuse(other))
+        self.assertEqual(
+            set(other.image_variants.values_list('size', 'format')),
+            thumbnails.expected_variants(other.image_width)
+        )
+
+    def test_crop_without_responsive_widths_is_not_reused(self):
+        thumbnails.store(self.post.pk, self.post.image.name, [
+            variant for variant in thumbnails.render_all(self.post.image.name)
+            if not variant[0].startswith('w')
+        ])
+        other = Post.objects.create(
+            author=self.author, text='Та же картинка',
+            image=self.post.image.name, image_width=self.post.image_width
+        )
+        self.assertFalse(thumbnails.reuse(other))
@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from posts import search
+from posts.models import Comment, FeedEntry, Follow, Group, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TransferCommandsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.path = os.path.join(TEMP_MEDIA_ROOT, 'dump.jsonl')
+        author = User.objects.create_user(
+            username='writer', first_name='Лев', last_name='Толстой'
+        )
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Классика', slug='classic', description='Романы'
+        )
+        old = timezone.now() - timedelta(days=30)
+        for i in range(5):
+            post = Post.objects.create(
+                author=author, group=group, text=f'Пост номер {i} про войну'
+            )
+            Post.objects.filter(pk=post.pk).update(pub_date=old)
+        Comment.objects.create(
+            post=post, author=reader, text='Комментарий про мир'
+        )
+        Follow.objects.create(user=reader, author=author)
+
+    def export(self):
+        call_command('export_content', self.path, stdout=StringIO())
+        with open(self.path, encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_export_writes_records_in_dependency_order(self):
+        records = self.export()
+        types = [record['type'] for record in records]
+        self.assertEqual(
+            types, ['user'] * 2 + ['group'] + ['post'] * 5
+            + ['comment', 'follow']
+        )
+        self.assertEqual(records[5]['author'], 'writer')
+        self.assertEqual(records[5]['group'], 'classic')
+
+    def test_import_restores_content_and_derived_data(self):
+        self.export()
+        dates = set(Post.objects.values_list('pub_date', flat=True))
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        cache.clear()
+        call_command(
+            'import_content', self.path, chunk_size=2, stdout=StringIO()
+        )
+        self.assertEqual(Post.objects.count(), 5)
+        self.assertEqual(
+            set(Post.objects.values_list('pub_date', flat=True)), dates
+        )
+        author = User.objects.get(username='writer')
+        self.assertEqual(author.get_full_name(), 'Лев Толстой')
+        self.assertFalse(author.has_usable_password())
+        self.assertEqual(
+            Comment.objects.get().post, Post.objects.order_by('pk').last()
+        )
+        reader = User.objects.get(username='reader')
+        self.assertEqual(
+            FeedEntry.objects.filter(user=reader).count(), 5
+        )
+        self.assertEqual(
+            len(list(search.ranked(search.query_terms('мир'), 10))), 1
+        )
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 5)
+
+    def test_import_skips_existing_users_and_groups(self):
+        self.export()
+        out = StringIO()
+        call_command('import_content', self.path, stdout=out)
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Group.objects.count(), 1)
+        self.assertEqual(Post.objects.count(), 10)
+        self.assertIn('Пропущено записей', out.getvalue())
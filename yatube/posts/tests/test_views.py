@@ -1,14 +1,19 @@
+import base64
 import shutil
 import tempfile
+from http import HTTPStatus
 
 from django import forms
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase, override_settings
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
+from posts import consts, paginators, utils
 from posts.models import Group, Post, Comment, Follow
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -78,6 +83,7 @@ class PostsViewsTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.user = User.objects.create_user(username='Japrojah')
         self.authorized_client = Client()
@@ -175,23 +181,39 @@ class PostsViewsTests(TestCase):
         self.assertEqual(comment_object.text, self.comment.text)
 
     def test_cache_index(self):
-        """Проверка хранения и очищения кэша для index."""
-        Post.objects.create(
+        """Index отдаётся из кэша, пока посты не изменились."""
+        post = Post.objects.create(
             text='Пост для теста кэша',
             author=self.author,
         )
         cache.clear()
-        response = self.authorized_client.get(reverse('posts:index'))
+        response = self.guest_client.get(reverse('posts:index'))
         posts_list = response.content
-        post = Post.objects.get(text='Пост для теста кэша')
+        with self.assertNumQueries(0):
+            response_old = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(response_old.content, posts_list)
         post.delete()
-        response_old = self.authorized_client.get(reverse('posts:index'))
-        old_posts_list = response_old.content
-        self.assertEqual(old_posts_list, posts_list)
+        response_new = self.guest_client.get(reverse('posts:index'))
+        self.assertNotEqual(response_new.content, posts_list)
+        self.assertNotContains(response_new, 'Пост для теста кэша')
+
+    def test_cache_is_keyed_by_page_and_user(self):
+        cache.clear()
+        first = self.guest_client.get(reverse('posts:index'))
+        second = self.guest_client.get(reverse('posts:index'), {'page': 2})
+        self.assertIsNotNone(second.context)
+        authorized = self.authorized_client.get(reverse('posts:index'))
+        self.assertIsNotNone(authorized.context)
+        self.assertNotEqual(first.content, authorized.content)
+
+    def test_comment_invalidates_post_detail(self):
         cache.clear()
-        response_new = self.authorized_client.get(reverse('posts:index'))
-        new_posts_list = response_new.content
-        self.assertNotEqual(old_posts_list, new_posts_list)
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post2.id})
+        self.guest_client.get(url)
+        Comment.objects.create(
+            post=self.post2, author=self.user, text='Свежий коммент'
+        )
+        self.assertContains(self.guest_client.get(url), 'Свежий коммент')
 
 
 class PaginatorViewsTest(TestCase):
@@ -216,6 +238,7 @@ class PaginatorViewsTest(TestCase):
         Post.objects.bulk_create(cls.posts)
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
         self.user = User.objects.create_user(username='Japrojah')
         self.authorized_client = Client()
@@ -260,6 +283,209 @@ class PaginatorViewsTest(TestCase):
             )
 
 
+@override_settings(POSTS_CURSOR_PAGINATION=True)
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='cursor_author')
+        cls.group = Group.objects.create(
+            title='Группа для курсора',
+            slug='cursor_slug',
+            description='Тестовое описание')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author, group=cls.group)
+            for i in range(25)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def walk(self, url):
+        """Проходит ленту вперёд до конца, возвращает страницы."""
+        pages = []
+        cursor = ''
+        while True:
+            response = self.guest_client.get(url, {'cursor': cursor})
+            page_obj = response.context['page_obj']
+            pages.append(page_obj)
+            if not page_obj.has_next():
+                return pages
+            cursor = page_obj.next_cursor
+
+    def test_forward_walk_returns_every_post_once(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'cursor_slug'}),
+            reverse('posts:profile', kwargs={'username': 'cursor_author'}),
+        )
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk').values_list(
+                'pk', flat=True
+            )
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                pages = self.walk(url)
+                self.assertEqual([len(page) for page in pages], [10, 10, 5])
+                walked = [post.pk for page in pages for post in page]
+                self.assertEqual(walked, expected)
+
+    def test_backward_cursor_returns_previous_page(self):
+        pages = self.walk(reverse('posts:index'))
+        response = self.guest_client.get(
+            reverse('posts:index'), {'cursor': pages[2].previous_cursor}
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(
+            [post.pk for post in page_obj],
+            [post.pk for post in pages[1]]
+        )
+        self.assertTrue(page_obj.has_previous())
+        self.assertTrue(page_obj.has_next())
+
+    def test_page_is_fetched_without_count(self):
+        first = self.guest_client.get(reverse('posts:index'))
+        cursor = first.context['page_obj'].next_cursor
+        with self.assertNumQueries(1):
+            utils.make_paginator(
+                Post.objects.all(),
+                RequestFactory().get('/', {'cursor': cursor}),
+                10
+            )
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        date = '2020-01-01T00:00:00+00:00'
+        cursors = (
+            'не-курсор',
+            paginators.encode_token({'d': date, 'i': 10 ** 30}),
+            paginators.encode_token({'d': date, 'i': -1}),
+            # 1e999 в JSON - бесконечность.
+            base64.urlsafe_b64encode(
+                ('{"d":"%s","i":1e999}' % date).encode()
+            ).decode(),
+        )
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.guest_client.get(
+                    reverse('posts:index'), {'cursor': cursor}
+                )
+                page_obj = response.context['page_obj']
+                self.assertFalse(page_obj.has_previous())
+                self.assertEqual(len(page_obj), 10)
+
+
+class FeedQueriesTest(TestCase):
+    """Число запросов страницы ленты не зависит от числа постов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='feed_author', first_name='Имя', last_name='Фамилия'
+        )
+        cls.group = Group.objects.create(
+            title='Группа ленты',
+            slug='feed_slug',
+            description='Тестовое описание')
+        cls.follower = User.objects.create_user(username='feed_follower')
+        Follow.objects.create(user=cls.follower, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.follower)
+
+    def add_posts(self, amount):
+        for i in range(amount):
+            Post.objects.create(
+                text=f'Пост ленты {i}', author=self.author, group=self.group
+            )
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        return len(context.captured_queries)
+
+    def test_feed_pages_use_fixed_number_of_queries(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'feed_slug'}),
+            reverse('posts:profile', kwargs={'username': 'feed_author'}),
+            reverse('posts:follow_index'),
+        )
+        self.add_posts(1)
+        few = {url: self.count_queries(url) for url in urls}
+        self.add_posts(9)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), few[url])
+
+    def test_feed_queryset_loads_card_fields_in_two_queries(self):
+        self.add_posts(3)
+        with self.assertNumQueries(2):
+            for post in utils.feed_queryset():
+                (post.author.get_full_name(), post.author.username,
+                 post.group.slug, post.text, post.pub_date, post.image,
+                 list(post.image_variants.all()))
+
+
+class PostDetailQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='detail_author')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='Пост с обсуждением',
+            group=Group.objects.create(
+                title='Группа поста', slug='detail_slug'
+            )
+        )
+        cls.url = reverse('posts:post_detail', kwargs={'post_id': cls.post.id})
+
+    def setUp(self):
+        cache.clear()
+
+    def add_comments(self, amount):
+        for i in range(amount):
+            commenter = User.objects.create_user(
+                username=f'commenter_{Comment.objects.count()}'
+            )
+            Comment.objects.create(
+                post=self.post, author=commenter, text=f'Коммент {i}'
+            )
+
+    def count_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return len(context.captured_queries)
+
+    def test_missing_post_returns_404(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': 987654})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_comment_authors_do_not_add_queries(self):
+        self.add_comments(1)
+        few = self.count_queries()
+        self.add_comments(20)
+        self.assertEqual(self.count_queries(), few)
+
+    def test_comments_are_paginated(self):
+        self.add_comments(consts.QUANTITY_OF_COMMENTS + 3)
+        response = self.client.get(self.url)
+        self.assertEqual(
+            len(response.context['comments']), consts.QUANTITY_OF_COMMENTS
+        )
+        response = self.client.get(self.url, {'page': 2})
+        self.assertEqual(len(response.context['comments']), 3)
+
+
 class FollowTests(TestCase):
     def setUp(self):
         self.client_auth_follower = Client()
@@ -312,3 +538,106 @@ class FollowTests(TestCase):
         )
         self.assertNotContains(response,
                                'Тестовая запись для тестирования ленты')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='conditional')
+        cls.group = Group.objects.create(
+            title='Группа', slug='conditional_group', description='Описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая', slug='conditional_other', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост для 304'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_matching_etag_returns_304_from_cache_only(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.has_header('Last-Modified'))
+                with self.assertNumQueries(0):
+                    repeated = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(
+                    repeated.status_code, HTTPStatus.NOT_MODIFIED
+                )
+                repeated = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+                self.assertEqual(
+                    repeated.status_code, HTTPStatus.NOT_MODIFIED
+                )
+
+    def test_change_invalidates_only_affected_pages(self):
+        group_url = reverse('posts:group_list', args=(self.group.slug,))
+        other_url = reverse('posts:group_list', args=(self.other_group.slug,))
+        group_etag = self.client.get(group_url)['ETag']
+        other_etag = self.client.get(other_url)['ETag']
+        Post.objects.create(
+            author=self.author, group=self.group, text='Новый пост'
+        )
+        response = self.client.get(group_url, HTTP_IF_NONE_MATCH=group_etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'Новый пост')
+        response = self.client.get(other_url, HTTP_IF_NONE_MATCH=other_etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_etag_depends_on_page_and_user(self):
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        anonymous = self.client.get(url)['ETag']
+        self.client.force_login(self.author)
+        authorized = self.client.get(url)
+        self.assertNotEqual(authorized['ETag'], anonymous)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=anonymous)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        response = self.client.get(
+            url, HTTP_IF_NONE_MATCH=authorized['ETag']
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_group_rename_invalidates_pages_of_its_posts(self):
+        urls = (
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'conditional_renamed'
+        group.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertContains(
+                    response, reverse('posts:group_list', args=(
+                        'conditional_renamed',
+                    ))
+                )
+
+    def test_post_detail_follows_author_posts_count(self):
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        etag = self.client.get(url)['ETag']
+        Post.objects.create(author=self.author, text='Ещё один пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_unknown_query_params_share_cached_page(self):
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, {'utm_source': 'mail'})
+        self.assertEqual(response['ETag'], etag)
+        self.assertNotEqual(self.client.get(url, {'page': 2})['ETag'], etag)
@@ -0,0 +1,319 @@
+"""Нарезка картинок постов заранее, в отдельных процессах.
+
+Превью (`THUMBNAIL_SIZES`) и адаптивные копии для srcset
+(`RESPONSIVE_WIDTHS`, в JPEG и в тех из `MODERN_FORMATS`, что умеет
+Pillow) строятся один раз при загрузке картинки:
+`schedule` после коммита транзакции отдаёт работу в пул процессов
+(Pillow упирается в CPU, потоки тут не помогут), а готовые файлы
+записываются в `PostImageVariant`. Шаблоны берут готовый URL через
+`{% post_thumbnail_url %}` или `{% post_picture %}` и, пока превью нет,
+показывают заглушку - ни одна страница не ресайзит картинку сама
+и не обращается к файлам.
+
+С `POSTS_THUMBNAIL_WORKERS = 0` превью строятся в том же процессе
+сразу после коммита.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from core import perf
+
+from . import images, page_cache
+from .models import Post, PostImageVariant
+
+logger = logging.getLogger(__name__)
+
+# Размеры превью: ширина и высота, картинка обрезается по центру.
+THUMBNAIL_SIZES = ((960, 339),)
+# Ширины адаптивных копий: картинка уменьшается без обрезки.
+RESPONSIVE_WIDTHS = (320, 640, 960, 1920)
+# Форматы копий сверх JPEG в порядке предпочтения браузером.
+MODERN_FORMATS = ('AVIF', 'WEBP')
+ENCODER_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'WEBP': {'quality': 80, 'method': 4},
+    'AVIF': {'quality': 60},
+}
+PLACEHOLDER = 'img/placeholder.svg'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def size_name(width, height):
+    return f'{width}x{height}'
+
+
+def responsive_name(width):
+    return f'w{width}'
+
+
+def variant_formats():
+    """JPEG и современные форматы, для которых у Pillow есть кодек."""
+    return ['JPEG'] + [
+        image_format for image_format in MODERN_FORMATS
+        if images.can_encode(image_format)
+    ]
+
+
+def responsive_widths(width):
+    """Ширины копий не больше оригинала; у маленькой - её ширина."""
+    return [value for value in RESPONSIVE_WIDTHS if value <= width] or [width]
+
+
+def expected_variants(width):
+    """(размер, формат) всех копий картинки шириной `width`."""
+    variants = {(size_name(*size), 'JPEG') for size in THUMBNAIL_SIZES}
+    variants.update(
+        (responsive_name(value), image_format)
+        for value in responsive_widths(width)
+        for image_format in variant_formats()
+    )
+    return variants
+
+
+def encode(image, stem, size, image_format):
+    """Сохраняет копию: (размер, формат, имя файла, ширина, высота)."""
+    buffer = BytesIO()
+    image.save(buffer, image_format, **ENCODER_OPTIONS[image_format])
+    extension = images.FORMATS[image_format][0]
+    name = default_storage.save(
+        f'posts/thumbs/{stem}_{size}.{extension}',
+        ContentFile(buffer.getvalue())
+    )
+    return size, image_format, name, image.width, image.height
+
+
+def render(image, stem, width, height):
+    """Превью `width`x`height`, обрезанное по центру, в JPEG."""
+    image = ImageOps.fit(
+        image, (width, height), Image.LANCZOS, centering=(0.5, 0.5)
+    )
+    return encode(image, stem, size_name(width, height), 'JPEG')
+
+
+@perf.timed('thumbnail_ms')
+def render_all(source):
+    """Все превью и адаптивные копии картинки.
+
+    Выполняется в процессе пула: получает и возвращает только строки
+    и числа. Оригинал декодируется один раз, а каждая следующая
+    копия уменьшается из предыдущей, большей.
+    """
+    with default_storage.open(source) as file:
+        image = Image.open(file)
+        image = images.convert(ImageOps.exif_transpose(image), 'RGB')
+    stem = os.path.splitext(os.path.basename(source))[0]
+    rendered = [
+        render(image, stem, width, height)
+        for width, height in THUMBNAIL_SIZES
+    ]
+    formats = variant_formats()
+    resized = image
+    for width in sorted(responsive_widths(image.width), reverse=True):
+        height = max(1, round(resized.height * width / resized.width))
+        if width != resized.width:
+            resized = resized.resize((width, height), Image.LANCZOS)
+        for image_format in formats:
+            rendered.append(encode(
+                resized, stem, responsive_name(width), image_format
+            ))
+    return rendered
+
+
+def store(post_id, source, rendered):
+    """Записывает готовые превью, если картинка поста не сменилась."""
+    post = (
+        Post.objects.select_related('author', 'group')
+        .filter(pk=post_id, image=source)
+        .first()
+    )
+    if post is None:
+        names = [name for _, _, name, _, _ in rendered]
+        for name in set(names) - set(PostImageVariant.objects.filter(
+            image__in=names
+        ).values_list('image', flat=True)):
+            default_storage.delete(name)
+        return
+    with transaction.atomic():
+        PostImageVariant.objects.filter(post=post).delete()
+        PostImageVariant.objects.bulk_create(
+            PostImageVariant(
+                post=post,
+                size=size,
+                format=image_format,
+                source=source,
+                image=name,
+                width=width,
+                height=height,
+            )
+            for size, image_format, name, width, height in rendered
+        )
+    page_cache.invalidate(page_cache.post_page_scopes(post))
+
+
+def build(post):
+    """Строит превью поста в текущем процессе."""
+    if post.image:
+        store(post.pk, post.image.name, render_all(post.image.name))
+
+
+def reuse(post):
+    """Берёт готовые копии у другого поста с тем же файлом картинки.
+
+    С `posts.storage.ContentAddressedStorage` одинаковые картинки -
+    один файл, и нарезать его второй раз незачем. Подходят только
+    полные наборы (`expected_variants`): у поста, нарезанного до
+    адаптивных копий или без кодека WebP, их нет. Возвращает False,
+    если копировать не у кого.
+    """
+    if not post.image_width:
+        return False
+    expected = expected_variants(post.image_width)
+    candidates = {}
+    for variant in PostImageVariant.objects.filter(
+        source=post.image.name
+    ).exclude(post=post).order_by('post_id'):
+        candidates.setdefault(variant.post_id, []).append(variant)
+    for variants in candidates.values():
+        if {(v.size, v.format) for v in variants} >= expected:
+            store(post.pk, post.image.name, [
+                (variant.size, variant.format, variant.image.name,
+                 variant.width, variant.height)
+                for variant in variants
+            ])
+            return True
+    return False
+
+
+def schedule(post):
+    """Ставит нарезку картинки поста в очередь после коммита."""
+    if not post.image:
+        PostImageVariant.objects.filter(post=post).delete()
+        return
+    if reuse(post):
+        return
+    transaction.on_commit(partial(_submit, post.pk, post.image.name))
+
+
+def _submit(post_id, source):
+    if not settings.POSTS_THUMBNAIL_WORKERS:
+        _build_logged(post_id, source)
+        return
+    try:
+        future = _pool().submit(render_all, source)
+    except BrokenProcessPool:
+        _reset_pool()
+        future = _pool().submit(render_all, source)
+    future.add_done_callback(partial(_finish, post_id, source))
+
+
+def _build_logged(post_id, source):
+    try:
+        store(post_id, source, render_all(source))
+    except Exception:
+        logger.exception('Не удалось нарезать картинку %s', source)
+
+
+def _finish(post_id, source, future):
+    # Колбэк выполняется в служебном потоке пула, со своим
+    # соединением к базе - его нужно закрыть.
+    try:
+        store(post_id, source, future.result())
+    except Exception:
+        logger.exception('Не удалось нарезать картинку %s', source)
+    finally:
+        connections.close_all()
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.POSTS_THUMBNAIL_WORKERS,
+                initializer=_init_worker,
+            )
+        return _executor
+
+
+def _reset_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+        _executor = None
+
+
+@perf.timed('thumbnail_ms')
+def thumbnail_url(post, width, height):
+    """URL готового превью или None, если его ещё нет."""
+    if not post.image:
+        return None
+    size = size_name(width, height)
+    for variant in post.image_variants.all():
+        if variant.size == size and variant.source == post.image.name:
+            return variant.image.url
+    return None
+
+
+def picture(post):
+    """Данные для <picture> поста из его `image_variants` или None.
+
+    Читает только строки `PostImageVariant` (обычно уже из
+    `prefetch_related`): URL строится по имени файла без обращения
+    к хранилищу.
+    """
+    if not post.image:
+        return None
+    by_format = {}
+    for variant in post.image_variants.all():
+        if (variant.source == post.image.name
+                and variant.size.startswith('w')):
+            by_format.setdefault(variant.format, []).append(variant)
+    fallback = sorted(by_format.get('JPEG', ()), key=lambda v: v.width)
+    if not fallback:
+        return None
+
+    def srcset(variants):
+        return ', '.join(
+            f'{variant.image.url} {variant.width}w'
+            for variant in sorted(variants, key=lambda v: v.width)
+        )
+
+    largest = fallback[-1]
+    src = next(
+        (variant for variant in fallback
+         if variant.width >= THUMBNAIL_SIZES[0][0]),
+        largest
+    )
+    return {
+        'src': src.image.url,
+        'srcset': srcset(fallback),
+        'width': largest.width,
+        'height': largest.height,
+        'sources': [
+            {
+                'type': images.FORMATS[image_format][1],
+                'srcset': srcset(by_format[image_format]),
+            }
+            for image_format in MODERN_FORMATS
+            if image_format in by_format
+        ],
+    }
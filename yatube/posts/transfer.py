@@ -0,0 +1,345 @@
+"""Перенос контента между инсталляциями в формате JSON Lines.
+
+Каждая строка - одна запись с полем `type`: `user`, `group`, `post`,
+`comment` или `follow`. Экспорт пишет их в этом порядке, поэтому
+импорт проходит файл один раз: к моменту поста его автор и группа
+уже известны, к моменту комментария - пост.
+
+Авторы и группы ссылаются на username и slug, посты - на свой id
+в исходной базе (в новой базе id назначаются заново). Файлы картинок
+не переносятся, только их имена в хранилище.
+"""
+import json
+from contextlib import contextmanager
+from itertools import groupby, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from . import (activity, archive, counters, feed, images, page_cache,
+               search, thumbnails)
+from .models import Comment, Follow, Group, Post, User
+
+RECORD_TYPES = ('user', 'group', 'post', 'comment', 'follow')
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Экспорт.
+
+def export_records(chunk_size=2000):
+    """Записи всех таблиц по порядку; память не растёт с объёмом базы."""
+    users = User.objects.order_by('pk').values_list(
+        'username', 'first_name', 'last_name'
+    )
+    for username, first_name, last_name in users.iterator(chunk_size):
+        yield {'type': 'user', 'username': username,
+               'first_name': first_name, 'last_name': last_name}
+    groups = Group.objects.order_by('pk').values_list(
+        'slug', 'title', 'description'
+    )
+    for slug, title, description in groups.iterator(chunk_size):
+        yield {'type': 'group', 'slug': slug, 'title': title,
+               'description': description}
+    posts = Post.objects.order_by('pk').values_list(
+        'pk', 'text', 'pub_date', 'author__username', 'group__slug', 'image'
+    )
+    for pk, text, pub_date, author, group, image in posts.iterator(
+        chunk_size
+    ):
+        yield {'type': 'post', 'id': pk, 'text': text,
+               'pub_date': pub_date.isoformat(), 'author': author,
+               'group': group, 'image': image}
+    comments = Comment.objects.order_by('pk').values_list(
+        'post_id', 'author__username', 'text', 'created'
+    )
+    for post_id, author, text, created in comments.iterator(chunk_size):
+        yield {'type': 'comment', 'post': post_id, 'author': author,
+               'text': text, 'created': created.isoformat()}
+    follows = Follow.objects.order_by('pk').values_list(
+        'user__username', 'author__username'
+    )
+    for user, author in follows.iterator(chunk_size):
+        yield {'type': 'follow', 'user': user, 'author': author}
+
+
+def dump(records, file):
+    for record in records:
+        file.write(json.dumps(record, ensure_ascii=False))
+        file.write('\n')
+
+
+# Импорт.
+
+@contextmanager
+def original_dates():
+    """Отключает auto_now_add, чтобы сохранить даты из файла.
+
+    Меняет поля моделей на время импорта во всём процессе, поэтому
+    годится только для management-команд.
+    """
+    fields = (Post._meta.get_field('pub_date'),
+              Comment._meta.get_field('created'))
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Importer:
+    """Импорт пачками: одна транзакция и один `bulk_create` на пачку.
+
+    username -> id, slug -> id и старый id поста -> новый держатся
+    в словарях, так что ссылки разрешаются одним запросом на пачку,
+    а не запросом на запись. Сигналы при `bulk_create` не срабатывают,
+    поэтому ленты подписок, поисковый индекс, счётчики и кеш страниц
+    обновляет `finish`.
+    """
+
+    def __init__(self, chunk_size=1000, progress=None):
+        self.chunk_size = chunk_size
+        self.progress = progress or (lambda record_type, total: None)
+        self.user_ids = {}
+        self.group_ids = {}
+        self.post_ids = {}
+        self.created = dict.fromkeys(RECORD_TYPES, 0)
+        self.skipped = dict.fromkeys(RECORD_TYPES, 0)
+        self.authors = set()
+        self.group_slugs = set()
+        self.commented = set()
+        self.follows = set()
+        self.with_images = []
+
+    def load(self, lines):
+        records = (json.loads(line) for line in lines if line.strip())
+        with original_dates():
+            for record_type, group in groupby(
+                records, key=lambda record: record.get('type')
+            ):
+                handler = getattr(self, f'import_{record_type}s', None)
+                if record_type not in RECORD_TYPES or handler is None:
+                    raise ValueError(f'Неизвестный тип записи: {record_type}')
+                for chunk in chunked(group, self.chunk_size):
+                    with transaction.atomic():
+                        handler(chunk)
+                    self.progress(record_type, self.created[record_type])
+
+    # Разрешение ссылок.
+
+    def resolve_users(self, usernames):
+        missing = set(usernames) - set(self.user_ids) - {None}
+        if missing:
+            self.user_ids.update(
+                User.objects.filter(username__in=missing)
+                .values_list('username', 'pk')
+            )
+        return self.user_ids
+
+    def resolve_groups(self, slugs):
+        missing = set(slugs) - set(self.group_ids) - {None}
+        if missing:
+            self.group_ids.update(
+                Group.objects.filter(slug__in=missing)
+                .values_list('slug', 'pk')
+            )
+        return self.group_ids
+
+    # Обработчики пачек.
+
+    def import_users(self, records):
+        known = self.resolve_users(record['username'] for record in records)
+        new = {
+            record['username']: record for record in records
+            if record['username'] not in known
+        }
+        password = make_password(None)
+        User.objects.bulk_create(
+            User(
+                username=username,
+                first_name=record.get('first_name', ''),
+                last_name=record.get('last_name', ''),
+                password=password,
+            )
+            for username, record in new.items()
+        )
+        self.resolve_users(new)
+        self.created['user'] += len(new)
+        self.skipped['user'] += len(records) - len(new)
+
+    def import_groups(self, records):
+        known = self.resolve_groups(record['slug'] for record in records)
+        new = {
+            record['slug']: record for record in records
+            if record['slug'] not in known
+        }
+        Group.objects.bulk_create(
+            Group(
+                slug=slug,
+                title=record['title'],
+                description=record.get('description', ''),
+            )
+            for slug, record in new.items()
+        )
+        self.resolve_groups(new)
+        self.created['group'] += len(new)
+        self.skipped['group'] += len(records) - len(new)
+
+    def import_posts(self, records):
+        users = self.resolve_users(record['author'] for record in records)
+        groups = self.resolve_groups(record.get('group') for record in records)
+        accepted = [record for record in records if record['author'] in users]
+        posts = [
+            Post(
+                text=record['text'],
+                pub_date=parse_datetime(record['pub_date']),
+                author_id=users[record['author']],
+                group_id=groups.get(record.get('group')),
+                image=record.get('image') or '',
+            )
+            for record in accepted
+        ]
+        for record, pk in zip(accepted, self.bulk_create(Post, posts)):
+            self.post_ids[record['id']] = pk
+            if record.get('image'):
+                self.with_images.append(pk)
+            self.authors.add(record['author'])
+            if record.get('group') in groups:
+                self.group_slugs.add(record['group'])
+        self.created['post'] += len(accepted)
+        self.skipped['post'] += len(records) - len(accepted)
+
+    def import_comments(self, records):
+        users = self.resolve_users(record['author'] for record in records)
+        accepted = [
+            record for record in records
+            if record['author'] in users and record['post'] in self.post_ids
+        ]
+        Comment.objects.bulk_create(
+            Comment(
+                post_id=self.post_ids[record['post']],
+                author_id=users[record['author']],
+                text=record['text'],
+                created=parse_datetime(record['created']),
+            )
+            for record in accepted
+        )
+        self.commented.update(
+            self.post_ids[record['post']] for record in accepted
+        )
+        self.created['comment'] += len(accepted)
+        self.skipped['comment'] += len(records) - len(accepted)
+
+    def import_follows(self, records):
+        users = self.resolve_users(
+            name for record in records
+            for name in (record['user'], record['author'])
+        )
+        pairs = {
+            (users[record['user']], users[record['author']])
+            for record in records
+            if record['user'] in users and record['author'] in users
+            and record['user'] != record['author']
+        }
+        Follow.objects.bulk_create(
+            (Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in pairs),
+            ignore_conflicts=True,
+        )
+        self.follows.update(pairs)
+        self.created['follow'] += len(pairs)
+        self.skipped['follow'] += len(records) - len(pairs)
+
+    @staticmethod
+    def bulk_create(model, objects):
+        """`bulk_create`, возвращающий id новых строк по порядку.
+
+        SQLite не отдаёт id из вставки, но внутри транзакции пачка
+        получает их подряд - их выбираем после самой большой старой.
+        """
+        if not objects:
+            return []
+        last = model.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+        created = model.objects.bulk_create(objects, batch_size=500)
+        if created[0].pk is not None:
+            return [obj.pk for obj in created]
+        return list(
+            model.objects.filter(pk__gt=last).order_by('pk')
+            .values_list('pk', flat=True)[:len(objects)]
+        )
+
+    # Завершение.
+
+    def finish(self):
+        """Ленты подписок, поиск, архив, превью, счётчики и кеш страниц.
+
+        Возвращает число постов, чьих картинок нет в хранилище.
+        """
+        follows = self.refresh_feeds()
+        indexed = set(self.post_ids.values()) | self.commented
+        for ids in chunked(sorted(indexed), self.chunk_size):
+            with transaction.atomic():
+                search.index_posts(ids)
+        activity.repair(indexed, self.chunk_size)
+        archive.rebuild()
+        missing = self.build_thumbnails()
+        self.invalidate(follows)
+        return missing
+
+    def refresh_feeds(self):
+        """Достраивает ленты подписчиков авторов новых постов."""
+        follows = set(self.follows)
+        for ids in chunked([self.user_ids[name] for name in self.authors],
+                           500):
+            follows.update(
+                Follow.objects.filter(author_id__in=ids)
+                .values_list('user_id', 'author_id')
+            )
+        cache.delete(feed.HEAVY_AUTHORS_KEY)
+        for pairs in chunked(follows, self.chunk_size):
+            with transaction.atomic():
+                for user_id, author_id in pairs:
+                    feed.backfill(user_id, author_id)
+        return follows
+
+    def build_thumbnails(self):
+        missing = 0
+        for ids in chunked(self.with_images, 500):
+            images.fill_dimensions(Post.objects.filter(pk__in=ids))
+            for post in Post.objects.filter(pk__in=ids).iterator():
+                try:
+                    thumbnails.build(post)
+                except OSError:
+                    missing += 1
+        return missing
+
+    def invalidate(self, follows):
+        scopes = [counters.all_scope()]
+        scopes += [counters.author_scope(self.user_ids[name])
+                   for name in self.authors]
+        scopes += [counters.group_scope(self.group_ids[slug])
+                   for slug in self.group_slugs]
+        scopes += [counters.follow_scope(user_id) for user_id, _ in follows]
+        counters.forget(scopes)
+
+        pages = page_cache.index_scopes()
+        for slug in self.group_slugs:
+            pages += page_cache.group_scopes(slug)
+        for username in self.authors:
+            pages += page_cache.profile_scopes(username)
+        for post_id in self.commented:
+            pages += page_cache.post_scopes(post_id)
+        page_cache.invalidate(pages)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, syndication, views
 
 app_name = 'posts'
 
@@ -14,6 +14,58 @@ urlpatterns = [
         'posts/<int:post_id>/comment/', views.add_comment, name='add_comment'
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.post_search, name='search'),
+    path('archive/', views.archive_index, name='archive'),
+    path(
+        'archive/<int:year>/<int:month>/',
+        views.archive_index,
+        name='archive'
+    ),
+    path(
+        'group/<slug:slug>/archive/',
+        views.group_archive,
+        name='group_archive'
+    ),
+    path(
+        'group/<slug:slug>/archive/<int:year>/<int:month>/',
+        views.group_archive,
+        name='group_archive'
+    ),
+    path(
+        'profile/<str:username>/archive/',
+        views.profile_archive,
+        name='profile_archive'
+    ),
+    path(
+        'profile/<str:username>/archive/<int:year>/<int:month>/',
+        views.profile_archive,
+        name='profile_archive'
+    ),
+    path('feed/<str:kind>/', syndication.index, name='feed_index'),
+    path(
+        'group/<slug:slug>/feed/<str:kind>/',
+        syndication.group_posts,
+        name='feed_group_list'
+    ),
+    path(
+        'profile/<str:username>/feed/<str:kind>/',
+        syndication.profile,
+        name='feed_profile'
+    ),
+    path('api/posts/', api.index, name='api_index'),
+    path('api/group/<slug:slug>/', api.group_posts, name='api_group_list'),
+    path(
+        'api/profile/<str:username>/', api.profile, name='api_profile'
+    ),
+    path('api/follow/', api.follow_index, name='api_follow_index'),
+    path(
+        'api/posts/<int:post_id>/', api.post_detail, name='api_post_detail'
+    ),
+    path(
+        'api/posts/<int:post_id>/comments/',
+        api.post_comments,
+        name='api_post_comments'
+    ),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
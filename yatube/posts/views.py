@@ -1,39 +1,64 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from .models import Post, Group, User, Comment, Follow
-from . import consts, utils
+from django.http import Http404
+from .models import Post, Group, User, Follow
+from . import (archive, consts, counters, feed, page_cache, search,
+               thumbnails, utils)
 from .forms import PostForm, CommentForm
 from django.urls import reverse
 
+from core import ratelimit
 
+# Сортировки главной страницы, у каждой свой индекс (см. Post.Meta).
+FEED_ORDERS = {
+    'discussed': ('-comments_count', '-pk'),
+    'active': ('-last_activity_at', '-pk'),
+}
+
+
+@page_cache.cached_page(
+    'posts:index', page_cache.index_scopes,
+    params=page_cache.PAGE_PARAMS + ('order',)
+)
 def index(request):
     """Вызывает шаблон главной страницы сайта.
-    Кеширование выполнено способом -
-    в коде шаблона."""
-    post_list = Post.objects.all()
+    Страница кешируется целиком, см. posts.page_cache.
+    С `?order=discussed` посты идут по числу комментариев,
+    с `?order=active` - по времени последнего комментария."""
+    post_list = utils.feed_queryset()
+    order = request.GET.get('order')
+    if order in FEED_ORDERS:
+        post_list = post_list.order_by(*FEED_ORDERS[order])
+    else:
+        order = None
 
     page_obj = utils.make_paginator(
         post_list,
         request,
-        consts.QUANTITY_OF_POST_TEN
+        consts.QUANTITY_OF_POST_TEN,
+        cursor=False if order else None,
+        count=counters.all_posts_count
     )
 
     context = {
         'page_obj': page_obj,
+        'order': order,
     }
     template = 'posts/index.html'
     return render(request, template, context)
 
 
+@page_cache.cached_page('posts:group_list', page_cache.group_scopes)
 def group_posts(request, slug):
     """Обрабатывает шаблон для страницы группы."""
     group = get_object_or_404(Group, slug=slug)
 
-    post_list = group.posts.all()
+    post_list = utils.feed_queryset(group.posts.all())
     page_obj = utils.make_paginator(
         post_list,
         request,
-        consts.QUANTITY_OF_POST_TEN
+        consts.QUANTITY_OF_POST_TEN,
+        count=lambda: counters.group_posts_count(group)
     )
 
     context = {
@@ -43,15 +68,19 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@page_cache.cached_page(
+    'posts:profile', page_cache.with_groups(page_cache.profile_scopes)
+)
 def profile(request, username):
     """Профайл пользователя."""
     author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
+    post_list = utils.feed_queryset(author.posts.all())
 
     page_obj = utils.make_paginator(
         post_list,
         request,
-        consts.QUANTITY_OF_POST_TEN
+        consts.QUANTITY_OF_POST_TEN,
+        count=lambda: counters.author_posts_count(author)
     )
     if request.user.is_authenticated:
         following = Follow.objects.filter(
@@ -68,10 +97,118 @@ def profile(request, username):
     return render(request, template, context)
 
 
+def _archive_scopes(scopes):
+    # Месяц архива не влияет на области страницы.
+    return lambda year=None, month=None, **kwargs: scopes(**kwargs)
+
+
+def _archive(request, posts, scope, url_name, url_args, year, month,
+             context):
+    """Посты одного месяца области `scope`, по умолчанию - последнего.
+
+    Список месяцев и число постов в них берутся из `PostMonth`,
+    поэтому страницы месяца считаются без `COUNT(*)`.
+    """
+    months = archive.months(scope)
+    if year is None:
+        current = months[0][0] if months else None
+    else:
+        current = archive.month_of(year, month)
+        if current is None:
+            raise Http404('Нет такого месяца')
+    counts = dict(months)
+    if current is None:
+        posts = posts.none()
+    else:
+        start, end = archive.month_range(current)
+        posts = posts.filter(pub_date__gte=start, pub_date__lt=end)
+    page_obj = utils.make_paginator(
+        utils.feed_queryset(posts),
+        request,
+        consts.QUANTITY_OF_POST_TEN,
+        cursor=False,
+        count=counts.get(current, 0)
+    )
+    links = [
+        {
+            'month': value,
+            'posts_count': posts_count,
+            'url': reverse(
+                url_name, args=(*url_args, value.year, value.month)
+            ),
+        }
+        for value, posts_count in months
+    ]
+    # Соседние месяцы с постами; список идёт от новых к старым.
+    newer = older = None
+    for link in links if current else ():
+        if link['month'] > current:
+            newer = link
+        elif link['month'] < current and older is None:
+            older = link
+    context.update({
+        'page_obj': page_obj,
+        'month': current,
+        'months': links,
+        'newer': newer,
+        'older': older,
+    })
+    return render(request, 'posts/archive.html', context)
+
+
+@page_cache.cached_page(
+    'posts:archive', _archive_scopes(page_cache.index_scopes)
+)
+def archive_index(request, year=None, month=None):
+    """Архив всех постов по месяцам."""
+    return _archive(
+        request, Post.objects.all(), counters.all_scope(),
+        'posts:archive', (), year, month,
+        {'title': 'Архив записей'}
+    )
+
+
+@page_cache.cached_page(
+    'posts:group_archive', _archive_scopes(page_cache.group_scopes)
+)
+def group_archive(request, slug, year=None, month=None):
+    group = get_object_or_404(Group, slug=slug)
+    return _archive(
+        request, group.posts.all(), counters.group_scope(group.pk),
+        'posts:group_archive', (slug,), year, month,
+        {'title': f'Архив сообщества {group}', 'group': group}
+    )
+
+
+@page_cache.cached_page(
+    'posts:profile_archive', _archive_scopes(page_cache.profile_scopes)
+)
+def profile_archive(request, username, year=None, month=None):
+    author = get_object_or_404(User, username=username)
+    name = author.get_full_name() or author.username
+    return _archive(
+        request, author.posts.all(), counters.author_scope(author.pk),
+        'posts:profile_archive', (username,), year, month,
+        {'title': f'Архив записей {name}', 'author': author}
+    )
+
+
+@page_cache.cached_page(
+    'posts:post_detail', page_cache.post_detail_scopes, anonymous_only=True
+)
 def post_detail(request, post_id):
     """Страница поста."""
-    post = Post.objects.get(id=post_id)
-    comments = Comment.objects.filter(post=post)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group')
+        .prefetch_related('image_variants'),
+        pk=post_id
+    )
+    comments = utils.make_paginator(
+        post.comments.select_related('author').order_by('created', 'pk'),
+        request,
+        consts.QUANTITY_OF_COMMENTS,
+        cursor=False
+    )
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
@@ -83,15 +220,18 @@ def post_detail(request, post_id):
 
 
 @login_required
+@ratelimit.limit('posts:post_create', methods=('POST',))
 def post_create(request):
     template = 'posts/create_post.html'
     form = PostForm(
-        request.POST or None
+        request.POST or None,
+        files=request.FILES or None,
     )
     if form.is_valid():
         temp_form = form.save(commit=False)
         temp_form.author = request.user
         temp_form.save()
+        thumbnails.schedule(temp_form)
         return redirect('posts:profile', temp_form.author)
     context = {
         'form': form,
@@ -111,6 +251,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post_id=post_id)
     return render(
         request,
@@ -120,6 +262,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@ratelimit.limit('posts:add_comment')
 def add_comment(request, post_id):
     form = CommentForm(request.POST or None)
     post = get_object_or_404(Post, pk=post_id)
@@ -131,32 +274,46 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def post_search(request):
+    """Поиск по текстам постов и комментариев, лучшие совпадения первыми."""
+    query = request.GET.get('q', '').strip()
+    paginator = search.SearchPaginator(
+        query, consts.QUANTITY_OF_POST_TEN, utils.feed_queryset()
+    )
+    context = {
+        'page_obj': paginator.get_page(request.GET.get('cursor')),
+        'query': query,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
+    post_list = feed.follow_feed(request.user, utils.feed_queryset())
     page_obj = utils.make_paginator(
         post_list,
         request,
-        consts.QUANTITY_OF_POST_TEN
+        consts.QUANTITY_OF_POST_TEN,
+        count=lambda: counters.follow_posts_count(request.user),
+        cursor_class=feed.FollowFeedPaginator
     )
     context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@ratelimit.limit('posts:profile_follow')
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     user = request.user
-    is_follower = Follow.objects.filter(user=user, author=author)
-    if user != author and not is_follower.exists():
-        Follow.objects.create(user=user, author=author)
+    if user != author:
+        Follow.objects.get_or_create(user=user, author=author)
     return redirect(reverse('posts:profile', args=[username]))
 
 
 @login_required
+@ratelimit.limit('posts:profile_unfollow')
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    is_follower = Follow.objects.filter(user=request.user, author=author)
-    if is_follower.exists():
-        is_follower.delete()
+    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=author)
@@ -60,10 +60,11 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'sorl.thumbnail',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerfMiddleware',
+    'core.middleware.SamplingProfilerMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,9 +72,14 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
+# Панель отладки только для разработки: в продакшене её заменяет
+# core.middleware.PerfMiddleware.
+if DEBUG:
+    INSTALLED_APPS += ['debug_toolbar']
+    MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware']
+
 INTERNAL_IPS = [
     '127.0.0.1:8000',
 ]
@@ -155,8 +161,107 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
+# 'locmem' - кеш в памяти процесса (у каждого воркера свой),
+# 'sqlite' - общий для всех воркеров хоста файл (core.cache.SQLiteCache).
+CACHE_BACKEND = os.environ.get('YATUBE_CACHE_BACKEND', 'locmem')
+
+CACHE_BACKENDS = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'sqlite': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache.sqlite3')
+        ),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'MAX_SIZE': 64 * 1024 * 1024,
+        },
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[CACHE_BACKEND],
+}
+
+# Ленты index, group_list, profile и follow_index листаются курсором
+# (?cursor=...) вместо номеров страниц: без COUNT(*) и OFFSET.
+POSTS_CURSOR_PAGINATION = False
+
+# Сколько секунд счётчик постов (общий, автора, группы, ленты подписок)
+# может жить в кеше без пересчёта через COUNT(*).
+POSTS_COUNT_CACHE_TIMEOUT = 60 * 5
+
+# Лента подписок: посты авторов, у которых подписчиков не больше
+# FEED_FANOUT_MAX_FOLLOWERS, раскладываются по лентам при публикации,
+# остальные подмешиваются при чтении.
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+FEED_BACKFILL_LIMIT = 500
+FEED_HEAVY_AUTHORS_TIMEOUT = 60 * 10
+# Сколько потоков раскладывают по лентам посты автора, который снова
+# помещается в FEED_FANOUT_MAX_FOLLOWERS; 0 - сразу после коммита
+# в процессе запроса.
+FEED_REFILL_WORKERS = 1
+
+# Готовые страницы index, group_list, profile и post_detail живут в кеше
+# до изменения их данных (см. posts.page_cache), этот TTL - страховка.
+POSTS_PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Сколько процессов нарезают превью картинок постов (см. posts.thumbnails).
+# 0 - нарезать в процессе веб-сервера сразу после коммита.
+POSTS_THUMBNAIL_WORKERS = 2
+
+# Поиск по постам (см. posts.search): 'auto' - FTS5, если SQLite его
+# поддерживает, 'table' - всегда собственный индекс термов.
+POSTS_SEARCH_BACKEND = 'auto'
+
+# Сколько последних постов попадает в ленты Atom/RSS (см. posts.syndication).
+POSTS_FEED_ITEMS = 20
+
+# Замеры запросов (core.perf): файлы гистограмм воркеров, как часто
+# их обновлять (секунды) и с какого времени (мс) писать запрос в лог с SQL.
+PERF_DIR = os.environ.get('YATUBE_PERF_DIR', os.path.join(BASE_DIR, 'perf'))
+PERF_FLUSH_INTERVAL = 30
+PERF_SLOW_REQUEST_MS = 500
+
+# Отдавать фазы запроса (SQL, кеш, шаблоны, превью) заголовком Server-Timing
+# - при DEBUG или сотрудникам (is_staff).
+PERF_SERVER_TIMING = os.environ.get('YATUBE_SERVER_TIMING') == '1'
+
+# Сэмплирующий профайлер (core.profiler): какая доля запросов к PROFILE_VIEWS
+# профилируется, как часто снимать стек (секунды) и куда писать стеки.
+PROFILE_RATE = float(os.environ.get('YATUBE_PROFILE_RATE', 0))
+PROFILE_VIEWS = ('posts:follow_index', 'posts:post_detail')
+PROFILE_INTERVAL = 0.005
+PROFILE_DIR = os.path.join(PERF_DIR, 'profiles')
+
+# Ограничение частоты пишущих view (core.ratelimit): (запросов, секунд)
+# на пользователя; с одного IP - в RATE_LIMIT_IP_FACTOR раз больше.
+RATE_LIMITS = {
+    'posts:post_create': (10, 60 * 10),
+    'posts:add_comment': (20, 60),
+    'posts:profile_follow': (30, 60),
+    'posts:profile_unfollow': (30, 60),
 }
+RATE_LIMIT_IP_FACTOR = 5
+# Заголовок с адресом клиента от своего обратного прокси (например,
+# 'HTTP_X_FORWARDED_FOR'); None - брать REMOTE_ADDR. Без прокси заголовок
+# подделывается клиентом, поэтому включать только за ним.
+RATE_LIMIT_IP_HEADER = None
+
+# Список постов в админке: с фильтром или поиском строки считаются
+# не дальше этого предела (см. posts.paginators.EstimatedCountPaginator).
+POSTS_ADMIN_COUNT_LIMIT = 10000
+
+# Загруженные картинки постов (см. posts.images): большая сторона
+# не длиннее POSTS_IMAGE_MAX_EDGE, формат 'JPEG' или 'WEBP' (если Pillow
+# собран без libwebp - JPEG) и качество сжатия.
+POSTS_IMAGE_MAX_EDGE = 2048
+POSTS_IMAGE_FORMAT = 'JPEG'
+POSTS_IMAGE_QUALITY = 85
+
+# Файл картинки без ссылок моложе стольких секунд не удаляется:
+# его могли только что выдать ещё не сохранённому посту (см. posts.media).
+POSTS_MEDIA_GRACE = 60 * 60
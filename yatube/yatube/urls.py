@@ -18,6 +18,8 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import perf_stats
+
 
 handler403 = 'core.views.csrf_failure'
 handler404 = 'core.views.page_not_found'
@@ -26,6 +28,7 @@ handler500 = 'core.views.server_error'
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
+    path('admin/perf/', perf_stats, name='perf_stats'),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),